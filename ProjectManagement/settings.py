@@ -36,19 +36,21 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'projects.instrumentation.RequestMetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'projects.activity.ActivityLogMiddleware',
 ]
 
 ROOT_URLCONF = 'ProjectManagement.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'projects.instrumentation.TimedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -63,6 +65,44 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'ProjectManagement.wsgi.application'
+ASGI_APPLICATION = 'ProjectManagement.asgi.application'
+
+# Live project updates (projects/realtime.py). The in-memory layer only reaches clients of
+# the same process; multi-node deployments set CHANNEL_LAYER_BACKEND, e.g.
+# channels_redis.core.RedisChannelLayer, and CHANNEL_LAYER_HOSTS (comma-separated).
+CHANNEL_LAYERS = {
+    'default': {
+        'BACKEND': os.environ.get('CHANNEL_LAYER_BACKEND', 'channels.layers.InMemoryChannelLayer'),
+    },
+}
+if os.environ.get('CHANNEL_LAYER_HOSTS'):
+    CHANNEL_LAYERS['default']['CONFIG'] = {'hosts': os.environ['CHANNEL_LAYER_HOSTS'].split(',')}
+# Task and comment writes publish deltas only when something delivers them: on by default
+# with a shared layer, and REALTIME_UPDATES=1 turns it on for the in-memory layer under ASGI.
+REALTIME_UPDATES = os.environ.get('REALTIME_UPDATES', '1' if 'CHANNEL_LAYER_BACKEND' in os.environ else '0') == '1'
+
+# Cache backend for the generation-counter cache (projects/cache.py) and the other caches.
+# Locally the per-process locmem cache is enough (CACHE_BACKEND=filebased shares it with
+# management commands); production sets CACHE_BACKEND to redis or memcached and
+# CACHE_LOCATION to the shared server(s), comma-separated.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'filebased': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+}
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'locmem')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.environ.get('CACHE_LOCATION', str(BASE_DIR / '.cache') if CACHE_BACKEND == 'filebased' else ''),
+        'TIMEOUT': 60 * 60,
+    },
+}
+if CACHE_BACKEND in ('locmem', 'filebased'):
+    # Django's default of 300 entries is far below one schedule per project
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 20000))}
+PAGE_CACHE_TIMEOUT = 60 * 60
 
 
 if DEBUG == True:
@@ -86,6 +126,28 @@ else:
         }
     }
 
+# Database connections (projects/db_pool.py). DB_CONNECTIONS=pool (the production default)
+# keeps a bounded pool of open connections per worker process that requests borrow and give
+# back, which also works under ASGI; persistent keeps a connection per thread for
+# DB_CONN_MAX_AGE seconds (WSGI only); none opens and closes one per request.
+# DB_POOL_SIZE should cover the requests a worker process serves at once.
+POOLED_ENGINES = {
+    'django.db.backends.mysql': 'projects.backends.mysql',
+    'django.db.backends.sqlite3': 'projects.backends.sqlite3',
+}
+DB_CONNECTIONS = os.environ.get('DB_CONNECTIONS', 'none' if DEBUG else 'pool')
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+if DB_CONNECTIONS == 'pool':
+    DATABASES['default']['ENGINE'] = POOLED_ENGINES[DATABASES['default']['ENGINE']]
+    DATABASES['default']['OPTIONS'] = {'pool': {
+        'max_size': int(os.environ.get('DB_POOL_SIZE', 10)),
+        'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'max_lifetime': int(os.environ.get('DB_POOL_MAX_LIFETIME', 30 * 60)),
+        'max_idle': int(os.environ.get('DB_POOL_MAX_IDLE', 5 * 60)),
+    }}
+elif DB_CONNECTIONS == 'persistent':
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -116,6 +178,12 @@ USE_TZ = True
 STATIC_URL = "/static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 # STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
+STATICFILES_FINDERS = [
+    'django.contrib.staticfiles.finders.FileSystemFinder',
+    'django.contrib.staticfiles.finders.AppDirectoriesFinder',
+    # plotly.js from the installed plotly package, served as plotly/plotly.min.js
+    'projects.staticfiles.PlotlyJSFinder',
+]
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -129,6 +197,28 @@ LOGOUT_REDIRECT_URL = '/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Size/type limits are enforced while uploads stream in (limits: projects/uploads.py UPLOAD_LIMITS)
+FILE_UPLOAD_HANDLERS = ['projects.uploads.LimitedUploadHandler']
+
+# Run background jobs (PDF reports, ...) right after the request commits instead of
+# waiting for `manage.py run_worker`. Handy without a worker running; keep it off in production.
+BACKGROUND_JOBS_EAGER = False
+
+# ActivityLog entries are buffered per transaction/request and written with one
+# bulk_create; a buffer that reaches this size is written early.
+ACTIVITY_LOG_FLUSH_THRESHOLD = 100
+
+# `manage.py archive_activity_log` moves older entries to MEDIA_ROOT/activity_archive/
+ACTIVITY_LOG_RETENTION_DAYS = 90
+
+# Admin changelist searches list at most this many full-text matches, best first
+SEARCH_RESULTS_LIMIT = 1000
+
+# Per-view query/latency budgets live in projects/urls.py (VIEW_BUDGETS). Overruns are
+# logged to the `projects.performance` logger, or raise BudgetExceeded when this is True.
+# Tests check the query counts with projects.instrumentation.enforce_budgets(latency=False).
+VIEW_BUDGETS_RAISE = os.environ.get('VIEW_BUDGETS_RAISE') == '1'
+
 
 # TEMPLATE_CONTEXT_PROCESSORS += (
 #     "django.core.context_processors.request",
@@ -0,0 +1,147 @@
+# Buffered ActivityLog writer.
+# Entries logged inside a transaction are buffered per savepoint scope and written with one
+# bulk_create when it commits (and are dropped if it, or the savepoint they were logged in,
+# rolls back). Entries logged in autocommit mode during a request are written when the request
+# finishes. Anything else is written straight away. Every buffer is written early once it
+# holds ACTIVITY_LOG_FLUSH_THRESHOLD entries.
+import contextvars
+import weakref
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections, router, transaction
+from django.db.models.signals import post_save, pre_delete
+
+from .models import ActivityLog
+
+
+ACTIVITY_LOG_FLUSH_THRESHOLD = getattr(settings, 'ACTIVITY_LOG_FLUSH_THRESHOLD', 100)
+
+_request_batch = contextvars.ContextVar('activity_log_request_batch', default=None)
+
+
+class ActivityLogBatch:
+    def __init__(self, using):
+        self.using = using
+        self.entries = []
+
+    def add(self, entry):
+        self.entries.append(entry)
+        if len(self.entries) >= ACTIVITY_LOG_FLUSH_THRESHOLD:
+            self.flush()
+
+    def flush(self):
+        entries, self.entries = self.entries, []
+        if entries:
+            ActivityLog.objects.using(self.using).bulk_create(entries, batch_size=ACTIVITY_LOG_FLUSH_THRESHOLD)
+
+
+class SavepointActivityLogBatch(ActivityLogBatch):
+    """Entries logged in a transaction while one set of savepoints was open.
+
+    Its on_commit hook is registered inside those savepoints, so rolling one of them back
+    discards the hook and, with it, the entries. A batch that fills up is written early,
+    inside the transaction, where the same rollback undoes the insert.
+    """
+
+    def __init__(self, using):
+        super().__init__(using)
+        self.committed = False
+        transaction.on_commit(self.commit, using=using)
+
+    def commit(self):
+        self.committed = True
+        self.flush()
+
+
+def _transaction_batch(using):
+    connection = connections[using]
+    # atomic(savepoint=False) blocks add None, which no rollback can target on its own
+    key = frozenset(sid for sid in connection.savepoint_ids if sid)
+    batches = getattr(connection, 'activity_log_batches', None)
+    if batches is None:
+        # The on_commit hook holds the only strong reference, so a batch whose hook a rollback
+        # discarded drops out of here with it
+        batches = connection.activity_log_batches = weakref.WeakValueDictionary()
+    batch = batches.get(key)
+    if batch is None or batch.committed:
+        batch = batches[key] = SavepointActivityLogBatch(using)
+    return batch
+
+
+def log_activity(instance, action, description):
+    using = router.db_for_write(ActivityLog)
+    entry = ActivityLog(
+        action=action,
+        # get_for_model is served from ContentType's in-process cache after the first call
+        content_type=ContentType.objects.db_manager(using).get_for_model(instance),
+        object_id=instance.pk,
+        description=description,
+    )
+
+    if connections[using].in_atomic_block:
+        batch = _transaction_batch(using)
+    else:
+        batch = _request_batch.get()
+
+    if batch is None:
+        entry.save(using=using)
+    else:
+        batch.add(entry)
+
+
+@contextmanager
+def activity_log_buffer():
+    """Collect autocommit-mode entries until the block exits, then write them together."""
+    batch = ActivityLogBatch(router.db_for_write(ActivityLog))
+    token = _request_batch.set(batch)
+    try:
+        yield batch
+    finally:
+        _request_batch.reset(token)
+        batch.flush()
+
+
+class ActivityLogMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with activity_log_buffer():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        batch = ActivityLogBatch(router.db_for_write(ActivityLog))
+        token = _request_batch.set(batch)
+        try:
+            return await self.get_response(request)
+        finally:
+            _request_batch.reset(token)
+            await sync_to_async(batch.flush)()
+
+
+def track_activity(model, label_field='pk'):
+    """Log creates, updates and deletes of `model`, describing instances by `label_field`."""
+    name = model._meta.verbose_name
+
+    def log_save(sender, instance, created, raw=False, **kwargs):
+        if raw:
+            return
+        action = 'Created' if created else 'Updated'
+        log_activity(instance, action, f'{action} {name}: {getattr(instance, label_field)}')
+
+    def log_delete(sender, instance, **kwargs):
+        log_activity(instance, 'Deleted', f'Deleted {name}: {getattr(instance, label_field)}')
+
+    uid = model._meta.label_lower
+    post_save.connect(log_save, sender=model, weak=False, dispatch_uid=f'activity_log_save_{uid}')
+    pre_delete.connect(log_delete, sender=model, weak=False, dispatch_uid=f'activity_log_delete_{uid}')
@@ -0,0 +1,121 @@
+# Retention for ActivityLog.
+# Entries older than the retention window are moved out of the table into gzip'd JSON-lines
+# files, one per day (in the current time zone), under
+# MEDIA_ROOT/activity_archive/YYYY/MM/YYYY-MM-DD.jsonl.gz.
+# activity_history() reads from both the table and the archive.
+import datetime
+import gzip
+import json
+import os
+from itertools import groupby
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import ActivityLog
+
+
+ACTIVITY_LOG_RETENTION_DAYS = getattr(settings, 'ACTIVITY_LOG_RETENTION_DAYS', 90)
+
+_FIELDS = ('id', 'action', 'description', 'content_type__app_label', 'content_type__model', 'object_id', 'timestamp')
+
+
+def archive_root():
+    return os.path.join(settings.MEDIA_ROOT, 'activity_archive')
+
+
+def archive_path(day):
+    return os.path.join(archive_root(), f'{day:%Y}', f'{day:%m}', f'{day:%Y-%m-%d}.jsonl.gz')
+
+
+def _record(row):
+    return {
+        'id': row['id'],
+        'action': row['action'],
+        'description': row['description'],
+        'content_type': f"{row['content_type__app_label']}.{row['content_type__model']}",
+        'object_id': row['object_id'],
+        'timestamp': row['timestamp'].isoformat(),
+    }
+
+
+def archive_activity_logs(days=ACTIVITY_LOG_RETENTION_DAYS, batch_size=1000):
+    """Move entries older than `days` into the archive, batch by batch. Returns how many were moved."""
+    cutoff = timezone.now() - datetime.timedelta(days=days)
+    old_entries = ActivityLog.objects.filter(timestamp__lt=cutoff).order_by('id')
+    moved = 0
+
+    while True:
+        rows = list(old_entries.values(*_FIELDS)[:batch_size])
+        if not rows:
+            break
+
+        rows.sort(key=lambda row: row['timestamp'])
+        for day, day_rows in groupby(rows, key=lambda row: timezone.localdate(row['timestamp'])):
+            path = archive_path(day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Appending adds a new gzip member; gzip readers treat the file as one stream.
+            with gzip.open(path, 'at', encoding='utf-8') as archive:
+                for row in day_rows:
+                    archive.write(json.dumps(_record(row)) + '\n')
+
+        # Written to disk first, so a crash here can only duplicate (which reads tolerate), never lose.
+        ActivityLog.objects.filter(id__in=[row['id'] for row in rows]).delete()
+        moved += len(rows)
+
+    return moved
+
+
+def _archive_days(since=None, until=None):
+    if not os.path.isdir(archive_root()):
+        return
+    for root, dirs, files in os.walk(archive_root()):
+        dirs.sort()
+        for name in sorted(files):
+            if not name.endswith('.jsonl.gz'):
+                continue
+            day = datetime.date.fromisoformat(name[:-len('.jsonl.gz')])
+            if (since is None or day >= timezone.localdate(since)) and (until is None or day <= timezone.localdate(until)):
+                yield os.path.join(root, name)
+
+
+def activity_history(instance=None, content_type=None, object_id=None, since=None, until=None):
+    """Entries from the table and the archive, newest first, as plain dicts.
+
+    Filter by `instance`, or by `content_type` (a ContentType or 'app_label.model') and
+    `object_id`, and/or by a `since`/`until` datetime range.
+    """
+    if instance is not None:
+        content_type = ContentType.objects.get_for_model(instance)
+        object_id = instance.pk
+    if isinstance(content_type, ContentType):
+        content_type = f'{content_type.app_label}.{content_type.model}'
+
+    hot = ActivityLog.objects.all()
+    if content_type is not None:
+        app_label, model = content_type.split('.')
+        hot = hot.filter(content_type__app_label=app_label, content_type__model=model)
+    if object_id is not None:
+        hot = hot.filter(object_id=object_id)
+    if since is not None:
+        hot = hot.filter(timestamp__gte=since)
+    if until is not None:
+        hot = hot.filter(timestamp__lte=until)
+    entries = {row['id']: _record(row) for row in hot.values(*_FIELDS)}
+
+    for path in _archive_days(since, until):
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            for line in archive:
+                record = json.loads(line)
+                if content_type is not None and record['content_type'] != content_type:
+                    continue
+                if object_id is not None and record['object_id'] != object_id:
+                    continue
+                timestamp = parse_datetime(record['timestamp'])
+                if (since is not None and timestamp < since) or (until is not None and timestamp > until):
+                    continue
+                entries.setdefault(record['id'], record)
+
+    return sorted(entries.values(), key=lambda record: record['timestamp'], reverse=True)
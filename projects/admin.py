@@ -1,10 +1,17 @@
 from django.contrib import admin, messages
+from django.contrib.admin.views.main import ORDER_VAR
 from django.db.models.aggregates import Count
 from django.db.models.query import QuerySet
 from django.utils.html import format_html, urlencode
-from django.urls import reverse
+from django.urls import path, reverse
+from django.shortcuts import render
+from django.http import StreamingHttpResponse
 from django.contrib import messages
 from . import models
+from .forms import TaskAdminForm
+from .locations import location_tree
+from .search import SEARCH_RESULTS_LIMIT, ranked_queryset, search, search_backend
+from .uploads import upload_errors, with_upload_errors
 
 
 # Register your models here.
@@ -31,10 +38,17 @@ class WardAdmin(admin.ModelAdmin):
     list_per_page = 10
     list_select_related = ['division']
     autocomplete_fields = ['division']
-    search_fields = ['division__icontains',]
+    search_fields = ['ward_name', 'division__division_name']
+    ordering = ['ward_name']
     list_filter = ['division',]
     inlines = [VillageInline]
 
+    def get_search_results(self, request, queryset, search_term):
+        # Match names against the in-process location tree instead of a LIKE join
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(id__in=location_tree().search_wards(search_term)), False
+
 
 @admin.register(models.Village)
 class VillageAdmin(admin.ModelAdmin):
@@ -42,17 +56,62 @@ class VillageAdmin(admin.ModelAdmin):
     list_per_page = 10
     list_select_related = ['ward']
     autocomplete_fields = ['ward']
-    search_fields = ['ward__icontains',]
+    search_fields = ['village_name', 'ward__ward_name']
+    ordering = ['village_name']
     list_filter = ['ward']
 
+    def get_search_results(self, request, queryset, search_term):
+        # Match names against the in-process location tree instead of a LIKE join
+        if not search_term:
+            return super().get_search_results(request, queryset, search_term)
+        return queryset.filter(id__in=location_tree().search_villages(search_term)), False
+
+
+class FullTextSearchMixin:
+    """Answer changelist and autocomplete searches from the full-text index, ranked."""
+    search_kind = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip() or search_backend() is None:
+            return super().get_search_results(request, queryset, search_term)
+        ids = [object_id for _, object_id in search(search_term, [self.search_kind], SEARCH_RESULTS_LIMIT)]
+        changelist = request.resolver_match and request.resolver_match.url_name.endswith('_changelist')
+        if len(ids) == SEARCH_RESULTS_LIMIT and changelist:
+            self.message_user(
+                request, f'Showing the best {SEARCH_RESULTS_LIMIT} matches only; refine the search to see the rest.',
+                messages.WARNING,
+            )
+        results = ranked_queryset(queryset, ids)
+        if ORDER_VAR in request.GET:
+            # The changelist ordered the rows before searching; a column picked to sort by wins over the rank
+            results = results.order_by(*queryset.query.order_by)
+        return results, False
+
+
+def export_action(kind, export_format):
+    def export(modeladmin, request, queryset):
+        from .exports import export_stream
+        content_type, filename, stream = export_stream(kind, export_format, queryset)
+        response = StreamingHttpResponse(stream, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+    export.__name__ = f'export_{export_format}'
+    export.short_description = f'Export selected {kind} to {export_format.upper()}'
+    return export
+
 
 class TaskInline(admin.TabularInline):
     model = models.Task
     extra = 1
+    # Dependencies are edited on the task itself; a select of every task per inline row is too heavy
+    exclude = ['depends_on']
 
 
 @admin.register(models.Project)
-class ProjectAdmin(admin.ModelAdmin):
+class ProjectAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    search_kind = 'project'
+    actions = [export_action('projects', 'csv'), export_action('projects', 'xlsx')]
     list_display = ['project_name', 'project_code', 'supervisor', 'implementation_model', 'source_of_fund',  'total_cost', 'start_date', 'end_date', 'project_pictures', 'evaluation_percentage', 'location', 'description']
     search_fields = ('project_name__icontains', 'project_code', 'supervisor__username', 'location__village_name')
     list_select_related = ['supervisor', 'location']
@@ -71,6 +130,26 @@ class ProjectAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_form(self, request, obj=None, **kwargs):
+        return with_upload_errors(super().get_form(request, obj, **kwargs), request)
+
+    def get_urls(self):
+        urls = [path('import/', self.admin_site.admin_view(self.import_view), name='projects_project_import')]
+        return urls + super().get_urls()
+
+    def import_view(self, request):
+        from .imports import IMPORT_KINDS, import_file
+        context = {**self.admin_site.each_context(request), 'title': 'Import data', 'opts': self.model._meta, 'kinds': IMPORT_KINDS}
+        upload = request.FILES.get('file')
+        for message in upload_errors(request).values():
+            messages.error(request, message)
+        if request.method == 'POST' and upload and request.POST.get('kind') in IMPORT_KINDS:
+            file_format = 'xlsx' if upload.name.lower().endswith('.xlsx') else 'csv'
+            result = import_file(request.POST['kind'], upload, file_format)
+            messages.info(request, f'Created {result.created} row(s), rejected {len(result.errors)}.')
+            context.update(result=result, errors=result.errors[:200])
+        return render(request, 'admin/projects/import.html', context)
+
 
 
 @admin.register(models.TaskPlan)
@@ -79,17 +158,23 @@ class TaskPlanAdmin(admin.ModelAdmin):
 
 
 @admin.register(models.Task)
-class TaskAdmin(admin.ModelAdmin):
+class TaskAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    search_kind = 'task'
+    actions = [export_action('tasks', 'csv'), export_action('tasks', 'xlsx')]
     list_display = ['project','task_name', 'task_state', 'budget', 'description', 'assigned_to', 'due_date', 'status']
     search_fields = ('task_name', 'project__project_name', 'assigned_to__username')
     list_filter = ('status', 'due_date', 'project')
-    list_select_related = ['project', 'assigned_to']
-    autocomplete_fields = ['project', 'assigned_to']
+    list_select_related = ['project', 'assigned_to', 'task_state']
+    autocomplete_fields = ['project', 'assigned_to', 'depends_on']
     list_per_page = 10
+    form = TaskAdminForm
     fieldsets = (
         (None, {
             'fields': ('project','task_name', 'task_state', 'budget', 'description', 'assigned_to', 'due_date', 'status')
         }),
+        ('Schedule', {
+            'fields': ('start_date', 'depends_on')
+        }),
     )
 
 # @admin.register(models.ImplementationModel)
@@ -103,14 +188,42 @@ class TaskAdmin(admin.ModelAdmin):
 
 
 @admin.register(models.Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(FullTextSearchMixin, admin.ModelAdmin):
+    search_kind = 'comment'
     list_display = ['project', 'user', 'content', 'created_at']
     list_select_related = ['project', 'user']
-    search_fields = ['project', 'user', 'created_at']
+    search_fields = ['content', 'project__project_name', 'user__username']
     autocomplete_fields = ['project', 'user']
     list_per_page = 10
 
 
+@admin.register(models.ReportJob)
+class ReportJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'project', 'status', 'requested_by', 'created_at', 'finished_at']
+    list_select_related = ['project', 'requested_by']
+    list_filter = ['status']
+    readonly_fields = ['fingerprint', 'error', 'created_at', 'started_at', 'finished_at']
+    list_per_page = 10
+
+
+
+@admin.register(models.ImageJob)
+class ImageJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'project', 'source', 'status', 'created_at', 'finished_at']
+    list_select_related = ['project']
+    list_filter = ['status']
+    readonly_fields = ['source', 'error', 'created_at', 'started_at', 'finished_at']
+    list_per_page = 10
+
+
+@admin.register(models.ProjectStats)
+class ProjectStatsAdmin(admin.ModelAdmin):
+    list_display = ['project', 'todo_count', 'in_progress_count', 'done_count', 'total_budget', 'completion_percentage']
+    list_select_related = ['project']
+    readonly_fields = ['project', 'todo_count', 'in_progress_count', 'done_count', 'todo_budget', 'in_progress_budget', 'done_budget']
+    list_per_page = 10
+
+
 # Custom dashbord for every user
 """
 from django.contrib import admin
@@ -194,4 +307,4 @@ def delete_user_view(request, user_id):
     
     return HttpResponseForbidden("You do not have delete permission.")
 
-"""
\ No newline at end of file
+"""
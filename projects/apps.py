@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ProjectsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'projects'
+
+    def ready(self):
+        # Receivers that must also run outside of requests (management commands, workers)
+        from . import cache, chart_cache, images, realtime, scheduling, search, stats, workload  # noqa: F401
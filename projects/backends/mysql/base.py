@@ -0,0 +1,10 @@
+from django.db.backends.mysql import base
+
+from projects.db_pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    @staticmethod
+    def check_connection(connection):
+        # No silent reconnect: a new session would lack the settings made when the connection was opened
+        connection.ping(False)
@@ -0,0 +1,13 @@
+from django.db.backends.sqlite3 import base
+
+from projects.db_pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def pool_enabled(self):
+        # Closing the last connection to an in-memory database drops it, so those are never pooled
+        return super().pool_enabled() and not self.is_in_memory_db()
+
+    @staticmethod
+    def check_connection(connection):
+        connection.execute('SELECT 1').fetchone()
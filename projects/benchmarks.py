@@ -0,0 +1,257 @@
+# View benchmarks driven through the Django test client.
+# Each target is requested `warmup` times, then `iterations` times for latency, then once
+# more under tracemalloc for peak memory (tracing slows requests, so it is kept out of the
+# timed runs). Query counts and SQL/template time come from RequestMetricsMiddleware.
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.db.models import Count
+from django.test import Client
+from django.urls import reverse
+
+from .models import Division, Project, Village, Ward
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(samples_ms):
+    return {
+        'p50_ms': round(percentile(samples_ms, 50), 2),
+        'p95_ms': round(percentile(samples_ms, 95), 2),
+        'mean_ms': round(statistics.fmean(samples_ms), 2),
+        'max_ms': round(max(samples_ms), 2),
+    }
+
+
+def _request(client, url):
+    start = time.perf_counter()
+    response = client.get(url)
+    if response.streaming:
+        for _ in response.streaming_content:
+            pass
+    return (time.perf_counter() - start) * 1000, response
+
+
+def default_targets():
+    """(name, url) pairs for the views that matter, using the busiest rows in the database."""
+    project = Project.objects.annotate(n=Count('tasks')).order_by('-n', 'id').first()
+    village = Village.objects.annotate(n=Count('projects')).order_by('-n', 'id').first()
+    targets = [
+        ('index', reverse('index')),
+        ('project', reverse('project')),
+        ('admin_project_changelist', reverse('admin:projects_project_changelist')),
+        ('admin_task_changelist', reverse('admin:projects_task_changelist')),
+        ('admin_comment_changelist', reverse('admin:projects_comment_changelist')),
+    ]
+    if project:
+        targets += [
+            ('project_detail', reverse('project_detail', args=[project.id])),
+            ('project_report', reverse('project_report', args=[project.id])),
+        ]
+    if village:
+        targets += [
+            ('division_detail', reverse('division_detail', args=[Ward.objects.values_list('division_id', flat=True).get(id=village.ward_id)])),
+            ('ward_detail', reverse('ward_detail', args=[village.ward_id])),
+            ('village_detail', reverse('village_detail', args=[village.id])),
+        ]
+    elif Division.objects.exists():
+        targets.append(('division_detail', reverse('division_detail', args=[Division.objects.values_list('id', flat=True).first()])))
+    return targets
+
+
+def benchmark_user(username=None):
+    users = User.objects.filter(is_superuser=True) if username is None else User.objects.filter(username=username)
+    user = users.order_by('id').first()
+    if user is None:
+        raise User.DoesNotExist('No user to log in as; create a superuser or pass a username.')
+    return user
+
+
+def benchmark_client(username=None):
+    client = Client()
+    client.force_login(benchmark_user(username))
+    return client
+
+
+def run_benchmarks(client, targets, iterations=20, warmup=2):
+    results = {}
+    for name, url in targets:
+        for _ in range(warmup):
+            _request(client, url)
+
+        latencies, queries, sql_ms, template_ms = [], [], [], []
+        for _ in range(iterations):
+            elapsed, response = _request(client, url)
+            latencies.append(elapsed)
+            metrics = getattr(response.wsgi_request, 'metrics', None)
+            if metrics is not None:
+                queries.append(metrics.queries)
+                sql_ms.append(metrics.sql_time * 1000)
+                template_ms.append(metrics.template_time * 1000)
+
+        tracemalloc.start()
+        try:
+            _request(client, url)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        results[name] = {
+            'url': url,
+            'status': response.status_code,
+            **summarize(latencies),
+            'queries': max(queries) if queries else None,
+            'sql_p50_ms': round(percentile(sql_ms, 50), 2) if sql_ms else None,
+            'template_p50_ms': round(percentile(template_ms, 50), 2) if template_ms else None,
+            'peak_memory_kb': round(peak / 1024, 1),
+        }
+    return results
+
+
+def _load_report(latencies_ms, wall_seconds, statuses):
+    return {
+        'requests': len(latencies_ms),
+        'requests_per_second': round(len(latencies_ms) / wall_seconds, 1),
+        **summarize(latencies_ms),
+        'errors': sum(1 for status in statuses if status >= 400),
+    }
+
+
+def run_wsgi_load(user, url, total=200, concurrency=20):
+    """`total` GETs of `url` through the WSGI handler from `concurrency` threads, each with its own client."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    from django.db import close_old_connections
+
+    per_worker = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+
+    def worker(count):
+        client = Client()
+        client.force_login(user)
+        results = [_request(client, url) for _ in range(count)]
+        close_old_connections()
+        return [(elapsed, response.status_code) for elapsed, response in results]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = [item for batch in pool.map(worker, per_worker) for item in batch]
+    wall = time.perf_counter() - start
+    return _load_report([elapsed for elapsed, _ in results], wall, [status for _, status in results])
+
+
+def run_asgi_load(user, url, total=200, concurrency=20):
+    """`total` GETs of `url` through the ASGI handler, at most `concurrency` in flight on one event loop."""
+    import asyncio
+
+    from asgiref.sync import sync_to_async
+    from django.test import AsyncClient
+
+    async def main():
+        client = AsyncClient()
+        await sync_to_async(client.force_login)(user)
+        limit = asyncio.Semaphore(concurrency)
+
+        async def one():
+            async with limit:
+                started = time.perf_counter()
+                response = await client.get(url)
+                if response.streaming:
+                    async for _ in response.streaming_content:
+                        pass
+                return (time.perf_counter() - started) * 1000, response.status_code
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(total)))
+        return results, time.perf_counter() - start
+
+    results, wall = asyncio.run(main())
+    return _load_report([elapsed for elapsed, _ in results], wall, [status for _, status in results])
+
+
+# Connection handling: the same short request run against the default database with a
+# connection opened per request ('none'), kept per thread ('persistent', CONN_MAX_AGE) and
+# borrowed from the pool ('pool'). Each run gets a database alias of its own, and every
+# request goes through the close_old_connections() calls Django makes when a request starts
+# and finishes, so the difference between the modes is the per-request connection overhead.
+CONNECTION_MODES = ('none', 'persistent', 'pool')
+
+
+def connection_settings(mode, base, pool_size):
+    """Settings dict for `mode` derived from the `base` database settings."""
+    from django.conf import settings
+
+    pooled = getattr(settings, 'POOLED_ENGINES', {})
+    stock = {engine: name for name, engine in pooled.items()}
+    settings_dict = {**base, 'OPTIONS': {key: value for key, value in base['OPTIONS'].items() if key != 'pool'}}
+    settings_dict['ENGINE'] = stock.get(base['ENGINE'], base['ENGINE'])
+    settings_dict['CONN_MAX_AGE'] = 600 if mode == 'persistent' else 0
+    settings_dict['CONN_HEALTH_CHECKS'] = True
+    if mode == 'pool':
+        if settings_dict['ENGINE'] not in pooled:
+            raise ValueError(f"No pooled engine for {settings_dict['ENGINE']}.")
+        settings_dict['ENGINE'] = pooled[settings_dict['ENGINE']]
+        settings_dict['OPTIONS']['pool'] = {'max_size': pool_size}
+    return settings_dict
+
+
+def run_connection_benchmark(mode, total=2000, concurrency=8, pool_size=None, sql='SELECT 1'):
+    from concurrent.futures import ThreadPoolExecutor
+
+    from django.db import connections
+    from django.db.backends.signals import connection_created
+
+    alias = f'benchmark_{mode}'
+    connections.settings[alias] = connection_settings(mode, connections.settings['default'], pool_size or concurrency)
+    opened = []
+
+    def count_connect(sender, connection, **kwargs):
+        if connection.alias == alias:
+            opened.append(getattr(connection, 'pooled_connection_reused', False))
+
+    def worker(count):
+        connection = connections[alias]
+        latencies = []
+        for _ in range(count):
+            started = time.perf_counter()
+            connection.close_if_unusable_or_obsolete()  # request_started
+            with connection.cursor() as cursor:
+                cursor.execute(sql)
+                cursor.fetchall()
+            connection.close_if_unusable_or_obsolete()  # request_finished
+            latencies.append((time.perf_counter() - started) * 1000)
+        connection.close()
+        return latencies
+
+    per_worker = [total // concurrency + (1 if i < total % concurrency else 0) for i in range(concurrency)]
+    connection_created.connect(count_connect)
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = [elapsed for batch in executor.map(worker, per_worker) for elapsed in batch]
+        wall = time.perf_counter() - start
+        pool_report = None
+        if mode == 'pool':
+            pool_report = connections[alias].pool.stats()
+            connections[alias].close_pool()
+            del connections[alias]
+    finally:
+        connection_created.disconnect(count_connect)
+        del connections.settings[alias]
+
+    return {
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / wall, 1),
+        **summarize(latencies),
+        'connections_opened': opened.count(False),
+        'pool': pool_report,
+    }
@@ -0,0 +1,104 @@
+# Reports for every project under a Division, Ward or Village.
+# Project data is loaded in chunks (one project query and one task query per chunk) and
+# the PDFs are rendered in parallel in a process pool. The bulk_reports command gets a pool
+# of REPORT_WORKERS (default: every CPU) of its own; downloads from the web share one small
+# pool of WEB_REPORT_WORKERS per web process, so concurrent downloads never fork more.
+import os
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.utils.text import slugify
+
+from .models import Project, Task
+from .report_queue import project_report_data
+from .streaming import stream_zip
+
+
+REPORT_CHUNK_SIZE = getattr(settings, 'REPORT_CHUNK_SIZE', 200)
+WEB_REPORT_WORKERS = getattr(settings, 'WEB_REPORT_WORKERS', 2)
+
+_web_executor = None
+_web_executor_lock = threading.Lock()
+
+
+def report_workers():
+    return getattr(settings, 'REPORT_WORKERS', None) or os.cpu_count() or 1
+
+
+def web_report_executor():
+    """The process pool shared by every report download of this process, started on first use."""
+    global _web_executor
+    with _web_executor_lock:
+        if _web_executor is None:
+            _web_executor = ProcessPoolExecutor(max_workers=WEB_REPORT_WORKERS)
+        return _web_executor
+
+
+def subtree_projects(division_id=None, ward_id=None, village_id=None):
+    projects = Project.objects.all()
+    if village_id is not None:
+        projects = projects.filter(location_id=village_id)
+    elif ward_id is not None:
+        projects = projects.filter(location__ward_id=ward_id)
+    elif division_id is not None:
+        projects = projects.filter(location__ward__division_id=division_id)
+    return projects.order_by('id')
+
+
+def iter_report_data(projects, chunk_size=REPORT_CHUNK_SIZE):
+    project_ids = list(projects.values_list('id', flat=True))
+    for start in range(0, len(project_ids), chunk_size):
+        chunk_ids = project_ids[start:start + chunk_size]
+        chunk = Project.objects.select_related('supervisor').filter(id__in=chunk_ids).order_by('id')
+
+        tasks_by_project = defaultdict(list)
+        tasks = Task.objects.select_related('assigned_to').filter(project_id__in=chunk_ids).order_by('project_id', 'id')
+        for task in tasks:
+            tasks_by_project[task.project_id].append(task)
+
+        for project in chunk:
+            yield project_report_data(project, tasks_by_project[project.id])
+
+
+def render_reports_parallel(data_iter, workers=None, executor=None):
+    """Yield (data, pdf_bytes) in input order, keeping only a few reports in flight at once.
+
+    Renders in `executor` when given (it is left running), else in a pool of `workers` processes.
+    """
+    from .reports import render_project_report
+
+    workers = workers or report_workers()
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = deque()
+        for data in data_iter:
+            pending.append((data, executor.submit(render_project_report, data)))
+            if len(pending) >= workers * 2:
+                data, future = pending.popleft()
+                yield data, future.result()
+        while pending:
+            data, future = pending.popleft()
+            yield data, future.result()
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+
+
+def report_filename(data):
+    return f"{data['project_code']}_{slugify(data['project_name']) or data['project_id']}.pdf"
+
+
+def stream_reports_zip(projects, workers=None, chunk_size=REPORT_CHUNK_SIZE, executor=None):
+    rendered = render_reports_parallel(iter_report_data(projects, chunk_size), workers, executor)
+    return stream_zip((report_filename(data), pdf) for data, pdf in rendered)
+
+
+def merged_reports_pdf(projects, chunk_size=REPORT_CHUNK_SIZE):
+    # A single document cannot be split across processes without a PDF merging library,
+    # so the merged variant is rendered in one go.
+    from .reports import render_merged_report
+    return render_merged_report(iter_report_data(projects, chunk_size))
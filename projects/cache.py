@@ -0,0 +1,160 @@
+# Generation-counter cache for rendered fragments and query results.
+# Every cached value depends on one or more generations, e.g. ('project', 'task'). A
+# generation is a counter in the cache that post_save/post_delete on the matching model
+# moves on, and the current counters are part of each key, so a change to any Project
+# makes every entry that depends on 'project' unreachable without deleting anything.
+# Bulk writes that skip signals (imports, demo data, queryset updates) call bump().
+# Hits and misses are counted per entry name in this process; cache_stats() reports them.
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Comment, Division, Project, Task, Village, Ward
+
+
+PAGE_CACHE_TIMEOUT = getattr(settings, 'PAGE_CACHE_TIMEOUT', 60 * 60)
+
+# Models whose saves and deletes move a generation on, by generation name
+GENERATION_MODELS = {
+    'project': Project,
+    'task': Task,
+    'comment': Comment,
+    'division': Division,
+    'ward': Ward,
+    'village': Village,
+    'user': User,  # names shown on project pages and lists
+}
+LOCATIONS = ('division', 'ward', 'village')
+
+_lock = threading.Lock()
+_hits = Counter()
+_misses = Counter()
+
+
+def _generation_key(name):
+    return f'generation:{name}'
+
+
+def generations(names):
+    """Current counters for `names`, in order, with one cache round trip when they all exist."""
+    keys = [_generation_key(name) for name in names]
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            # Seed from the clock so an evicted counter never points back at old entries
+            cache.add(key, time.time_ns(), None)
+            found[key] = cache.get(key)
+    return tuple(found[key] for key in keys)
+
+
+def bump(*names):
+    for name in names:
+        key = _generation_key(name)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), None)
+
+
+def make_key(name, depends_on, *parts):
+    stamp = '.'.join(str(generation) for generation in generations(depends_on))
+    digest = hashlib.md5(repr(parts).encode(), usedforsecurity=False).hexdigest() if parts else '-'
+    return f'fragment:{name}:{stamp}:{digest}'
+
+
+def record(name, hit):
+    with _lock:
+        (_hits if hit else _misses)[name] += 1
+
+
+def cached(name, depends_on, compute, *parts, timeout=PAGE_CACHE_TIMEOUT):
+    """compute() through the cache, keyed by `name`, `parts` and the generations in `depends_on`."""
+    key = make_key(name, depends_on, *parts)
+    value = cache.get(key)
+    record(name, value is not None)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout)
+    return value
+
+
+def cache_stats():
+    with _lock:
+        names = sorted(set(_hits) | set(_misses))
+        entries = {
+            name: {
+                'hits': _hits[name],
+                'misses': _misses[name],
+                'hit_rate': round(_hits[name] / (_hits[name] + _misses[name]), 4),
+            }
+            for name in names
+        }
+    hits, misses = sum(entry['hits'] for entry in entries.values()), sum(entry['misses'] for entry in entries.values())
+    return {
+        'backend': settings.CACHES['default']['BACKEND'],
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+        'entries': entries,
+        'generations': dict(zip(GENERATION_MODELS, generations(list(GENERATION_MODELS)))),
+    }
+
+
+def reset_cache_stats():
+    with _lock:
+        _hits.clear()
+        _misses.clear()
+
+
+class _PendingBumps(set):
+    flushed = False
+
+    def flush(self):
+        self.flushed = True
+        bump(*self)
+
+
+def bump_on_commit(name, using=DEFAULT_DB_ALIAS):
+    """bump() once the surrounding transaction commits, so readers never cache pre-commit rows under the new generation."""
+    connection = connections[using]
+    if not connection.in_atomic_block:
+        bump(name)
+        return
+    pending = getattr(connection, 'pending_generations', None)
+    # One hook per transaction however many rows it writes; a rollback discards it
+    # A flushed set can still be listed: TestCase runs captured on_commit hooks without removing them
+    if pending is None or pending.flushed or not any(hook[1] == pending.flush for hook in connection.run_on_commit):
+        pending = _PendingBumps()
+        connection.pending_generations = pending
+        transaction.on_commit(pending.flush, using=using)
+    pending.add(name)
+
+
+# Connected from ProjectsConfig.ready(), so saves made by management commands and the worker count too
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Division)
+@receiver(post_delete, sender=Division)
+@receiver(post_save, sender=Ward)
+@receiver(post_delete, sender=Ward)
+@receiver(post_save, sender=Village)
+@receiver(post_delete, sender=Village)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def bump_generation(sender, raw=False, using=DEFAULT_DB_ALIAS, update_fields=None, **kwargs):
+    # A login only moves last_login, which no page shows
+    if raw or (sender is User and update_fields == {'last_login'}):
+        return
+    bump_on_commit(sender._meta.model_name, using)
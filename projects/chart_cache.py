@@ -0,0 +1,70 @@
+# Cache of the project_detail chart specs.
+# Entries are keyed by project id and a version stamp; saving or deleting a Project or
+# one of its Tasks (or changing task dependencies) moves the stamp on, so stale specs are
+# simply never read again. projects/scheduling.py keys its schedules by the same stamp.
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Project, Task
+
+
+CHART_CACHE_TIMEOUT = getattr(settings, 'CHART_CACHE_TIMEOUT', 60 * 60 * 24)
+
+
+def _version_key(project_id):
+    return f'charts:project:{project_id}:version'
+
+
+def project_chart_version(project_id):
+    key = _version_key(project_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed from the clock so an evicted stamp never points back at old entries.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def project_chart_versions(project_ids):
+    """{project id: version} for many projects, with one cache round trip when the stamps exist."""
+    keys = {_version_key(project_id): project_id for project_id in project_ids}
+    versions = {keys[key]: version for key, version in cache.get_many(list(keys)).items()}
+    for project_id in set(project_ids) - set(versions):
+        versions[project_id] = project_chart_version(project_id)
+    return versions
+
+
+def invalidate_project_charts(project_id):
+    key = _version_key(project_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def get_project_charts(project):
+    key = f'charts:project:{project.id}:{project_chart_version(project.id)}'
+    charts = cache.get(key)
+    if charts is None:
+        # Plotly is heavy, so it is only imported on a cache miss
+        from .charts import build_project_charts
+        charts = build_project_charts(project)
+        cache.set(key, charts, CHART_CACHE_TIMEOUT)
+    return charts
+
+
+# Connected from ProjectsConfig.ready(), so saves made by management commands and the worker count too
+@receiver(post_save, sender=Project)
+@receiver(pre_delete, sender=Project)
+def invalidate_charts_for_project(sender, instance, **kwargs):
+    invalidate_project_charts(instance.id)
+
+
+@receiver(post_save, sender=Task)
+@receiver(pre_delete, sender=Task)
+def invalidate_charts_for_task(sender, instance, **kwargs):
+    invalidate_project_charts(instance.project_id)
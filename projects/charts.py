@@ -0,0 +1,91 @@
+# Plotly figure specs for the project pages.
+# Kept out of views.py so plotly is only imported by the first request that draws a chart.
+# The specs are plain JSON; the browser renders them with the static plotly.js bundle.
+import json
+
+import plotly.graph_objects as go
+
+from .models import ProjectStats, Task
+from .scheduling import ScheduleError, project_schedule
+from .stats import rebuild_project_stats
+
+
+def create_gantt_chart(gantt_data):
+    fig = go.Figure()
+    legend_shown = set()
+
+    for row in gantt_data:
+        # Rows flagged Critical (on the critical path) are drawn in red
+        fig.add_trace(go.Scatter(
+            x=[row['Start'], row['Finish']],
+            y=[row['Task'], row['Task']],
+            mode='lines',
+            line=dict(width=20, color='#d62728' if row.get('Critical') else '#1f77b4'),
+            name=row['Resource'],
+            legendgroup=row['Resource'],
+            showlegend=row['Resource'] not in legend_shown,
+        ))
+        legend_shown.add(row['Resource'])
+
+    fig.update_layout(
+        title='Project Timeline',
+        xaxis_title='Date',
+        yaxis_title='Task',
+        showlegend=True,
+        hovermode='x unified',
+        margin=dict(l=20, r=20, t=40, b=20),
+    )
+
+    return json.loads(fig.to_json())
+
+
+def create_budget_pie_chart(labels, values):
+    pie_chart = go.Figure(data=[go.Pie(labels=labels, values=values, hole=.3)])
+    pie_chart.update_layout(title_text='Tasks Budget Distribution')
+    return json.loads(pie_chart.to_json())
+
+
+def build_project_charts(project):
+    # Prepare Gantt chart data: tasks drawn where the dependency schedule places them
+    try:
+        schedule = project_schedule(project)
+    except ScheduleError:
+        schedule = None
+
+    if schedule is not None:
+        gantt_data = [
+            {
+                'Task': task.name,
+                'Start': task.early_start,
+                'Finish': task.early_finish,
+                'Resource': 'Critical path' if task.critical else project.project_name,
+                'Critical': task.critical,
+            }
+            for task in schedule.tasks.values()
+        ]
+    else:
+        # Dependencies form a cycle, so fall back to the planned dates
+        tasks = Task.objects.filter(project_id=project.id)
+        gantt_data = [
+            {
+                'Task': task_name,
+                'Start': start_date or project.start_date,
+                'Finish': due_date,
+                'Resource': project.project_name,
+            }
+            for task_name, start_date, due_date in tasks.values_list('task_name', 'start_date', 'due_date')
+        ]
+
+    # Prepare data for Tasks Budget Distribution (Pie chart), from the ProjectStats rollup
+    stats = ProjectStats.objects.filter(project_id=project.id).first()
+    if stats is None:
+        rebuild_project_stats([project.id])
+        stats = ProjectStats.objects.get(project_id=project.id)
+    budgets = [(status, budget) for status, budget in stats.budget_by_status().items() if budget]
+    labels = [status for status, _ in budgets]
+    values = [float(budget) for _, budget in budgets]
+
+    return {
+        'gantt': create_gantt_chart(gantt_data) if gantt_data else None,
+        'pie': create_budget_pie_chart(labels, values),
+    }
@@ -0,0 +1,115 @@
+# Conditional GET (ETag / Last-Modified) for the read views.
+# Project, Task and Comment carry an updated_at timestamp. The validators of a project page
+# come from one aggregate query: the project's own timestamp plus the newest timestamp and
+# the row count of its tasks and of its comments. The counts are part of the ETag because
+# a delete leaves no newer timestamp behind. Users have no timestamp, so the 'user' cache
+# generation (projects/cache.py), which any change to a user moves on, stands in for the
+# supervisor, assignee and commenter names the pages show. The ETag also names the user,
+# since the pages are rendered for whoever is logged in.
+# Sync views use django.views.decorators.http.condition with project_etag/project_last_modified
+# (both read one memoised query); async views run project_state() in a thread and answer with
+# not_modified()/add_validators() themselves, as condition() would query inside the event loop.
+import hashlib
+from typing import NamedTuple, Optional
+
+from django.db.models import Count, IntegerField, Max, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from .cache import generations
+from .models import Comment, Project, ReportJob, Task
+
+
+class Validators(NamedTuple):
+    etag: str
+    last_modified: Optional[object]  # aware datetime
+
+
+def _project_rows(model):
+    return model.objects.filter(project_id=OuterRef('pk')).order_by().values('project_id')
+
+
+def _latest_change(model):
+    return Subquery(_project_rows(model).annotate(value=Max('updated_at')).values('value')[:1])
+
+
+def _row_count(model):
+    return Subquery(_project_rows(model).annotate(value=Count('id')).values('value')[:1], output_field=IntegerField())
+
+
+def project_state_query(project_id):
+    return Project.objects.filter(id=project_id).annotate(
+        task_changed=_latest_change(Task),
+        task_count=_row_count(Task),
+        comment_changed=_latest_change(Comment),
+        comment_count=_row_count(Comment),
+    ).values_list('updated_at', 'task_changed', 'task_count', 'comment_changed', 'comment_count')
+
+
+def project_state(project_id):
+    """(updated_at, newest task change, task count, newest comment change, comment count, user generation), or None."""
+    state = project_state_query(project_id).first()
+    return None if state is None else (*state, *generations(['user']))
+
+
+def make_validators(state, user_id=None):
+    digest = hashlib.sha1(repr((state, user_id)).encode(), usedforsecurity=False).hexdigest()[:20]
+    timestamps = [value for value in state if hasattr(value, 'timestamp')]
+    return Validators(digest, max(timestamps) if timestamps else None)
+
+
+def project_validators(request, project_id):
+    """Validators of a project page, memoised on the request; None when the project does not exist."""
+    memo = request.__dict__.setdefault('_project_validators', {})
+    if project_id not in memo:
+        state = project_state(project_id)
+        memo[project_id] = None if state is None else make_validators(state, request.user.pk)
+    return memo[project_id]
+
+
+def project_etag(request, project_id, **kwargs):
+    validators = project_validators(request, project_id)
+    return validators.etag if validators else None
+
+
+def project_last_modified(request, project_id, **kwargs):
+    validators = project_validators(request, project_id)
+    return validators.last_modified if validators else None
+
+
+def _report_state(request, job_id):
+    memo = request.__dict__
+    if '_report_state' not in memo:
+        memo['_report_state'] = (
+            ReportJob.objects.filter(id=job_id, status=ReportJob.STATUS_DONE)
+            .values_list('fingerprint', 'finished_at').first()
+        )
+    return memo['_report_state']
+
+
+# A finished report never changes: its fingerprint is a hash of the data it was rendered from
+def report_etag(request, job_id, **kwargs):
+    state = _report_state(request, job_id)
+    return f'{job_id}-{state[0]}' if state else None
+
+
+def report_last_modified(request, job_id, **kwargs):
+    state = _report_state(request, job_id)
+    return state[1] if state else None
+
+
+def not_modified(request, validators):
+    """The 304 (or 412) response for `validators`, or None when the view has to render."""
+    last_modified = int(validators.last_modified.timestamp()) if validators.last_modified else None
+    response = get_conditional_response(request, etag=quote_etag(validators.etag), last_modified=last_modified)
+    # A 304 repeats the validators, as @condition does
+    if response is not None and response.status_code == 304:
+        add_validators(response, validators)
+    return response
+
+
+def add_validators(response, validators):
+    response.headers.setdefault('ETag', quote_etag(validators.etag))
+    if validators.last_modified:
+        response.headers.setdefault('Last-Modified', http_date(validators.last_modified.timestamp()))
+    return response
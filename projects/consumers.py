@@ -0,0 +1,30 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from .models import Project
+from .realtime import project_group
+
+
+class ProjectConsumer(AsyncJsonWebsocketConsumer):
+    """Joins the project's group and forwards the deltas projects.realtime sends to it."""
+
+    async def connect(self):
+        user = self.scope.get('user')
+        self.project_id = self.scope['url_route']['kwargs']['project_id']
+        if user is None or not user.is_authenticated or not await self.project_exists():
+            await self.close()
+            return
+        self.group_name = project_group(self.project_id)
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def project_update(self, event):
+        await self.send_json(event['data'])
+
+    @database_sync_to_async
+    def project_exists(self):
+        return Project.objects.filter(id=self.project_id).exists()
@@ -0,0 +1,278 @@
+# Bounded database connection pool for backends without one of their own (MySQL, SQLite).
+# The pooled engines in projects/backends/ take connections from a ConnectionPool instead of
+# opening them, and closing a connection (which Django does at the end of every request with
+# CONN_MAX_AGE = 0) hands it back. Each worker process keeps at most `max_size` connections
+# per database; a request that finds them all in use waits up to `timeout` seconds and then
+# gets PoolTimeout. Because connections go back to the pool when the request ends rather than
+# staying with a thread, this is safe under ASGI, where Django runs each request's sync code
+# in a thread of its own.
+# A connection is checked before it is handed out (with CONN_HEALTH_CHECKS), replaced after
+# `max_lifetime` seconds or `max_idle` idle seconds, and closed instead of pooled if it is
+# returned inside a transaction. A connection whose owner is garbage collected without
+# closing it is closed and its slot freed.
+#
+#   DATABASES['default'] = {'ENGINE': 'projects.backends.mysql', 'CONN_MAX_AGE': 0,
+#                           'CONN_HEALTH_CHECKS': True, 'OPTIONS': {'pool': {'max_size': 10}}, ...}
+import threading
+import time
+import weakref
+from collections import Counter, deque
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.base.base import NO_DB_ALIAS
+from django.db.utils import OperationalError
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, connect, check=None, *, max_size=10, timeout=10.0, max_lifetime=30 * 60, max_idle=5 * 60, name=''):
+        if max_size < 1:
+            raise ImproperlyConfigured('The connection pool needs a max_size of at least 1.')
+        self.connect = connect  # () -> new DB-API connection
+        self.check = check  # (connection) -> None, raises when the connection is unusable
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.name = name
+        self.closed = False
+        self._idle = deque()  # (connection, opened at, returned at), most recently returned last
+        self._opened_at = {}  # id(connection) -> monotonic time it was opened, for idle and in-use connections
+        self._owners = {}  # id(connection) -> weakref.finalize for its current owner
+        self._size = 0
+        self._condition = threading.Condition()
+        self._counts = Counter()
+        self._wait_time = 0.0
+        self._max_wait = 0.0
+
+    def _open(self):
+        """A new connection for a slot already counted in _size."""
+        try:
+            connection = self.connect()
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._opened_at[id(connection)] = time.monotonic()
+            self._counts['connects'] += 1
+        return connection
+
+    def _discard(self, connection, reason):
+        """Close `connection` and free its slot."""
+        try:
+            connection.close()
+        except Exception:
+            pass
+        with self._condition:
+            self._opened_at.pop(id(connection), None)
+            self._size -= 1
+            self._counts[reason] += 1
+            self._condition.notify()
+
+    def _expired(self, opened_at, returned_at, now):
+        return (
+            (self.max_lifetime is not None and now - opened_at > self.max_lifetime)
+            or (self.max_idle is not None and now - returned_at > self.max_idle)
+        )
+
+    def checkout(self, owner=None, check=True):
+        """(connection, reused) for `owner`; waits for a free slot for up to `timeout` seconds.
+
+        `reused` is False for a connection opened by this call.
+        """
+        started = time.monotonic()
+        waited = False
+        connection = None
+        while connection is None:
+            with self._condition:
+                while True:
+                    if self.closed:
+                        raise OperationalError(f'Connection pool {self.name!r} is closed.')
+                    if self._idle:
+                        # The most recently returned connection, so surplus ones sit idle and expire
+                        entry = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        entry = None
+                        break
+                    remaining = self.timeout - (time.monotonic() - started)
+                    if remaining <= 0:
+                        self._counts['timeouts'] += 1
+                        raise PoolTimeout(
+                            f'No connection free in pool {self.name!r} ({self.max_size} in use) after {self.timeout} s.'
+                        )
+                    waited = True
+                    self._condition.wait(remaining)
+
+            if entry is None:
+                connection, reused = self._open(), False
+                break
+            candidate, opened_at, returned_at = entry
+            if self._expired(opened_at, returned_at, time.monotonic()):
+                self._discard(candidate, 'expired')
+            elif check and self.check is not None and not self._usable(candidate):
+                self._discard(candidate, 'reconnects')
+            else:
+                connection, reused = candidate, True
+
+        with self._condition:
+            self._counts['checkouts'] += 1
+            if waited:
+                wait = time.monotonic() - started
+                self._counts['waits'] += 1
+                self._wait_time += wait
+                self._max_wait = max(self._max_wait, wait)
+            if owner is not None:
+                finalizer = weakref.finalize(owner, self._lost, connection)
+                finalizer.atexit = False
+                self._owners[id(connection)] = finalizer
+        return connection, reused
+
+    def getconn(self, owner=None, check=True):
+        return self.checkout(owner, check)[0]
+
+    def _usable(self, connection):
+        try:
+            self.check(connection)
+        except Exception:
+            return False
+        return True
+
+    def _lost(self, connection):
+        self._owners.pop(id(connection), None)
+        self._discard(connection, 'lost')
+
+    def putconn(self, connection, discard=False):
+        """Give `connection` back; with `discard` (or once the pool is closed) it is closed instead."""
+        finalizer = self._owners.pop(id(connection), None)
+        if finalizer is not None:
+            finalizer.detach()
+        now = time.monotonic()
+        with self._condition:
+            opened_at = self._opened_at.get(id(connection), now)
+            keep = not discard and not self.closed and not self._expired(opened_at, now, now)
+            if keep:
+                self._idle.append((connection, opened_at, now))
+                self._condition.notify()
+                return
+        self._discard(connection, 'discarded' if discard else 'expired')
+
+    def close(self):
+        """Close the idle connections; connections in use are closed when they come back."""
+        with self._condition:
+            self.closed = True
+            idle, self._idle = list(self._idle), deque()
+            self._condition.notify_all()
+        for connection, _, _ in idle:
+            self._discard(connection, 'closed')
+
+    def stats(self):
+        with self._condition:
+            counts = dict(self._counts)
+            idle = len(self._idle)
+            size = self._size
+            wait_time, max_wait = self._wait_time, self._max_wait
+        return {
+            'max_size': self.max_size,
+            'size': size,
+            'idle': idle,
+            'in_use': size - idle,
+            **{name: counts.get(name, 0) for name in (
+                'checkouts', 'waits', 'timeouts', 'connects', 'reconnects', 'expired', 'discarded', 'lost', 'closed',
+            )},
+            'wait_ms_total': round(wait_time * 1000, 2),
+            'wait_ms_max': round(max_wait * 1000, 2),
+        }
+
+
+class PooledDatabaseWrapperMixin:
+    """DatabaseWrapper mixin that opens connections from a ConnectionPool configured in OPTIONS['pool'].
+
+    Subclasses implement check_connection(connection), a staticmethod, for the health check.
+    """
+    _connection_pools = {}
+    _pools_lock = threading.Lock()
+
+    def _pool_key(self):
+        # The test runner renames the database; its connections get a pool of their own
+        return (self.alias, self.vendor, str(self.settings_dict['NAME']))
+
+    def pool_enabled(self):
+        return self.alias != NO_DB_ALIAS and bool(self.settings_dict['OPTIONS'].get('pool'))
+
+    @property
+    def pool(self):
+        if not self.pool_enabled():
+            return None
+        key = self._pool_key()
+        pool = self._connection_pools.get(key)
+        if pool is None:
+            if self.settings_dict.get('CONN_MAX_AGE', 0) != 0:
+                raise ImproperlyConfigured("Pooled connections don't support CONN_MAX_AGE; set it to 0.")
+            options = self.settings_dict['OPTIONS']['pool']
+            options = {} if options is True else dict(options)
+            connect_params = self.get_connection_params()
+            pool = ConnectionPool(
+                lambda: super(PooledDatabaseWrapperMixin, self).get_new_connection(connect_params),
+                check=type(self).check_connection if self.settings_dict['CONN_HEALTH_CHECKS'] else None,
+                name=':'.join(key),
+                **options,
+            )
+            with self._pools_lock:
+                pool = self._connection_pools.setdefault(key, pool)
+        return pool
+
+    def close_pool(self):
+        with self._pools_lock:
+            pool = self._connection_pools.pop(self._pool_key(), None)
+        if pool is not None:
+            pool.close()
+
+    @staticmethod
+    def check_connection(connection):
+        raise NotImplementedError
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop('pool', None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            self.pooled_connection_reused = False
+            return super().get_new_connection(conn_params)
+        connection, self.pooled_connection_reused = pool.checkout(owner=self)
+        return connection
+
+    def init_connection_state(self):
+        # A pooled connection keeps the session settings it was given when it was opened
+        if not getattr(self, 'pooled_connection_reused', False):
+            super().init_connection_state()
+
+    def _close(self):
+        pool = self.pool
+        if pool is None or self.connection is None:
+            return super()._close()
+        connection, self.connection = self.connection, None
+        discard = self.in_atomic_block
+        if not discard and not self.autocommit:
+            # Never hand the next request an open transaction
+            try:
+                connection.rollback()
+            except self.Database.Error:
+                discard = True
+        with self.wrap_database_errors:
+            pool.putconn(connection, discard=discard)
+
+
+def pool_stats():
+    """Stats of every connection pool in this process, by pool name."""
+    pools = list(PooledDatabaseWrapperMixin._connection_pools.values())
+    return {pool.name: pool.stats() for pool in pools}
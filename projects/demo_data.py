@@ -0,0 +1,209 @@
+# Synthetic district data for load testing.
+# Everything is written with bulk_create, so derived data (ProjectStats, the search index,
+# the cached location tree) is rebuilt once at the end instead of through signals.
+# The same seed and sizes always produce the same rows. Demo rows are recognisable by
+# their names (DEMO- project codes, "Demo Division" divisions, demo_user_ users) so
+# clear_demo_data() can remove them again.
+import datetime
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+
+from .locations import invalidate_location_tree
+from .models import ActivityLog, Comment, Division, Project, Task, TaskPlan, Village, Ward
+
+
+BATCH_SIZE = 2000
+CODE_PREFIX = 'DEMO-'
+DIVISION_PREFIX = 'Demo Division'
+USER_PREFIX = 'demo_user_'
+
+TASK_STATES = ['Planning', 'Procurement', 'Construction', 'Inspection', 'Handover']
+FUNDS = ['Central Government', 'District Council', 'World Bank', 'TASAF', 'Community Contribution']
+MODELS = ['Force Account', 'Contractor', 'Community']
+SUBJECTS = ['classroom', 'dispensary', 'borehole', 'road', 'bridge', 'market', 'water tank', 'ward office']
+VERBS = ['Construction of', 'Rehabilitation of', 'Extension of', 'Maintenance of']
+TASK_NAMES = ['Site clearing', 'Foundation', 'Walling', 'Roofing', 'Plastering', 'Electrical works', 'Plumbing', 'Painting', 'Fencing', 'Final inspection']
+WORDS = (
+    'materials delivered contractor site progress delayed rain cement funds approved inspection '
+    'community labour report budget revised handover quality engineer ward meeting'
+).split()
+
+
+def _sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def clear_demo_data():
+    projects = Project.objects.filter(project_code__startswith=CODE_PREFIX)
+    logged = {
+        Project: list(projects.values_list('id', flat=True)),
+        Task: list(Task.objects.filter(project__in=projects).values_list('id', flat=True)),
+        Comment: list(Comment.objects.filter(project__in=projects).values_list('id', flat=True)),
+    }
+    projects.delete()
+    Division.objects.filter(division_name__startswith=DIVISION_PREFIX).delete()
+    User.objects.filter(username__startswith=USER_PREFIX).delete()
+    invalidate_location_tree()
+    # After the deletes' own activity entries are written, which happens on commit as well
+    transaction.on_commit(lambda: _clear_demo_activity(logged))
+
+
+def _clear_demo_activity(logged):
+    """Delete the activity log entries of the demo objects, generated or logged while they were deleted."""
+    content_types = ContentType.objects.get_for_models(*logged)
+    for model, ids in logged.items():
+        for start in range(0, len(ids), BATCH_SIZE):
+            ActivityLog.objects.filter(content_type=content_types[model], object_id__in=ids[start:start + BATCH_SIZE]).delete()
+
+
+def _spread(model, field, since_id, days, now):
+    """Spread rows inserted after `since_id` over the last `days` days (auto_now_add overwrote them)."""
+    ids = list(model.objects.filter(id__gt=since_id).values_list('id', flat=True))
+    if not ids or not days:
+        return
+    step = max(1, len(ids) // days)
+    for day, start in enumerate(range(0, len(ids), step)):
+        chunk = ids[start:start + step]
+        model.objects.filter(id__gte=chunk[0], id__lte=chunk[-1]).update(
+            **{field: now - datetime.timedelta(days=min(day, days - 1))}
+        )
+
+
+def _max_id(model):
+    return model.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def generate_demo_data(divisions=5, wards=6, villages=8, projects=1000, tasks=20, comments=5,
+                       activity=20000, users=50, days=365, seed=1, log=None):
+    """Create the demo district. Sizes of wards/villages/tasks/comments are per parent."""
+    rng = random.Random(seed)
+    now = timezone.now()
+    say = log or (lambda message: None)
+    counts = {}
+
+    with transaction.atomic():
+        password = make_password(None)
+        User.objects.bulk_create(
+            [User(username=f'{USER_PREFIX}{i}', first_name=f'Demo{i}', last_name='User', password=password) for i in range(users)],
+            batch_size=BATCH_SIZE,
+        )
+        user_ids = list(User.objects.filter(username__startswith=USER_PREFIX).values_list('id', flat=True))
+        states = [TaskPlan.objects.get_or_create(task_state=name)[0].pk for name in TASK_STATES]
+
+        Division.objects.bulk_create([Division(division_name=f'{DIVISION_PREFIX} {d + 1}') for d in range(divisions)])
+        division_ids = list(Division.objects.filter(division_name__startswith=DIVISION_PREFIX).values_list('id', flat=True))
+        Ward.objects.bulk_create(
+            [Ward(division_id=division_id, ward_name=f'Ward {w + 1}') for division_id in division_ids for w in range(wards)],
+            batch_size=BATCH_SIZE,
+        )
+        ward_ids = list(Ward.objects.filter(division_id__in=division_ids).values_list('id', flat=True))
+        Village.objects.bulk_create(
+            [Village(ward_id=ward_id, village_name=f'Village {v + 1}') for ward_id in ward_ids for v in range(villages)],
+            batch_size=BATCH_SIZE,
+        )
+        village_ids = list(Village.objects.filter(ward_id__in=ward_ids).values_list('id', flat=True))
+        counts.update(users=len(user_ids), divisions=len(division_ids), wards=len(ward_ids), villages=len(village_ids))
+        say(f"Locations: {len(division_ids)} divisions, {len(ward_ids)} wards, {len(village_ids)} villages")
+
+        first = _max_id(Project)
+        batch = []
+        for i in range(projects):
+            start = now - datetime.timedelta(days=rng.randint(0, days))
+            batch.append(Project(
+                project_code=f'{CODE_PREFIX}{seed}-{i:06d}',
+                project_name=f'{rng.choice(VERBS)} {rng.choice(SUBJECTS)} {i}',
+                supervisor_id=rng.choice(user_ids) if user_ids else None,
+                location_id=rng.choice(village_ids) if village_ids else None,
+                implementation_model=rng.choice(MODELS),
+                total_cost=Decimal(rng.randint(50, 5000) * 1000),
+                start_date=start,
+                end_date=start + datetime.timedelta(days=rng.randint(30, 720)),
+                source_of_fund=rng.choice(FUNDS),
+                description=' '.join(_sentence(rng) for _ in range(rng.randint(2, 6))),
+                evaluation_percentage=Decimal(rng.randint(0, 100)),
+            ))
+        Project.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+        project_rows = list(
+            Project.objects.filter(id__gt=first, project_code__startswith=CODE_PREFIX)
+            .order_by('id').values_list('id', 'total_cost', 'start_date')
+        )
+        counts['projects'] = len(project_rows)
+        say(f'Projects: {len(project_rows)}')
+
+        first_task = _max_id(Task)
+        batch = []
+        for project_id, total_cost, start in project_rows:
+            for t in range(tasks):
+                due_date = (start + datetime.timedelta(days=rng.randint(7, 365))).date()
+                batch.append(Task(
+                    project_id=project_id,
+                    task_name=f'{TASK_NAMES[t % len(TASK_NAMES)]} {t + 1}',
+                    description=_sentence(rng),
+                    task_state_id=rng.choice(states),
+                    assigned_to_id=rng.choice(user_ids),
+                    start_date=max(due_date - datetime.timedelta(days=rng.randint(3, 60)), start.date()),
+                    due_date=due_date,
+                    status=rng.choices(['To Do', 'In Progress', 'Done'], weights=[3, 2, 5])[0],
+                    budget=(total_cost / tasks * Decimal(rng.uniform(0.2, 1.0))).quantize(Decimal('0.01')),
+                ))
+            if len(batch) >= BATCH_SIZE * 5:
+                Task.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+                batch = []
+        Task.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+        counts['tasks'] = Task.objects.filter(id__gt=first_task).count()
+        say(f"Tasks: {counts['tasks']}")
+
+        # About half of the tasks wait for the one created before them in the same project
+        TaskDependency = Task.depends_on.through
+        dependencies, previous = [], (None, None)
+        for project_id, task_id in Task.objects.filter(id__gt=first_task).order_by('project_id', 'id').values_list('project_id', 'id'):
+            if previous[0] == project_id and rng.random() < 0.5:
+                dependencies.append(TaskDependency(from_task_id=task_id, to_task_id=previous[1]))
+            previous = (project_id, task_id)
+        TaskDependency.objects.bulk_create(dependencies, batch_size=BATCH_SIZE)
+        counts['task_dependencies'] = len(dependencies)
+        say(f"Task dependencies: {len(dependencies)}")
+
+        first_comment = _max_id(Comment)
+        Comment.objects.bulk_create(
+            [Comment(project_id=project_id, user_id=rng.choice(user_ids), content=_sentence(rng, rng.randint(6, 30)))
+             for project_id, _, _ in project_rows for _ in range(comments)],
+            batch_size=BATCH_SIZE,
+        )
+        _spread(Comment, 'created_at', first_comment, days, now)
+        counts['comments'] = len(project_rows) * comments
+
+        first_log = _max_id(ActivityLog)
+        content_types = ContentType.objects.get_for_models(Project, Task)
+        project_type, task_type = content_types[Project], content_types[Task]
+        task_ids = list(Task.objects.filter(id__gt=first_task).values_list('id', flat=True)) or [0]
+        batch = []
+        for i in range(activity):
+            if i % 4 == 0 or not tasks:
+                content_type, object_id, label = project_type, rng.choice(project_rows)[0], 'Project'
+            else:
+                content_type, object_id, label = task_type, rng.choice(task_ids), 'Task'
+            action = rng.choice(['Created', 'Updated', 'Updated', 'Updated', 'Deleted'])
+            batch.append(ActivityLog(action=action, content_type=content_type, object_id=object_id, description=f'{label} {object_id} {action.lower()}'))
+        ActivityLog.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+        _spread(ActivityLog, 'timestamp', first_log, days, now)
+        counts['activity_log'] = activity
+        say(f'Comments: {counts["comments"]}, activity log entries: {activity}')
+
+    from .cache import GENERATION_MODELS, bump
+    from .search import rebuild_search_index
+    from .stats import rebuild_project_stats
+    from .workload import invalidate_workload
+
+    rebuild_project_stats([row[0] for row in project_rows])
+    rebuild_search_index()
+    invalidate_location_tree()
+    invalidate_workload()
+    bump(*GENERATION_MODELS)
+    return counts
@@ -0,0 +1,170 @@
+# Streaming CSV/XLSX exports of projects and tasks.
+# Rows are read in primary-key chunks (WHERE id > last ORDER BY id LIMIT n), which keeps
+# memory flat on every backend; pymysql would otherwise buffer a whole result set client-side.
+# Names of related users, projects and task states are resolved per chunk with one
+# in_bulk-style query each, and locations come from the in-process location tree.
+import csv
+import datetime
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.contrib.auth.models import User
+from django.conf import settings
+
+from .locations import location_tree
+from .models import Project, Task, TaskPlan
+from .streaming import Echo, stream_zip
+
+
+EXPORT_CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+
+PROJECT_COLUMNS = [
+    'ID', 'Project Code', 'Project Name', 'Supervisor', 'Division', 'Ward', 'Village', 'Total Cost',
+    'Start Date', 'End Date', 'Source of Fund', 'Implementation Model', 'Evaluation %',
+]
+TASK_COLUMNS = [
+    'ID', 'Project Code', 'Project Name', 'Task Name', 'Task State', 'Assigned To', 'Due Date', 'Status', 'Budget',
+]
+
+
+def iter_chunks(queryset, fields, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of value tuples (id first) in primary-key order."""
+    queryset = queryset.order_by('id').values_list('id', *fields)
+    last_id = 0
+    while True:
+        chunk = list(queryset.filter(id__gt=last_id)[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1][0]
+
+
+def _user_names(user_ids):
+    return {
+        user_id: f'{first} {last}'.strip() or username
+        for user_id, username, first, last in User.objects.filter(id__in=user_ids).values_list('id', 'username', 'first_name', 'last_name')
+    }
+
+
+def _location(tree, village_id):
+    if village_id not in tree.village_index:
+        return '', '', ''
+    ward_id = tree.village_ward_id(village_id)
+    return tree.division_name(tree.ward_division_id(ward_id)), tree.ward_name(ward_id), tree.village_name(village_id)
+
+
+def project_rows(queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    queryset = Project.objects.all() if queryset is None else queryset
+    tree = location_tree()
+    fields = ['project_code', 'project_name', 'supervisor_id', 'location_id', 'total_cost', 'start_date', 'end_date',
+              'source_of_fund', 'implementation_model', 'evaluation_percentage']
+    for chunk in iter_chunks(queryset, fields, chunk_size):
+        users = _user_names({row[3] for row in chunk if row[3]})
+        for (pk, code, name, supervisor_id, location_id, cost, start, end, fund, model, evaluation) in chunk:
+            yield [pk, code, name, users.get(supervisor_id, ''), *_location(tree, location_id), cost, start, end, fund, model or '', evaluation]
+
+
+def task_rows(queryset=None, chunk_size=EXPORT_CHUNK_SIZE):
+    queryset = Task.objects.all() if queryset is None else queryset
+    states = dict(TaskPlan.objects.values_list('id', 'task_state'))
+    fields = ['project_id', 'task_name', 'task_state_id', 'assigned_to_id', 'due_date', 'status', 'budget']
+    for chunk in iter_chunks(queryset, fields, chunk_size):
+        users = _user_names({row[4] for row in chunk})
+        projects = {
+            project_id: (code, name)
+            for project_id, code, name in Project.objects.filter(id__in={row[1] for row in chunk}).values_list('id', 'project_code', 'project_name')
+        }
+        for (pk, project_id, name, state_id, assigned_to_id, due_date, status, budget) in chunk:
+            code, project_name = projects.get(project_id, ('', ''))
+            yield [pk, code, project_name, name, states.get(state_id, ''), users.get(assigned_to_id, ''), due_date, status, budget]
+
+
+def _text(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return '' if value is None else str(value)
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([_text(value) for value in row])
+
+
+# Minimal SpreadsheetML package: one worksheet with inline strings, written row by row.
+_XLSX_PARTS = [
+    ('[Content_Types].xml', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    )),
+    ('_rels/.rels', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    )),
+    ('xl/_rels/workbook.xml.rels', (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'
+    )),
+]
+
+_ILLEGAL_XML = dict.fromkeys(i for i in range(32) if i not in (9, 10, 13))
+
+
+def _xlsx_cell(value):
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return f'<c><v>{value}</v></c>'
+    text = escape(_text(value).translate(_ILLEGAL_XML))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_sheet(columns, rows):
+    yield (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+    ).encode()
+    yield ('<row>' + ''.join(_xlsx_cell(column) for column in columns) + '</row>').encode()
+    batch = []
+    for row in rows:
+        batch.append('<row>' + ''.join(_xlsx_cell(value) for value in row) + '</row>')
+        if len(batch) >= 500:
+            yield ''.join(batch).encode()
+            batch = []
+    yield (''.join(batch) + '</sheetData></worksheet>').encode()
+
+
+def stream_xlsx(columns, rows, sheet_name='Sheet1'):
+    workbook = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        f'<sheets><sheet name="{escape(sheet_name[:31])}" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    )
+    parts = [(name, content.encode()) for name, content in _XLSX_PARTS]
+    parts.append(('xl/workbook.xml', workbook.encode()))
+    parts.append(('xl/worksheets/sheet1.xml', _xlsx_sheet(columns, rows)))
+    return stream_zip(parts)
+
+
+EXPORTS = {
+    'projects': (PROJECT_COLUMNS, project_rows),
+    'tasks': (TASK_COLUMNS, task_rows),
+}
+
+
+def export_stream(kind, export_format, queryset=None):
+    """(content type, filename, iterator of chunks) for a streaming response."""
+    columns, rows = EXPORTS[kind]
+    if export_format == 'xlsx':
+        content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        return content_type, f'{kind}.xlsx', stream_xlsx(columns, rows(queryset), kind.title())
+    return 'text/csv', f'{kind}.csv', stream_csv(columns, rows(queryset))
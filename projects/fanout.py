@@ -0,0 +1,50 @@
+# Run independent blocking calls (usually ORM queries) concurrently from an async view.
+# Django's async ORM methods all go through the single thread_sensitive executor, so two
+# awaited querysets still run one after the other. Here each call gets a worker thread,
+# and with it its own database connection, closed again afterwards as a request's would be.
+# With pooled connections (projects/db_pool.py) the caller's own connection goes back to the
+# pool first, so requests fanning out at once never wait on connections they hold themselves.
+# Inside a transaction (ATOMIC_REQUESTS, tests) other connections would not see its rows and
+# SQLite would block them on its locks, so the calls run in order on the caller's connection.
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+
+POOLED_DATABASES = any(database.get('OPTIONS', {}).get('pool') for database in settings.DATABASES.values())
+
+
+def _run_and_release(func):
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+
+def _release_pooled_connections():
+    for connection in connections.all(initialized_only=True):
+        if connection.connection is not None and getattr(connection, 'pool', None) and not connection.in_atomic_block:
+            connection.close()
+
+
+def _in_transaction():
+    """True when the caller is inside atomic(); otherwise its pooled connections are released."""
+    if any(connection.in_atomic_block for connection in connections.all(initialized_only=True)):
+        return True
+    if POOLED_DATABASES:
+        _release_pooled_connections()
+    return False
+
+
+def _run_in_order(funcs):
+    return [func() for func in funcs]
+
+
+async def run_concurrently(*funcs):
+    """Await the zero-argument callables in parallel threads; returns their results in order."""
+    # The caller's connections live in the thread its sync code runs in, hence the hop to check them
+    if await sync_to_async(_in_transaction)():
+        return await sync_to_async(_run_in_order)(funcs)
+    return await asyncio.gather(*(sync_to_async(_run_and_release, thread_sensitive=False)(func) for func in funcs))
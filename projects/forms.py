@@ -2,6 +2,7 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from .models import Project, Task, Comment
 
 
@@ -59,6 +60,12 @@ class ProjectForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'rows': 3}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Labels come from the location tree cache instead of one ward query per village
+        from .locations import location_tree
+        self.fields['location'].choices = [('', '---------')] + location_tree().village_choices()
+
     def clean_end_date(self):
         start_date = self.cleaned_data.get('start_date')
         end_date = self.cleaned_data.get('end_date')
@@ -73,27 +80,63 @@ class ProjectForm(forms.ModelForm):
         return total_cost
 
 
-class TaskForm(forms.ModelForm):
+class TaskDependencyFormMixin:
+    """Limits depends_on to the task's own project and rejects dependencies that would form a cycle."""
+
+    def task_project_id(self):
+        project = self.cleaned_data.get('project') if 'project' in self.fields else None
+        return project.id if project else self.instance.project_id
+
+    def clean_depends_on(self):
+        from .scheduling import dependency_errors
+        dependencies = self.cleaned_data.get('depends_on')
+        if dependencies:
+            errors = dependency_errors(self.instance.pk, self.task_project_id(), list(dependencies))
+            if errors:
+                raise forms.ValidationError(errors)
+        return dependencies
+
+
+class TaskForm(TaskDependencyFormMixin, forms.ModelForm):
     class Meta:
         model = Task
         fields = [
             'task_name',
             'description',
+            'task_state',
             'assigned_to',
+            'budget',
+            'start_date',
             'due_date',
-            'status'
+            'status',
+            'depends_on',
         ]
         widgets = {
+            'start_date': forms.DateInput(attrs={'type': 'date'}),
             'due_date': forms.DateInput(attrs={'type': 'date'}),
             'description': forms.Textarea(attrs={'rows': 3}),
         }
 
+    def __init__(self, *args, project=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if project is not None:
+            self.instance.project = project
+        # Only tasks of the same project can be dependencies
+        self.fields['depends_on'].queryset = Task.objects.filter(project_id=self.instance.project_id).only('id', 'project_id', 'task_name')
+        self.fields['depends_on'].label_from_instance = lambda task: task.task_name
+
     def clean_due_date(self):
         due_date = self.cleaned_data.get('due_date')
         if due_date < timezone.now().date():
             raise forms.ValidationError("Due date cannot be in the past.")
         return due_date
 
+
+class TaskAdminForm(TaskDependencyFormMixin, forms.ModelForm):
+    class Meta:
+        model = Task
+        fields = '__all__'
+
 class CommentForm(forms.ModelForm):
     class Meta:
         model = Comment
@@ -0,0 +1,144 @@
+# Resized and WebP variants of Project.project_pictures.
+# Saving a project with a new picture queues an ImageJob; the worker writes one JPEG and one
+# WebP per width to variants/projects/<project id>/<key>-<width>.<ext>, where <key> is a hash
+# of the original file, and records what it wrote in Project.picture_variants. Because the
+# key changes whenever the picture does, variant URLs never need invalidating and are served
+# with a one-year immutable Cache-Control header.
+import hashlib
+import io
+import posixpath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.urls import reverse
+from django.utils import timezone
+
+from .cache import bump
+from .jobs import enqueue
+from .models import ImageJob, Project
+
+
+IMAGE_VARIANT_WIDTHS = getattr(settings, 'IMAGE_VARIANT_WIDTHS', (320, 640, 1280))
+IMAGE_VARIANT_ROOT = 'variants/projects'
+# extension -> (content type, Pillow format, save options)
+VARIANT_FORMATS = {
+    'webp': ('image/webp', 'WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('image/jpeg', 'JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def variant_path(project_id, key, width, ext):
+    return f'{project_id}/{key}-{width}.{ext}'
+
+
+def variant_name(project_id, key, width, ext):
+    return f'{IMAGE_VARIANT_ROOT}/{variant_path(project_id, key, width, ext)}'
+
+
+def variant_urls(project, ext):
+    """[(url, width)] of the variants recorded for the project's current picture, narrowest first."""
+    variants = project.picture_variants or {}
+    if not project.project_pictures or variants.get('source') != project.project_pictures.name:
+        return []
+    return [
+        (reverse('image_variant', args=[variant_path(project.id, variants['key'], width, ext)]), width)
+        for width in variants.get('widths', [])
+    ]
+
+
+def needs_variants(project):
+    return bool(project.project_pictures) and (project.picture_variants or {}).get('source') != project.project_pictures.name
+
+
+def request_image_variants(project):
+    """Queue an ImageJob for the project's current picture unless one is already waiting."""
+    source = project.project_pictures.name
+    pending = ImageJob.objects.filter(
+        project=project, source=source, status__in=[ImageJob.STATUS_PENDING, ImageJob.STATUS_RUNNING],
+    ).first()
+    return pending or enqueue(ImageJob(project=project, source=source))
+
+
+def render_variants(fileobj, widths=IMAGE_VARIANT_WIDTHS):
+    """Yield (width, ext, bytes) for every variant of the image in `fileobj`."""
+    from PIL import Image, ImageOps
+
+    with Image.open(fileobj) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        # Never upscale: widths wider than the original collapse into one at the original size
+        sizes = sorted({min(width, image.width) for width in widths})
+        for width in sizes:
+            height = max(1, round(image.height * width / image.width))
+            resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+            for ext, (_, pil_format, options) in VARIANT_FORMATS.items():
+                frame = resized.convert('RGB') if pil_format == 'JPEG' and resized.mode != 'RGB' else resized
+                output = io.BytesIO()
+                frame.save(output, pil_format, **options)
+                yield width, ext, output.getvalue()
+
+
+def delete_variants(project_id, keep_key=None):
+    directory = f'{IMAGE_VARIANT_ROOT}/{project_id}'
+    if not default_storage.exists(directory):
+        return
+    for name in default_storage.listdir(directory)[1]:
+        if keep_key is None or not name.startswith(f'{keep_key}-'):
+            default_storage.delete(f'{directory}/{name}')
+
+
+def render_image_job(job):
+    project = Project.objects.only('id', 'project_pictures').get(id=job.project_id)
+    if project.project_pictures.name != job.source:
+        return  # replaced since the job was queued; the newer picture has its own job
+
+    with project.project_pictures.open('rb') as source:
+        data = source.read()
+    key = hashlib.sha256(data).hexdigest()[:16]
+
+    widths = []
+    for width, ext, content in render_variants(io.BytesIO(data)):
+        name = variant_name(project.id, key, width, ext)
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        default_storage.save(name, ContentFile(content))
+        if width not in widths:
+            widths.append(width)
+
+    # A filtered update so a newer upload that raced this job is not overwritten
+    Project.objects.filter(id=project.id, project_pictures=job.source).update(
+        picture_variants={'source': job.source, 'key': key, 'widths': widths}, updated_at=timezone.now(),
+    )
+    bump('project')  # cached listings embed the variant URLs
+    delete_variants(project.id, keep_key=key)
+
+
+def open_variant(path):
+    """(file, content type) for a variant path relative to IMAGE_VARIANT_ROOT; raises FileNotFoundError."""
+    name = posixpath.normpath(f'{IMAGE_VARIANT_ROOT}/{path}')
+    ext = name.rsplit('.', 1)[-1]
+    if not name.startswith(f'{IMAGE_VARIANT_ROOT}/') or ext not in VARIANT_FORMATS or not default_storage.exists(name):
+        raise FileNotFoundError(path)
+    return default_storage.open(name, 'rb'), VARIANT_FORMATS[ext][0]
+
+
+@receiver(post_save, sender=Project)
+def queue_variants_on_save(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'project_pictures' not in update_fields):
+        return
+    if needs_variants(instance):
+        request_image_variants(instance)
+    elif not instance.project_pictures and instance.picture_variants:
+        # Picture cleared
+        Project.objects.filter(id=instance.pk).update(picture_variants={}, updated_at=timezone.now())
+        bump('project')
+        delete_variants(instance.pk)
+
+
+@receiver(post_delete, sender=Project)
+def delete_variants_on_delete(sender, instance, **kwargs):
+    delete_variants(instance.pk)
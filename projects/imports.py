@@ -0,0 +1,391 @@
+# Bulk import of locations, projects and tasks from CSV or XLSX files.
+# Files are read as a stream of rows and handled in chunks: references (villages, users,
+# task states, projects) are resolved through lookup maps filled with one query per chunk,
+# rows are validated against those maps, and each chunk is written with bulk_create inside
+# its own transaction, then the derived data (stats, search index, caches) of that chunk is
+# brought up to date. Invalid rows are skipped and reported with their row number; a file
+# that cannot be parsed stops the import with a file-level error.
+#
+# Columns (first row is the header):
+#   locations: division, ward, village
+#   projects:  project_code, project_name, supervisor, division, ward, village, total_cost,
+#              start_date, end_date, source_of_fund, description, implementation_model,
+#              evaluation_percentage
+#   tasks:     project_code, task_name, description, task_state, assigned_to, due_date,
+#              status, budget, start_date (optional)
+import codecs
+import csv
+import datetime
+import zipfile
+from decimal import Decimal, InvalidOperation
+from xml.etree.ElementTree import ParseError, iterparse
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .locations import invalidate_location_tree, location_tree
+from .models import Division, Project, Task, TaskPlan, Village, Ward
+
+
+IMPORT_CHUNK_SIZE = getattr(settings, 'IMPORT_CHUNK_SIZE', 5000)
+IMPORT_KINDS = ('locations', 'projects', 'tasks')
+
+_SHEET_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.errors = []  # (row number, message)
+        self.file_error = None  # why reading the file stopped early, if it did
+
+    def error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+
+# Readers
+
+def read_csv(fileobj):
+    for row in csv.DictReader(codecs.iterdecode(fileobj, 'utf-8-sig')):
+        yield {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+
+
+def _column_index(reference):
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - 64
+    return index - 1
+
+
+def read_xlsx(fileobj):
+    """Rows of the first worksheet as dicts, parsed incrementally."""
+    with zipfile.ZipFile(fileobj) as archive:
+        shared = []
+        if 'xl/sharedStrings.xml' in archive.namelist():
+            with archive.open('xl/sharedStrings.xml') as strings:
+                for _, element in iterparse(strings):
+                    if element.tag == f'{_SHEET_NS}si':
+                        shared.append(''.join(text.text or '' for text in element.iter(f'{_SHEET_NS}t')))
+                        element.clear()
+
+        header = None
+        with archive.open('xl/worksheets/sheet1.xml') as sheet:
+            for _, element in iterparse(sheet):
+                if element.tag != f'{_SHEET_NS}row':
+                    continue
+                values = {}
+                for position, cell in enumerate(element.iter(f'{_SHEET_NS}c')):
+                    kind = cell.get('t')
+                    if kind == 'inlineStr':
+                        value = ''.join(text.text or '' for text in cell.iter(f'{_SHEET_NS}t'))
+                    else:
+                        raw = cell.find(f'{_SHEET_NS}v')
+                        value = '' if raw is None else raw.text or ''
+                        if kind == 's' and value:
+                            value = shared[int(value)]
+                    # The cell reference is optional; without it cells are consecutive
+                    values[_column_index(cell.get('r')) if cell.get('r') else position] = value.strip()
+                element.clear()
+
+                if header is None:
+                    header = {index: name.lower() for index, name in values.items()}
+                    continue
+                yield {name: values.get(index, '') for index, name in header.items()}
+
+
+class FileError(ValueError):
+    pass
+
+
+def read_rows(fileobj, file_format):
+    """Rows of a CSV or XLSX file; raises FileError when the file cannot be parsed."""
+    try:
+        yield from read_xlsx(fileobj) if file_format == 'xlsx' else read_csv(fileobj)
+    except UnicodeDecodeError:
+        raise FileError('The file is not UTF-8 encoded text.') from None
+    except csv.Error as error:
+        raise FileError(f'The file is not valid CSV: {error}.') from None
+    except (zipfile.BadZipFile, KeyError, IndexError, ValueError, ParseError) as error:
+        raise FileError(f'The file is not a readable XLSX workbook: {error}.') from None
+
+
+def chunked(rows, size):
+    chunk = []
+    for row_number, row in enumerate(rows, start=2):  # row 1 is the header
+        chunk.append((row_number, row))
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# Value parsing
+
+class RowError(ValueError):
+    pass
+
+
+def _required(row, column):
+    value = row.get(column, '')
+    if not value:
+        raise RowError(f'{column} is required.')
+    return value
+
+
+def _decimal(row, column, default=None):
+    value = row.get(column, '')
+    if not value and default is not None:
+        return default
+    try:
+        number = Decimal(_required(row, column).replace(',', ''))
+    except InvalidOperation:
+        number = None
+    # NaN and Infinity parse, but cannot be compared or stored
+    if number is None or not number.is_finite():
+        raise RowError(f'{column} is not a number: {value!r}.')
+    return number
+
+
+def _clean(model, field_name, value):
+    """`value` through the model field's clean(), so max_length, max_digits and decimal_places hold."""
+    try:
+        return model._meta.get_field(field_name).clean(value, None)
+    except ValidationError as error:
+        raise RowError(f"{field_name}: {' '.join(error.messages)}")
+
+
+def _date(row, column):
+    value = _required(row, column)
+    try:
+        return datetime.date.fromisoformat(value[:10])
+    except ValueError:
+        raise RowError(f'{column} is not a YYYY-MM-DD date: {value!r}.')
+
+
+def _datetime(row, column):
+    value = _required(row, column)
+    parsed = parse_datetime(value) if len(value) > 10 else None
+    if parsed is None:
+        parsed = datetime.datetime.combine(_date(row, column), datetime.time.min)
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+# Importers: each takes one chunk and returns the objects to create
+
+def _users_by_username(rows, column):
+    usernames = {row.get(column) for _, row in rows if row.get(column)}
+    return dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+
+
+def _village_map():
+    tree = location_tree()
+    return {
+        (tree.division_name(tree.village_division_id(village_id)).lower(),
+         tree.ward_name(tree.village_ward_id(village_id)).lower(),
+         tree.village_name(village_id).lower()): village_id
+        for village_id in tree.village_ids
+    }
+
+
+def import_locations_chunk(rows, result, state):
+    divisions = state.setdefault('divisions', {name.lower(): pk for pk, name in Division.objects.values_list('id', 'division_name')})
+    wards = state.setdefault('wards', {(division_id, name.lower()): pk for pk, division_id, name in Ward.objects.values_list('id', 'division_id', 'ward_name')})
+    villages = state.setdefault('villages', {(ward_id, name.lower()) for ward_id, name in Village.objects.values_list('ward_id', 'village_name')})
+
+    valid = []
+    for row_number, row in rows:
+        try:
+            valid.append((
+                _clean(Division, 'division_name', _required(row, 'division')),
+                _clean(Ward, 'ward_name', _required(row, 'ward')),
+                _clean(Village, 'village_name', _required(row, 'village')),
+            ))
+        except RowError as error:
+            result.error(row_number, str(error))
+
+    # Parents first, one bulk_create per level. Keys are read back by name because MySQL
+    # does not return primary keys from bulk_create.
+    new_divisions = {name.lower(): name for name, _, _ in valid if name.lower() not in divisions}
+    if new_divisions:
+        Division.objects.bulk_create([Division(division_name=name) for name in new_divisions.values()])
+        divisions.update(
+            (name.lower(), pk)
+            for pk, name in Division.objects.filter(division_name__in=new_divisions.values()).values_list('id', 'division_name')
+        )
+    new_wards = {(divisions[d.lower()], w.lower()): w for d, w, _ in valid if (divisions[d.lower()], w.lower()) not in wards}
+    if new_wards:
+        Ward.objects.bulk_create([Ward(division_id=key[0], ward_name=name) for key, name in new_wards.items()])
+        for pk, division_id, name in Ward.objects.filter(
+            division_id__in={key[0] for key in new_wards}, ward_name__in=new_wards.values(),
+        ).values_list('id', 'division_id', 'ward_name'):
+            wards[(division_id, name.lower())] = pk
+
+    new_villages = {}
+    for d, w, v in valid:
+        key = (wards[(divisions[d.lower()], w.lower())], v.lower())
+        if key not in villages and key not in new_villages:
+            new_villages[key] = Village(ward_id=key[0], village_name=v)
+    villages.update(new_villages)
+    return list(new_villages.values())
+
+
+def import_projects_chunk(rows, result, state):
+    villages = state.setdefault('villages', _village_map())
+    codes = state.setdefault('codes', set())
+    supervisors = _users_by_username(rows, 'supervisor')
+    chunk_codes = {row.get('project_code') for _, row in rows}
+    codes.update(Project.objects.filter(project_code__in=chunk_codes).values_list('project_code', flat=True))
+
+    objects = []
+    for row_number, row in rows:
+        try:
+            code = _clean(Project, 'project_code', _required(row, 'project_code'))
+            if code in codes:
+                raise RowError(f'project_code {code!r} already exists.')
+            location_id = None
+            if row.get('village'):
+                key = (row.get('division', '').lower(), row.get('ward', '').lower(), row['village'].lower())
+                location_id = villages.get(key)
+                if location_id is None:
+                    raise RowError(f"Unknown village {row['village']!r} in ward {row.get('ward')!r}, division {row.get('division')!r}.")
+            supervisor_id = None
+            if row.get('supervisor'):
+                supervisor_id = supervisors.get(row['supervisor'])
+                if supervisor_id is None:
+                    raise RowError(f"Unknown supervisor {row['supervisor']!r}.")
+            total_cost = _clean(Project, 'total_cost', _decimal(row, 'total_cost'))
+            if total_cost <= 0:
+                raise RowError('total_cost must be a positive value.')
+            start_date, end_date = _datetime(row, 'start_date'), _datetime(row, 'end_date')
+            if end_date <= start_date:
+                raise RowError('end_date must be after start_date.')
+            objects.append(Project(
+                project_code=code,
+                project_name=_clean(Project, 'project_name', _required(row, 'project_name')),
+                supervisor_id=supervisor_id,
+                location_id=location_id,
+                total_cost=total_cost,
+                start_date=start_date,
+                end_date=end_date,
+                source_of_fund=_clean(Project, 'source_of_fund', _required(row, 'source_of_fund')),
+                description=row.get('description', ''),
+                implementation_model=_clean(Project, 'implementation_model', row.get('implementation_model') or None),
+                evaluation_percentage=_clean(Project, 'evaluation_percentage', _decimal(row, 'evaluation_percentage', Decimal('0'))),
+            ))
+            codes.add(code)
+        except RowError as error:
+            result.error(row_number, str(error))
+    return objects
+
+
+def import_tasks_chunk(rows, result, state):
+    task_states = state.setdefault('task_states', {name.lower(): pk for pk, name in TaskPlan.objects.values_list('id', 'task_state')})
+    statuses = {value.lower(): value for value, _ in Task.STATUS_CHOICES}
+    users = _users_by_username(rows, 'assigned_to')
+    projects = {
+        code: (pk, total_cost)
+        for pk, code, total_cost in Project.objects.filter(project_code__in={row.get('project_code') for _, row in rows}).values_list('id', 'project_code', 'total_cost')
+    }
+
+    objects = []
+    for row_number, row in rows:
+        try:
+            code = _required(row, 'project_code')
+            if code not in projects:
+                raise RowError(f'Unknown project_code {code!r}.')
+            project_id, total_cost = projects[code]
+            assigned_to_id = users.get(_required(row, 'assigned_to'))
+            if assigned_to_id is None:
+                raise RowError(f"Unknown user {row['assigned_to']!r}.")
+            state_name = _required(row, 'task_state').lower()
+            if state_name not in task_states:
+                raise RowError(f"Unknown task_state {row['task_state']!r}.")
+            status = statuses.get(row.get('status', '').lower() or 'to do')
+            if status is None:
+                raise RowError(f"Unknown status {row['status']!r}.")
+            budget = _clean(Task, 'budget', _decimal(row, 'budget'))
+            due_date = _date(row, 'due_date')
+            start_date = _date(row, 'start_date') if (row.get('start_date') or '').strip() else None
+            # Same rules as Task.clean
+            if budget < 0:
+                raise RowError('Budget must be a positive number.')
+            if budget > total_cost:
+                raise RowError('Task budget cannot exceed project total cost.')
+            if start_date and start_date > due_date:
+                raise RowError('Start date cannot be after the due date.')
+            objects.append(Task(
+                project_id=project_id,
+                task_name=_clean(Task, 'task_name', _required(row, 'task_name')),
+                description=row.get('description', ''),
+                task_state_id=task_states[state_name],
+                assigned_to_id=assigned_to_id,
+                start_date=start_date,
+                due_date=due_date,
+                status=status,
+                budget=budget,
+            ))
+        except RowError as error:
+            result.error(row_number, str(error))
+    return objects
+
+
+IMPORTERS = {
+    'locations': (Village, import_locations_chunk),
+    'projects': (Project, import_projects_chunk),
+    'tasks': (Task, import_tasks_chunk),
+}
+
+
+def import_file(kind, fileobj, file_format='csv', chunk_size=IMPORT_CHUNK_SIZE):
+    model, import_chunk = IMPORTERS[kind]
+    result = ImportResult()
+    state = {}
+
+    try:
+        for rows in chunked(read_rows(fileobj, file_format), chunk_size):
+            with transaction.atomic():
+                objects = model.objects.bulk_create(import_chunk(rows, result, state), batch_size=1000)
+            result.created += len(objects)
+            _after_import(kind, objects)
+    except FileError as error:
+        # The chunks before the unreadable part are imported
+        result.file_error = str(error)
+    return result
+
+
+def _after_import(kind, objects):
+    """bulk_create skips signals, so bring the derived data of one chunk up to date in bulk."""
+    from .cache import LOCATIONS, bump
+    from .chart_cache import invalidate_project_charts
+    from .search import index_documents
+    from .stats import rebuild_project_stats
+    from .workload import invalidate_workload
+
+    if kind == 'locations':
+        invalidate_location_tree()
+        bump(*LOCATIONS)
+        return
+    if not objects:
+        return
+    bump('project', 'task')  # new tasks change the project listings' progress figures too
+
+    if kind == 'projects':
+        # MySQL does not hand primary keys back from bulk_create
+        project_ids = list(Project.objects.filter(project_code__in=[obj.project_code for obj in objects]).values_list('id', flat=True))
+        index_documents('project', project_ids)
+    else:
+        project_ids = {obj.project_id for obj in objects}
+        task_ids = [obj.pk for obj in objects if obj.pk is not None]
+        if task_ids:
+            index_documents('task', task_ids)
+        invalidate_workload()
+        for project_id in project_ids:
+            invalidate_project_charts(project_id)
+    rebuild_project_stats(project_ids)
@@ -0,0 +1,197 @@
+# Per-request performance accounting.
+# RequestMetricsMiddleware counts SQL queries and their time, template render time and
+# total latency for every request, and checks them against the budget declared for the
+# view's URL name in projects/urls.py (VIEW_BUDGETS). Overruns are logged; with
+# VIEW_BUDGETS_RAISE (or inside enforce_budgets()) they raise BudgetExceeded instead, so
+# a test client request that regresses fails the test. Tests enforce only the query counts:
+# wall-clock time depends on the machine running them.
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import NamedTuple, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template.backends.django import DjangoTemplates, Template
+
+
+logger = logging.getLogger('projects.performance')
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+_enforce = contextvars.ContextVar('enforce_view_budgets', default=None)  # None, or whether latency is enforced too
+
+
+class Budget(NamedTuple):
+    queries: int
+    total_ms: Optional[float] = None
+
+
+class BudgetExceeded(AssertionError):
+    pass
+
+
+class RequestMetrics:
+    def __init__(self, view_name=None):
+        self.view_name = view_name
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.total_time = 0.0
+        self._lock = threading.Lock()
+
+    def add_query(self, elapsed):
+        # Queries fanned out to worker threads (projects.fanout) report here concurrently
+        with self._lock:
+            self.queries += 1
+            self.sql_time += elapsed
+
+    def as_dict(self):
+        return {
+            'view': self.view_name,
+            'queries': self.queries,
+            'sql_ms': round(self.sql_time * 1000, 2),
+            'template_ms': round(self.template_time * 1000, 2),
+            'total_ms': round(self.total_time * 1000, 2),
+        }
+
+    def overruns(self, budget, latency=True):
+        problems = []
+        if self.queries > budget.queries:
+            problems.append(f'{self.queries} queries (budget {budget.queries})')
+        if latency and budget.total_ms is not None and self.total_time * 1000 > budget.total_ms:
+            problems.append(f'{self.total_time * 1000:.0f} ms (budget {budget.total_ms:.0f} ms)')
+        return problems
+
+
+def _time_query(execute, sql, params, many, context):
+    """execute_wrapper installed on every connection; reports to the metrics of the current context."""
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - start)
+
+
+def install_query_timer(connection):
+    if _time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_time_query)
+
+
+@receiver(connection_created)
+def _install_on_connect(sender, connection, **kwargs):
+    install_query_timer(connection)
+
+
+@contextmanager
+def record_metrics(view_name=None):
+    """Collect RequestMetrics for everything run inside the block, including threads it hands work to."""
+    metrics = RequestMetrics(view_name)
+    # Connections opened before this module was imported missed connection_created
+    for connection in connections.all(initialized_only=True):
+        install_query_timer(connection)
+    token = _current.set(metrics)
+    start = time.perf_counter()
+    try:
+        yield metrics
+    finally:
+        metrics.total_time = time.perf_counter() - start
+        _current.reset(token)
+
+
+@contextmanager
+def enforce_budgets(latency=True):
+    """Raise BudgetExceeded for budget overruns inside the block, whatever VIEW_BUDGETS_RAISE says.
+
+    With latency=False only query counts raise; latency overruns are logged as usual.
+    """
+    token = _enforce.set(latency)
+    try:
+        yield
+    finally:
+        _enforce.reset(token)
+
+
+def view_budget(view_name):
+    from .urls import VIEW_BUDGETS
+    return VIEW_BUDGETS.get(view_name)
+
+
+def check_budget(metrics):
+    budget = view_budget(metrics.view_name)
+    problems = metrics.overruns(budget) if budget else []
+    if not problems:
+        return
+    latency = _enforce.get()
+    if latency is None and getattr(settings, 'VIEW_BUDGETS_RAISE', False):
+        latency = True
+    enforced = metrics.overruns(budget, latency) if latency is not None else []
+    if enforced:
+        raise BudgetExceeded(f"View {metrics.view_name!r} over budget: {', '.join(enforced)}")
+    logger.warning(f"View {metrics.view_name!r} over budget: {', '.join(problems)}", extra={'metrics': metrics.as_dict()})
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with record_metrics() as metrics:
+            response = self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        with record_metrics() as metrics:
+            response = await self.get_response(request)
+        return self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        match = getattr(request, 'resolver_match', None)
+        metrics.view_name = match.view_name if match else None
+        request.metrics = metrics
+
+        if settings.DEBUG:
+            response['Server-Timing'] = (
+                f'sql;dur={metrics.sql_time * 1000:.1f};desc="{metrics.queries} queries", '
+                f'tpl;dur={metrics.template_time * 1000:.1f}, total;dur={metrics.total_time * 1000:.1f}'
+            )
+        logger.debug('request metrics', extra={'metrics': metrics.as_dict()})
+        check_budget(metrics)
+        return response
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend whose templates add their render time to the current request's metrics."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
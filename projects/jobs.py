@@ -0,0 +1,83 @@
+# A small database-backed job queue.
+# Views create job rows; the run_worker management command claims and runs them.
+# A job still Running JOB_STALE_AFTER seconds after it was claimed belonged to a worker
+# that died; claiming fails it, so a new job for the same work can be queued.
+import datetime
+import traceback
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+
+JOB_STALE_AFTER = getattr(settings, 'JOB_STALE_AFTER', 60 * 60)
+
+# Job model -> dotted path of the function that runs one job of that model.
+JOB_HANDLERS = {
+    'projects.ReportJob': 'projects.report_queue.render_report_job',
+    'projects.ImageJob': 'projects.images.render_image_job',
+}
+
+
+def stale_jobs(model):
+    cutoff = timezone.now() - datetime.timedelta(seconds=JOB_STALE_AFTER)
+    return model.objects.filter(status=model.STATUS_RUNNING, started_at__lt=cutoff)
+
+
+def fail_stale_jobs(model):
+    return stale_jobs(model).update(
+        status=model.STATUS_FAILED, finished_at=timezone.now(),
+        error=f'The worker running this job stopped; it was still running after {JOB_STALE_AFTER} s.',
+    )
+
+
+def claim_next_job(model):
+    fail_stale_jobs(model)
+    pending = model.objects.filter(status=model.STATUS_PENDING).order_by('created_at', 'id')
+    for job_id in pending.values_list('id', flat=True)[:10]:
+        # The conditional UPDATE is the lock: only one worker can move a job out of Pending.
+        claimed = model.objects.filter(id=job_id, status=model.STATUS_PENDING).update(
+            status=model.STATUS_RUNNING, started_at=timezone.now(),
+        )
+        if claimed:
+            return model.objects.get(id=job_id)
+    return None
+
+
+def run_job(job, handler):
+    try:
+        handler(job)
+    except Exception:
+        job.status = job.STATUS_FAILED
+        job.error = traceback.format_exc()
+    else:
+        job.status = job.STATUS_DONE
+        job.error = ''
+    job.finished_at = timezone.now()
+    job.save()
+    return job
+
+
+def run_pending_jobs(limit=None):
+    """Run queued jobs of every registered kind; returns how many were run."""
+    handled = 0
+    for model_label, handler_path in JOB_HANDLERS.items():
+        model = apps.get_model(model_label)
+        handler = import_string(handler_path)
+        while limit is None or handled < limit:
+            job = claim_next_job(model)
+            if job is None:
+                break
+            run_job(job, handler)
+            handled += 1
+    return handled
+
+
+def enqueue(job):
+    """Save a new job. With BACKGROUND_JOBS_EAGER it runs right after commit instead of waiting for a worker."""
+    job.save()
+    if getattr(settings, 'BACKGROUND_JOBS_EAGER', False):
+        transaction.on_commit(lambda: run_pending_jobs())
+    return job
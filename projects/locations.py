@@ -0,0 +1,134 @@
+# In-process cache of the Division -> Ward -> Village hierarchy.
+# The whole tree is loaded with three small queries into parallel arrays. Wards are stored
+# grouped by division and villages by ward, so each node's children are one contiguous slice.
+# A version stamp in the shared cache tells every process when to reload.
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from django.core.cache import cache
+
+
+_VERSION_KEY = 'locations:version'
+_tree = None
+
+
+class LocationTree:
+    def __init__(self, version, divisions, wards, villages):
+        """`divisions` is [(id, name)], `wards` [(id, division_id, name)], `villages` [(id, ward_id, name)]."""
+        self.version = version
+
+        self.division_ids = array('q', [row[0] for row in divisions])
+        self.division_names = [row[1] for row in divisions]
+        self.division_index = {division_id: i for i, division_id in enumerate(self.division_ids)}
+
+        wards = sorted(wards, key=lambda row: (self.division_index[row[1]], row[2]))
+        self.ward_ids = array('q', [row[0] for row in wards])
+        self.ward_names = [row[2] for row in wards]
+        self.ward_parent = array('l', [self.division_index[row[1]] for row in wards])
+        self.ward_index = {ward_id: i for i, ward_id in enumerate(self.ward_ids)}
+
+        villages = sorted(villages, key=lambda row: (self.ward_index[row[1]], row[2]))
+        self.village_ids = array('q', [row[0] for row in villages])
+        self.village_names = [row[2] for row in villages]
+        self.village_parent = array('l', [self.ward_index[row[1]] for row in villages])
+        self.village_index = {village_id: i for i, village_id in enumerate(self.village_ids)}
+
+    @classmethod
+    def load(cls, version):
+        from .models import Division, Ward, Village
+        return cls(
+            version,
+            list(Division.objects.order_by('division_name').values_list('id', 'division_name')),
+            list(Ward.objects.values_list('id', 'division_id', 'ward_name')),
+            list(Village.objects.values_list('id', 'ward_id', 'village_name')),
+        )
+
+    # Children are contiguous because the arrays are sorted by parent index.
+    def _ward_slice(self, division_id):
+        i = self.division_index[division_id]
+        return bisect_left(self.ward_parent, i), bisect_right(self.ward_parent, i)
+
+    def _village_slice(self, ward_id):
+        i = self.ward_index[ward_id]
+        return bisect_left(self.village_parent, i), bisect_right(self.village_parent, i)
+
+    def division_name(self, division_id):
+        return self.division_names[self.division_index[division_id]]
+
+    def ward_name(self, ward_id):
+        return self.ward_names[self.ward_index[ward_id]]
+
+    def village_name(self, village_id):
+        return self.village_names[self.village_index[village_id]]
+
+    def ward_division_id(self, ward_id):
+        return self.division_ids[self.ward_parent[self.ward_index[ward_id]]]
+
+    def village_ward_id(self, village_id):
+        return self.ward_ids[self.village_parent[self.village_index[village_id]]]
+
+    def village_division_id(self, village_id):
+        return self.ward_division_id(self.village_ward_id(village_id))
+
+    def village_label(self, village_id):
+        i = self.village_index[village_id]
+        return f"{self.village_names[i]} ({self.ward_names[self.village_parent[i]]})"
+
+    def ward_ids_of(self, division_id):
+        start, end = self._ward_slice(division_id)
+        return list(self.ward_ids[start:end])
+
+    def village_ids_of(self, ward_id):
+        start, end = self._village_slice(ward_id)
+        return list(self.village_ids[start:end])
+
+    def village_ids_under(self, division_id=None, ward_id=None):
+        if ward_id is not None:
+            return self.village_ids_of(ward_id)
+        if division_id is not None:
+            return [village_id for ward in self.ward_ids_of(division_id) for village_id in self.village_ids_of(ward)]
+        return list(self.village_ids)
+
+    def village_choices(self):
+        return sorted(((village_id, self.village_label(village_id)) for village_id in self.village_ids), key=lambda choice: choice[1])
+
+    def search_villages(self, term):
+        term = term.lower()
+        return [
+            village_id for i, village_id in enumerate(self.village_ids)
+            if term in self.village_names[i].lower() or term in self.ward_names[self.village_parent[i]].lower()
+        ]
+
+    def search_wards(self, term):
+        term = term.lower()
+        return [
+            ward_id for i, ward_id in enumerate(self.ward_ids)
+            if term in self.ward_names[i].lower() or term in self.division_names[self.ward_parent[i]].lower()
+        ]
+
+
+def location_tree_version():
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        cache.add(_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(_VERSION_KEY)
+    return version
+
+
+def location_tree():
+    global _tree
+    version = location_tree_version()
+    tree = _tree
+    if tree is None or tree.version != version:
+        tree = _tree = LocationTree.load(version)
+    return tree
+
+
+def invalidate_location_tree():
+    global _tree
+    _tree = None
+    try:
+        cache.incr(_VERSION_KEY)
+    except ValueError:
+        cache.set(_VERSION_KEY, time.time_ns(), None)
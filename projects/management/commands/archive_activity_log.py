@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from projects.activity_archive import ACTIVITY_LOG_RETENTION_DAYS, archive_activity_logs
+
+
+class Command(BaseCommand):
+    help = 'Move ActivityLog entries older than the retention window into the gzip archive under MEDIA_ROOT.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=ACTIVITY_LOG_RETENTION_DAYS)
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows archived and deleted per batch.')
+
+    def handle(self, *args, **options):
+        moved = archive_activity_logs(options['days'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {moved} activity log entries.'))
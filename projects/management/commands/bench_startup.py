@@ -0,0 +1,73 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+# Runs in a fresh interpreter so nothing is already imported.
+PROBE = '''
+import json, os, resource, sys, time
+sys.path.insert(0, {base_dir!r})
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ProjectManagement.settings')
+start = time.perf_counter()
+from ProjectManagement.wsgi import application
+import projects.urls
+for name in {extra_modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - start
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+if sys.platform == 'darwin':
+    rss_kb //= 1024
+print(json.dumps({{'seconds': elapsed, 'max_rss_kb': rss_kb, 'modules': len(sys.modules)}}))
+'''
+
+# What views.py used to import eagerly on every worker boot.
+EAGER_MODULES = [
+    'plotly.graph_objects',
+    'plotly.offline',
+    'plotly.express',
+    'pandas',
+    'reportlab.platypus',
+    'projects.charts',
+    'projects.reports',
+]
+
+
+class Command(BaseCommand):
+    help = 'Measure import time and peak RSS of ProjectManagement.wsgi.application in a fresh interpreter.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument(
+            '--compare-eager', action='store_true',
+            help='Also measure a boot that imports the charting and PDF stack up front, as views.py used to.',
+        )
+
+    def handle(self, *args, **options):
+        results = {'lazy': self.measure(options['runs'], [])}
+        if options['compare_eager']:
+            results['eager'] = self.measure(options['runs'], EAGER_MODULES)
+        self.stdout.write(json.dumps(results, indent=2))
+
+    def measure(self, runs, extra_modules):
+        code = PROBE.format(base_dir=str(settings.BASE_DIR), extra_modules=extra_modules)
+        env = dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+        samples = []
+        for _ in range(runs):
+            output = subprocess.run(
+                [sys.executable, '-c', code], env=env, check=True, capture_output=True, text=True,
+            ).stdout
+            samples.append(json.loads(output.strip().splitlines()[-1]))
+
+        seconds = [sample['seconds'] for sample in samples]
+        return {
+            'runs': runs,
+            'median_seconds': round(statistics.median(seconds), 4),
+            'min_seconds': round(min(seconds), 4),
+            'max_rss_kb': max(sample['max_rss_kb'] for sample in samples),
+            'modules': samples[-1]['modules'],
+        }
@@ -0,0 +1,42 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from projects.benchmarks import benchmark_user, run_asgi_load, run_wsgi_load
+from projects.models import Project
+
+
+class Command(BaseCommand):
+    help = 'Compare throughput and latency of the async views under concurrent load through the WSGI and ASGI handlers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Requests per URL and handler.')
+        parser.add_argument('--concurrency', type=int, default=20)
+        parser.add_argument('--user', help='Username to log in as (default: the first superuser).')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        try:
+            user = benchmark_user(options['user'])
+        except Exception as error:
+            raise CommandError(str(error))
+        project_id = Project.objects.order_by('id').values_list('id', flat=True).first()
+        if project_id is None:
+            raise CommandError('No projects; run generate_demo_data first.')
+
+        targets = {'index': reverse('index'), 'project_detail': reverse('project_detail', args=[project_id])}
+        results = {}
+        for name, url in targets.items():
+            run_wsgi_load(user, url, min(options['requests'], options['concurrency']), options['concurrency'])  # warm up
+            results[name] = {
+                'url': url,
+                'wsgi': run_wsgi_load(user, url, options['requests'], options['concurrency']),
+                'asgi': run_asgi_load(user, url, options['requests'], options['concurrency']),
+            }
+
+        output = json.dumps({'concurrency': options['concurrency'], 'results': results}, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fileobj:
+                fileobj.write(output)
+        self.stdout.write(output)
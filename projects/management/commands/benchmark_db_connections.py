@@ -0,0 +1,37 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from projects.benchmarks import CONNECTION_MODES, run_connection_benchmark
+
+
+class Command(BaseCommand):
+    help = 'Compare per-request latency with a connection per request, persistent connections and the connection pool.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per mode.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Worker threads, each with its own connection.')
+        parser.add_argument('--pool-size', type=int, help='Pool max_size (default: the concurrency).')
+        parser.add_argument('--modes', nargs='+', choices=CONNECTION_MODES, default=list(CONNECTION_MODES))
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise CommandError('The default database is in memory; connections to it cannot be reopened.')
+        results = {}
+        for mode in options['modes']:
+            try:
+                results[mode] = run_connection_benchmark(mode, options['requests'], options['concurrency'], options['pool_size'])
+            except ValueError as error:
+                raise CommandError(str(error))
+
+        output = json.dumps({
+            'database': connection.vendor,
+            'concurrency': options['concurrency'],
+            'results': results,
+        }, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fileobj:
+                fileobj.write(output)
+        self.stdout.write(output)
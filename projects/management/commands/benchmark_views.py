@@ -0,0 +1,52 @@
+import datetime
+import json
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from projects.benchmarks import benchmark_client, default_targets, run_benchmarks
+from projects.models import ActivityLog, Comment, Project, Task
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the main views through the test client and print p50/p95 latency, query counts and peak memory as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--user', help='Username to log in as (default: the first superuser).')
+        parser.add_argument('--only', nargs='+', metavar='NAME', help='Only run these targets.')
+        parser.add_argument('--output', help='Also write the JSON report to this file.')
+
+    def handle(self, *args, **options):
+        try:
+            client = benchmark_client(options['user'])
+        except Exception as error:
+            raise CommandError(str(error))
+        targets = default_targets()
+        if options['only']:
+            targets = [target for target in targets if target[0] in options['only']]
+
+        report = {
+            'meta': {
+                'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+                'iterations': options['iterations'],
+                'rows': {
+                    'projects': Project.objects.count(),
+                    'tasks': Task.objects.count(),
+                    'comments': Comment.objects.count(),
+                    'activity_log': ActivityLog.objects.count(),
+                },
+            },
+            'results': run_benchmarks(client, targets, options['iterations'], options['warmup']),
+        }
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as fileobj:
+                fileobj.write(output)
+        self.stdout.write(output)
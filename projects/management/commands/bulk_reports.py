@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.bulk_reports import REPORT_CHUNK_SIZE, merged_reports_pdf, stream_reports_zip, subtree_projects
+
+
+class Command(BaseCommand):
+    help = 'Generate the PDF reports of every project in a Division, Ward or Village.'
+
+    def add_arguments(self, parser):
+        location = parser.add_mutually_exclusive_group(required=True)
+        location.add_argument('--division', type=int)
+        location.add_argument('--ward', type=int)
+        location.add_argument('--village', type=int)
+        parser.add_argument('--format', choices=['zip', 'pdf'], default='zip')
+        parser.add_argument('--output', required=True, help='File to write the ZIP archive or merged PDF to.')
+        parser.add_argument('--workers', type=int, default=None, help='Render processes (default: CPU count).')
+        parser.add_argument('--chunk-size', type=int, default=REPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        projects = subtree_projects(options['division'], options['ward'], options['village'])
+        count = projects.count()
+        if not count:
+            raise CommandError('No projects found for that location.')
+
+        with open(options['output'], 'wb') as output:
+            if options['format'] == 'pdf':
+                output.write(merged_reports_pdf(projects, options['chunk_size']))
+            else:
+                for chunk in stream_reports_zip(projects, options['workers'], options['chunk_size']):
+                    output.write(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f"Wrote {count} project report(s) to {options['output']}"))
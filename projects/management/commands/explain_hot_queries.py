@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from projects.query_plans import HOT_QUERIES, explain_hot_queries
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN on the hot query shapes and flag the ones that read a whole table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', nargs='+', metavar='NAME', choices=[query.name for query in HOT_QUERIES],
+                            help='Only explain these queries.')
+        parser.add_argument('--database', default='default')
+        parser.add_argument('--show-sql', action='store_true', help='Print each query before its plan.')
+        parser.add_argument('--fail-on-scan', action='store_true', help='Exit with an error when a query is flagged.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"EXPLAIN on {connections[options['database']].vendor} ({options['database']})")
+        plans = explain_hot_queries(options['only'], options['database'])
+        for plan in plans:
+            if plan.flagged:
+                status = self.style.ERROR(f"FULL SCAN of {', '.join(plan.full_scans)}")
+            elif plan.full_scans:
+                status = self.style.WARNING(f"full scan of {', '.join(plan.full_scans)} (expected)")
+            else:
+                status = self.style.SUCCESS('ok')
+            self.stdout.write(f'\n{plan.name}: {status}')
+            if options['show_sql']:
+                self.stdout.write(f'  {plan.sql}')
+            for line in plan.plan.splitlines():
+                self.stdout.write(f'  {line}')
+
+        flagged = [plan.name for plan in plans if plan.flagged]
+        if flagged and options['fail_on_scan']:
+            raise CommandError(f"Full table scans in: {', '.join(flagged)}")
+        self.stdout.write(f'\n{len(plans)} queries explained, {len(flagged)} flagged.')
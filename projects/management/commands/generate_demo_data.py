@@ -0,0 +1,36 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from projects.demo_data import clear_demo_data, generate_demo_data
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a synthetic district (locations, projects, tasks, comments, activity log) for load testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--divisions', type=int, default=5)
+        parser.add_argument('--wards', type=int, default=6, help='Wards per division.')
+        parser.add_argument('--villages', type=int, default=8, help='Villages per ward.')
+        parser.add_argument('--projects', type=int, default=1000)
+        parser.add_argument('--tasks', type=int, default=20, help='Tasks per project.')
+        parser.add_argument('--comments', type=int, default=5, help='Comments per project.')
+        parser.add_argument('--activity', type=int, default=20000, help='Activity log entries.')
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--days', type=int, default=365, help='Spread dates over this many past days.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--clear', action='store_true', help='Remove previously generated demo data first.')
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            clear_demo_data()
+        start = time.perf_counter()
+        counts = generate_demo_data(
+            divisions=options['divisions'], wards=options['wards'], villages=options['villages'],
+            projects=options['projects'], tasks=options['tasks'], comments=options['comments'],
+            activity=options['activity'], users=options['users'], days=options['days'], seed=options['seed'],
+            log=self.stdout.write,
+        )
+        counts['seconds'] = round(time.perf_counter() - start, 2)
+        self.stdout.write(self.style.SUCCESS(json.dumps(counts)))
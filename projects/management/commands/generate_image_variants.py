@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from projects.images import needs_variants, request_image_variants
+from projects.jobs import run_pending_jobs
+from projects.models import Project
+
+
+class Command(BaseCommand):
+    help = 'Queue thumbnail/WebP variant jobs for project pictures that do not have current variants.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate variants even when they are current.')
+        parser.add_argument('--run', action='store_true', help='Run the queued jobs now instead of leaving them to run_worker.')
+
+    def handle(self, *args, **options):
+        projects = Project.objects.exclude(project_pictures='').exclude(project_pictures__isnull=True).only('id', 'project_pictures', 'picture_variants')
+        queued = 0
+        for project in projects.iterator(chunk_size=500):
+            if options['force'] or needs_variants(project):
+                request_image_variants(project)
+                queued += 1
+        self.stdout.write(f'Queued {queued} image job(s).')
+
+        if options['run']:
+            handled = run_pending_jobs()
+            self.stdout.write(self.style.SUCCESS(f'Ran {handled} job(s).'))
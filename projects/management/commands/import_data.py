@@ -0,0 +1,38 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from projects.imports import IMPORT_CHUNK_SIZE, IMPORT_KINDS, import_file
+
+
+class Command(BaseCommand):
+    help = 'Bulk import locations, projects or tasks from a CSV or XLSX file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=IMPORT_KINDS)
+        parser.add_argument('path', help='CSV or XLSX file; the first row names the columns.')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE)
+        parser.add_argument('--errors', help='Write rejected rows to this CSV file instead of the console.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'{path} does not exist.')
+        file_format = 'xlsx' if path.lower().endswith('.xlsx') else 'csv'
+
+        with open(path, 'rb') as fileobj:
+            result = import_file(options['kind'], fileobj, file_format, options['chunk_size'])
+
+        if result.errors and options['errors']:
+            with open(options['errors'], 'w', newline='') as output:
+                writer = csv.writer(output)
+                writer.writerow(['row', 'error'])
+                writer.writerows(result.errors)
+        else:
+            for row_number, message in result.errors:
+                self.stderr.write(f'Row {row_number}: {message}')
+
+        self.stdout.write(self.style.SUCCESS(f'Created {result.created} row(s), rejected {len(result.errors)}.'))
+        if result.file_error:
+            raise CommandError(result.file_error)
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from projects.stats import rebuild_project_stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the ProjectStats rollups from the tasks table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('project_ids', nargs='*', type=int, help='Only these projects (default: all).')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_project_stats(options['project_ids'] or None, options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {count} project(s).'))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from projects.search import rebuild_search_index, search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the SQLite FTS5 search index from the project, task and comment tables.'
+
+    def handle(self, *args, **options):
+        backend = search_backend()
+        if backend != 'fts5':
+            self.stdout.write(f'Nothing to rebuild: search backend is {backend or "icontains fallback"}.')
+            return
+        count = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} document(s).'))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from projects.jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (PDF reports, ...). Polls until stopped unless --once is given.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run whatever is queued, then exit.')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Seconds to wait when the queue is empty.')
+
+    def handle(self, *args, **options):
+        while True:
+            handled = run_pending_jobs()
+            if handled:
+                self.stdout.write(f'Ran {handled} job(s).')
+            if options['once']:
+                break
+            if not handled:
+                time.sleep(options['sleep'])
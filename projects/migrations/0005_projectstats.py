@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+STATUS_FIELDS = {
+    'To Do': ('todo_count', 'todo_budget'),
+    'In Progress': ('in_progress_count', 'in_progress_budget'),
+    'Done': ('done_count', 'done_budget'),
+}
+
+
+def populate_project_stats(apps, schema_editor):
+    Project = apps.get_model('projects', 'Project')
+    ProjectStats = apps.get_model('projects', 'ProjectStats')
+    Task = apps.get_model('projects', 'Task')
+
+    rows = {project_id: ProjectStats(project_id=project_id) for project_id in Project.objects.values_list('id', flat=True)}
+    grouped = Task.objects.values('project_id', 'status').annotate(count=Count('id'), budget=Sum('budget')).order_by()
+    for group in grouped:
+        if group['project_id'] in rows and group['status'] in STATUS_FIELDS:
+            count_field, budget_field = STATUS_FIELDS[group['status']]
+            setattr(rows[group['project_id']], count_field, group['count'])
+            setattr(rows[group['project_id']], budget_field, group['budget'] or 0)
+    ProjectStats.objects.bulk_create(rows.values(), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0004_activitylog_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectStats',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='projects.project')),
+                ('todo_count', models.PositiveIntegerField(default=0)),
+                ('in_progress_count', models.PositiveIntegerField(default=0)),
+                ('done_count', models.PositiveIntegerField(default=0)),
+                ('todo_budget', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('in_progress_budget', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('done_budget', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'project stats',
+            },
+        ),
+        migrations.RunPython(populate_project_stats, migrations.RunPython.noop),
+    ]
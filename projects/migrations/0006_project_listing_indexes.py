@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0005_projectstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['start_date', 'id'], name='projects_pr_start_d_b128aa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['location', 'start_date'], name='projects_pr_locatio_5d46fd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['supervisor', 'start_date'], name='projects_pr_supervi_288a9b_idx'),
+        ),
+    ]
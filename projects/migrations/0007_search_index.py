@@ -0,0 +1,54 @@
+from django.db import migrations
+
+
+FULLTEXT_INDEXES = [
+    ('projects_project', 'project_fulltext', 'project_name, description'),
+    ('projects_task', 'task_fulltext', 'task_name, description'),
+    ('projects_comment', 'comment_fulltext', 'content'),
+]
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            if not cursor.fetchone()[0]:
+                return  # No FTS5 in this SQLite build; search falls back to icontains
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE projects_search USING fts5(title, body, tokenize='unicode61 remove_diacritics 2')"
+        )
+        # rowid = object id * 4 + kind code (1 project, 2 task, 3 comment), see projects/search.py
+        schema_editor.execute(
+            "INSERT INTO projects_search(rowid, title, body) "
+            "SELECT id * 4 + 1, project_name || ' ' || project_code, description FROM projects_project"
+        )
+        schema_editor.execute(
+            "INSERT INTO projects_search(rowid, title, body) SELECT id * 4 + 2, task_name, description FROM projects_task"
+        )
+        schema_editor.execute(
+            "INSERT INTO projects_search(rowid, title, body) SELECT id * 4 + 3, '', content FROM projects_comment"
+        )
+    elif connection.vendor == 'mysql':
+        for table, name, columns in FULLTEXT_INDEXES:
+            schema_editor.execute(f'ALTER TABLE {table} ADD FULLTEXT INDEX {name} ({columns})')
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS projects_search')
+    elif connection.vendor == 'mysql':
+        for table, name, columns in FULLTEXT_INDEXES:
+            schema_editor.execute(f'ALTER TABLE {table} DROP INDEX {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0006_project_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:24
+
+import projects.uploads
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0008_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='project',
+            name='project_pictures',
+            field=models.ImageField(blank=True, null=True, storage=projects.uploads.picture_storage, upload_to='media/projects/pictures/'),
+        ),
+    ]
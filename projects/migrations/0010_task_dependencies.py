@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0009_picture_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='depends_on',
+            field=models.ManyToManyField(blank=True, related_name='dependents', to='projects.task'),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='start_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
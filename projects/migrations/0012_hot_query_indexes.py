@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('projects', '0011_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activitylog',
+            index=models.Index(fields=['content_type', 'object_id', 'timestamp'], name='projects_ac_content_e1b705_idx'),
+        ),
+        # Dropped after its replacement exists, so lookups by object never lose their index
+        migrations.RemoveIndex(
+            model_name='activitylog',
+            name='projects_ac_content_cdf10d_idx',
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['project', 'created_at'], name='projects_co_project_9e5987_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['project', 'status', 'budget'], name='projects_ta_project_d5b6c8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['assigned_to', 'due_date'], name='projects_ta_assigne_c46021_idx'),
+        ),
+    ]
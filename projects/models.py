@@ -1,8 +1,11 @@
-from django.db import models
+from django.db import models, transaction
+from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
+from .uploads import picture_storage
+
 
 class Division(models.Model):
     division_name = models.CharField(max_length=100, unique=True)
@@ -19,7 +22,14 @@ class Ward(models.Model):
         unique_together = ('division', 'ward_name')
 
     def __str__(self):
-        return f"{self.ward_name} ({self.division.division_name})"
+        if Ward.division.is_cached(self):
+            return f"{self.ward_name} ({self.division.division_name})"
+        # Look the parent up in the in-process location tree rather than querying for it
+        from .locations import location_tree
+        try:
+            return f"{self.ward_name} ({location_tree().division_name(self.division_id)})"
+        except KeyError:
+            return f"{self.ward_name} ({self.division.division_name})"
 
 class Village(models.Model):
     ward = models.ForeignKey(Ward, related_name='villages', on_delete=models.CASCADE)
@@ -29,7 +39,14 @@ class Village(models.Model):
         unique_together = ('ward', 'village_name')
 
     def __str__(self):
-        return f"{self.village_name} ({self.ward.ward_name})"
+        if Village.ward.is_cached(self):
+            return f"{self.village_name} ({self.ward.ward_name})"
+        # Look the parent up in the in-process location tree rather than querying for it
+        from .locations import location_tree
+        try:
+            return f"{self.village_name} ({location_tree().ward_name(self.ward_id)})"
+        except KeyError:
+            return f"{self.village_name} ({self.ward.ward_name})"
 
 
 # class ImplementationModel(models.Model):
@@ -61,10 +78,22 @@ class Project(models.Model):
     end_date = models.DateTimeField()
     source_of_fund = models.CharField(max_length=255)
     description = models.TextField()
-    project_pictures = models.ImageField(upload_to='media/projects/pictures/', null=True, blank=True)
+    project_pictures = models.ImageField(upload_to='media/projects/pictures/', storage=picture_storage, null=True, blank=True)
     evaluation_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0) 
     location = models.ForeignKey(Village, related_name='projects', on_delete=models.SET_NULL, null=True, blank=True)
+    # Resized/WebP copies of project_pictures, filled in by an ImageJob (see projects/images.py)
+    picture_variants = models.JSONField(default=dict, blank=True, editable=False)
     # comments = models.TextField(null=True, blank=True) 
+    # Change timestamps behind the ETag/Last-Modified of the read views (projects/conditional.py)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Keyset pagination of the project listing and its filters
+            models.Index(fields=['start_date', 'id']),
+            models.Index(fields=['location', 'start_date']),
+            models.Index(fields=['supervisor', 'start_date']),
+        ]
 
     def __str__(self):
         return self.project_name
@@ -89,9 +118,22 @@ class Task(models.Model):
     description = models.TextField()
     task_state = models.ForeignKey(TaskPlan, on_delete=models.CASCADE)
     assigned_to = models.ForeignKey(User, related_name='tasks', on_delete=models.DO_NOTHING)
+    # Planned start; tasks without one are scheduled from the project start (see projects/scheduling.py)
+    start_date = models.DateField(null=True, blank=True)
     due_date = models.DateField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='To Do')
     budget = models.DecimalField(max_digits=12, decimal_places=2)  # Assuming budget is a decimal field
+    # Tasks of the same project that have to finish before this one can start
+    depends_on = models.ManyToManyField('self', symmetrical=False, related_name='dependents', blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # Status rollups per project (projects/stats.py); budget is included so the index covers them
+            models.Index(fields=['project', 'status', 'budget']),
+            # An officer's tasks by due date
+            models.Index(fields=['assigned_to', 'due_date']),
+        ]
 
     def __str__(self):
         return f"{self.task_name} ({self.project.project_name})"
@@ -104,9 +146,55 @@ class Task(models.Model):
         if self.budget > self.project.total_cost:
             raise ValidationError('Task budget cannot exceed project total cost.')
 
+        if self.start_date and self.due_date and self.start_date > self.due_date:
+            raise ValidationError({'start_date': 'Start date cannot be after the due date.'})
+
     def save(self, *args, **kwargs):
         self.full_clean()  # Validate model fields
-        super().save(*args, **kwargs)
+        # Atomic so the ProjectStats update made by the post_save receiver commits with the task.
+        # No savepoint, as in Model.save_base(), so saves in one transaction share a savepoint scope.
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+
+# Task rollups per project, kept up to date by the Task signals in projects/stats.py
+class ProjectStats(models.Model):
+    # Task status -> (count field, budget field)
+    STATUS_FIELDS = {
+        'To Do': ('todo_count', 'todo_budget'),
+        'In Progress': ('in_progress_count', 'in_progress_budget'),
+        'Done': ('done_count', 'done_budget'),
+    }
+
+    project = models.OneToOneField(Project, related_name='stats', on_delete=models.CASCADE, primary_key=True)
+    todo_count = models.PositiveIntegerField(default=0)
+    in_progress_count = models.PositiveIntegerField(default=0)
+    done_count = models.PositiveIntegerField(default=0)
+    todo_budget = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    in_progress_budget = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    done_budget = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = 'project stats'
+
+    def __str__(self):
+        return f"Stats for project {self.project_id}"
+
+    @property
+    def total_tasks(self):
+        return self.todo_count + self.in_progress_count + self.done_count
+
+    @property
+    def total_budget(self):
+        return self.todo_budget + self.in_progress_budget + self.done_budget
+
+    @property
+    def completion_percentage(self):
+        total = self.total_tasks
+        return (self.done_count / total) * 100 if total > 0 else 0
+
+    def budget_by_status(self):
+        return {status: getattr(self, budget_field) for status, (_, budget_field) in self.STATUS_FIELDS.items()}
 
 
 class Comment(models.Model):
@@ -114,9 +202,19 @@ class Comment(models.Model):
     user = models.ForeignKey(User, related_name='projects_comments', on_delete=models.CASCADE)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # A project's comments, newest first
+            models.Index(fields=['project', 'created_at']),
+        ]
 
     def __str__(self):
-        return f"Comment by {self.user.username} on {self.project.project_name}"
+        # Only name the user and project when they were select_related, so listing comments stays one query
+        if Comment.user.is_cached(self) and Comment.project.is_cached(self):
+            return f"Comment by {self.user.username} on {self.project.project_name}"
+        return f"Comment #{self.pk} on project #{self.project_id}"
 
 # For logging all activities
 class ActivityLog(models.Model):
@@ -126,3 +224,51 @@ class ActivityLog(models.Model):
     object_id = models.PositiveIntegerField()
     content_object = GenericForeignKey('content_type', 'object_id')
     timestamp = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp']),
+            # An object's history in time order
+            models.Index(fields=['content_type', 'object_id', 'timestamp']),
+        ]
+
+
+# Background jobs, picked up by the run_worker management command
+class BackgroundJob(models.Model):
+    STATUS_PENDING = 'Pending'
+    STATUS_RUNNING = 'Running'
+    STATUS_DONE = 'Done'
+    STATUS_FAILED = 'Failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        abstract = True
+
+
+class ReportJob(BackgroundJob):
+    project = models.ForeignKey(Project, related_name='report_jobs', on_delete=models.CASCADE)
+    requested_by = models.ForeignKey(User, related_name='report_jobs', on_delete=models.SET_NULL, null=True, blank=True)
+    fingerprint = models.CharField(max_length=64, db_index=True)
+    report_file = models.FileField(upload_to='reports/', null=True, blank=True)
+
+    def __str__(self):
+        return f"Report job {self.id} ({self.status})"
+
+
+class ImageJob(BackgroundJob):
+    project = models.ForeignKey(Project, related_name='image_jobs', on_delete=models.CASCADE)
+    source = models.CharField(max_length=255)  # project_pictures name the variants are made from
+
+    def __str__(self):
+        return f"Image job {self.id} ({self.status})"
@@ -0,0 +1,52 @@
+# Keyset (cursor) pagination.
+# Pages are fetched with WHERE (order_field, id) > (last value, last id) instead of OFFSET,
+# so every page costs the same index range scan no matter how deep the reader goes.
+import base64
+import datetime
+
+from django.db.models import Q
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def encode_cursor(value, pk):
+    return base64.urlsafe_b64encode(f'{value.isoformat()}|{pk}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (datetime, pk); raises ValueError for a malformed cursor."""
+    try:
+        value, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.datetime.fromisoformat(value), int(pk)
+    except (UnicodeError, TypeError, ValueError) as error:
+        raise ValueError(f'Invalid cursor: {cursor!r}') from error
+
+
+def keyset_page(queryset, cursor=None, page_size=20, order_field='start_date'):
+    queryset = queryset.order_by(order_field, 'id')
+    if cursor:
+        value, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(**{f'{order_field}__gt': value}) | Q(**{order_field: value, 'id__gt': pk}))
+
+    # One extra row tells us whether there is a next page without a COUNT query
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, order_field), last.pk)
+    return KeysetPage(items, next_cursor)
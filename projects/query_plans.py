@@ -0,0 +1,153 @@
+# EXPLAIN for the hot query shapes.
+# HOT_QUERIES names the queries the busy views, rollups and schedulers run, each built the
+# way the code builds it for a representative row (the first project, officer, village
+# and task in the database, or id 1 when a table is empty). explain_hot_queries() runs
+# EXPLAIN on each and picks out the tables read in full: on SQLite the "SCAN <table>" steps
+# that use no index, on MySQL the tables with access_type ALL in EXPLAIN FORMAT=JSON.
+# Queries that read most of a table by design are marked expect_scan and reported but
+# not flagged.
+import datetime
+import json
+import re
+from typing import Callable, NamedTuple
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connections
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .conditional import project_state_query
+from .models import ActivityLog, Comment, Project, Task, Village
+from .workload import WORKLOAD_WEEKS, open_task_rows, week_start
+
+
+class HotQuery(NamedTuple):
+    name: str
+    description: str
+    build: Callable  # sample ids -> QuerySet
+    expect_scan: bool = False
+
+
+class QueryPlan(NamedTuple):
+    name: str
+    sql: str
+    plan: str
+    full_scans: list  # tables read without an index
+    expect_scan: bool
+
+    @property
+    def flagged(self):
+        return bool(self.full_scans) and not self.expect_scan
+
+
+def _workload_rows(ids):
+    start = week_start(ids['today'])
+    return open_task_rows(start, start + datetime.timedelta(weeks=WORKLOAD_WEEKS), ids['today'])
+
+
+HOT_QUERIES = [
+    HotQuery(
+        'task_status_rollup', 'Task counts and budgets per status of a project (stats rebuild)',
+        lambda ids: Task.objects.filter(project_id__in=[ids['project']])
+        .values('project_id', 'status').annotate(count=Count('id'), budget=Sum('budget')).order_by(),
+    ),
+    HotQuery(
+        'officer_tasks', "An officer's open tasks by due date",
+        lambda ids: Task.objects.filter(assigned_to_id=ids['user'], due_date__gte=ids['today'])
+        .order_by('due_date').values_list('id', 'due_date'),
+    ),
+    HotQuery(
+        'project_comments', "A project's comments, newest first (project detail)",
+        lambda ids: Comment.objects.filter(project_id=ids['project']).order_by('-created_at'),
+    ),
+    HotQuery(
+        'village_projects', 'Projects of a village by start date (project listing filter)',
+        lambda ids: Project.objects.filter(location_id=ids['village']).order_by('start_date', 'id')[:21],
+    ),
+    HotQuery(
+        'project_listing', 'First page of the project listing (keyset on start_date, id)',
+        lambda ids: Project.objects.order_by('start_date', 'id')[:21],
+    ),
+    HotQuery(
+        'object_activity', "An object's activity log in time order",
+        lambda ids: ActivityLog.objects.filter(content_type_id=ids['task_type'], object_id=ids['task']).order_by('timestamp'),
+    ),
+    HotQuery(
+        'project_state', 'Conditional GET validators of a project page',
+        lambda ids: project_state_query(ids['project']),
+    ),
+    HotQuery(
+        'schedule_tasks', "A project's tasks for critical path scheduling",
+        lambda ids: Task.objects.filter(project_id__in=[ids['project']])
+        .values_list('project_id', 'id', 'task_name', 'start_date', 'due_date', 'status'),
+    ),
+    # Every open task in the window feeds the heatmap, so reading the table is the cheaper plan
+    HotQuery('workload_tasks', 'Open tasks in the workload window', _workload_rows, expect_scan=True),
+]
+
+
+def sample_ids():
+    """Representative ids for HOT_QUERIES; 1 stands in for tables that are empty."""
+    def first(model):
+        return model.objects.order_by('pk').values_list('pk', flat=True).first() or 1
+
+    return {
+        'project': first(Project),
+        'user': first(User),
+        'village': first(Village),
+        'task': first(Task),
+        'task_type': ContentType.objects.get_for_model(Task).pk,
+        'today': timezone.localdate(),
+    }
+
+
+# SQLite: "SCAN projects_task" reads the table; "SCAN ... USING (COVERING) INDEX" walks an index
+_SQLITE_SCAN = re.compile(r'\bSCAN (?:TABLE )?(?!CONSTANT ROW)(\w+)(?! USING)(?:\s|$)')
+
+
+def sqlite_full_scans(plan):
+    return [match.group(1) for match in _SQLITE_SCAN.finditer(plan)]
+
+
+def mysql_full_scans(plan):
+    """Tables with access_type ALL anywhere in an EXPLAIN FORMAT=JSON document."""
+    tables = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            if node.get('access_type') == 'ALL' and 'table_name' in node:
+                tables.append(node['table_name'])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(json.loads(plan))
+    return tables
+
+
+def explain(queryset):
+    """(plan text, tables read in full) for `queryset` on its database."""
+    vendor = connections[queryset.db].vendor
+    if vendor == 'mysql':
+        plan = queryset.explain(format='JSON')
+        return plan, mysql_full_scans(plan)
+    plan = queryset.explain()
+    if vendor == 'sqlite':
+        return plan, sqlite_full_scans(plan)
+    return plan, []
+
+
+def explain_hot_queries(names=None, using='default'):
+    """QueryPlan for each of HOT_QUERIES (or those in `names`), in order."""
+    ids = sample_ids()
+    plans = []
+    for query in HOT_QUERIES:
+        if names and query.name not in names:
+            continue
+        queryset = query.build(ids).using(using)
+        plan, full_scans = explain(queryset)
+        plans.append(QueryPlan(query.name, str(queryset.query), plan, full_scans, query.expect_scan))
+    return plans
@@ -0,0 +1,137 @@
+# Live project updates over Channels.
+# Task and comment saves/deletes are turned into small deltas and sent to the project's
+# group ("project_<id>") once the surrounding transaction commits; every delivery carries
+# the project's current ProjectStats so open pages can update progress and the budget pie
+# without reloading. Deltas from one transaction are sent as one message per project.
+# Nothing is queued or sent (and no query is made) unless REALTIME_UPDATES is on and a
+# channel layer is configured (CHANNEL_LAYERS).
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Comment, ProjectStats, Task
+
+
+REALTIME_UPDATES = getattr(settings, 'REALTIME_UPDATES', True)
+
+
+def project_group(project_id):
+    return f'project_{project_id}'
+
+
+def stats_payload(stats):
+    if stats is None:
+        return None
+    return {
+        'todo': stats.todo_count,
+        'in_progress': stats.in_progress_count,
+        'done': stats.done_count,
+        'total_tasks': stats.total_tasks,
+        'total_budget': str(stats.total_budget),
+        'completion': round(stats.completion_percentage, 2),
+        'budget_by_status': {status: str(budget) for status, budget in stats.budget_by_status().items()},
+    }
+
+
+class Outbox:
+    def __init__(self):
+        self.deltas = defaultdict(list)
+
+    def add(self, project_id, delta):
+        self.deltas[project_id].append(delta)
+
+    def flush(self):
+        deltas, self.deltas = self.deltas, defaultdict(list)
+        layer = get_channel_layer()
+        if not deltas or layer is None:
+            return
+
+        # One query each for the users named in the deltas and the affected projects' stats
+        user_ids = {delta['user_id'] for batch in deltas.values() for delta in batch if 'user_id' in delta}
+        users = {pk: (username, f'{first} {last}'.strip()) for pk, username, first, last in
+                 User.objects.filter(id__in=user_ids).values_list('id', 'username', 'first_name', 'last_name')}
+        stats = ProjectStats.objects.in_bulk(list(deltas))
+
+        send = async_to_sync(layer.group_send)
+        for project_id, batch in deltas.items():
+            for delta in batch:
+                if 'user_id' in delta:
+                    delta['user'], delta['user_full_name'] = users.get(delta.pop('user_id'), ('', ''))
+            send(project_group(project_id), {
+                'type': 'project.update',
+                'data': {'project': project_id, 'deltas': batch, 'stats': stats_payload(stats.get(project_id))},
+            })
+
+
+def _transaction_outbox(using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    outbox = getattr(connection, 'realtime_outbox', None)
+    # A rollback discards the on_commit hook, and with it the deltas it would have sent.
+    if outbox is None or not any(hook[1] == outbox.flush for hook in connection.run_on_commit):
+        outbox = Outbox()
+        connection.realtime_outbox = outbox
+        transaction.on_commit(outbox.flush, using=using)
+    return outbox
+
+
+def publish(project_id, delta, using=DEFAULT_DB_ALIAS):
+    if not REALTIME_UPDATES or get_channel_layer() is None:
+        return
+    if connections[using].in_atomic_block:
+        _transaction_outbox(using).add(project_id, delta)
+    else:
+        outbox = Outbox()
+        outbox.add(project_id, delta)
+        outbox.flush()
+
+
+def task_delta(task, action):
+    delta = {'kind': 'task', 'action': action, 'id': task.pk}
+    if action != 'deleted':
+        delta.update(
+            name=task.task_name,
+            status=task.status,
+            budget=str(task.budget),
+            due_date=str(task.due_date),
+            user_id=task.assigned_to_id,
+        )
+    return delta
+
+
+def comment_delta(comment, action):
+    delta = {'kind': 'comment', 'action': action, 'id': comment.pk}
+    if action != 'deleted':
+        delta.update(
+            content=comment.content,
+            created_at=comment.created_at.isoformat() if comment.created_at else None,
+            user_id=comment.user_id,
+        )
+    return delta
+
+
+@receiver(post_save, sender=Task)
+def publish_task_save(sender, instance, created, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    if not raw:
+        publish(instance.project_id, task_delta(instance, 'created' if created else 'updated'), using)
+
+
+@receiver(post_delete, sender=Task)
+def publish_task_delete(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    publish(instance.project_id, task_delta(instance, 'deleted'), using)
+
+
+@receiver(post_save, sender=Comment)
+def publish_comment_save(sender, instance, created, raw=False, using=DEFAULT_DB_ALIAS, **kwargs):
+    if not raw:
+        publish(instance.project_id, comment_delta(instance, 'created' if created else 'updated'), using)
+
+
+@receiver(post_delete, sender=Comment)
+def publish_comment_delete(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    publish(instance.project_id, comment_delta(instance, 'deleted'), using)
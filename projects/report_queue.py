@@ -0,0 +1,86 @@
+# Queueing and rendering of project PDF reports.
+# Reports are rendered by the run_worker command and stored under MEDIA_ROOT/reports/;
+# a project whose report data has not changed reuses the PDF that was already rendered.
+import hashlib
+import json
+
+from django.core.files.base import ContentFile
+
+from .jobs import enqueue, stale_jobs
+from .models import Project, ReportJob, Task
+
+
+def project_report_data(project, tasks):
+    """Snapshot everything the report shows. `tasks` should have assigned_to selected."""
+    task_rows = [
+        [
+            task.task_name,
+            task.assigned_to.get_full_name(),
+            task.due_date.strftime('%Y-%m-%d'),
+            task.get_status_display(),
+        ]
+        for task in tasks
+    ]
+    completed_tasks = sum(1 for task in tasks if task.status == 'Done')
+    total_tasks = len(task_rows)
+
+    return {
+        'project_id': project.id,
+        'project_name': project.project_name,
+        'project_code': project.project_code,
+        'supervisor': project.supervisor.get_full_name() if project.supervisor else '',
+        # Fixed places, so an unsaved Decimal('100') and the stored 100.00 fingerprint alike
+        'total_cost': f'{project.total_cost:.2f}',
+        'start_date': project.start_date.strftime('%Y-%m-%d'),
+        'end_date': project.end_date.strftime('%Y-%m-%d'),
+        'source_of_fund': project.source_of_fund,
+        'tasks': task_rows,
+        'progress_percentage': (completed_tasks / total_tasks) * 100 if total_tasks > 0 else 0,
+    }
+
+
+def report_fingerprint(data):
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def project_report_snapshot(project):
+    tasks = list(Task.objects.select_related('assigned_to').filter(project=project).order_by('id'))
+    return project_report_data(project, tasks)
+
+
+def report_file_exists(job):
+    return bool(job.report_file) and job.report_file.storage.exists(job.report_file.name)
+
+
+def request_project_report(project, user=None):
+    """Return a job for the current state of the project, reusing a matching one when possible."""
+    fingerprint = report_fingerprint(project_report_snapshot(project))
+
+    existing = (
+        ReportJob.objects.filter(project=project, fingerprint=fingerprint)
+        .exclude(status=ReportJob.STATUS_FAILED)
+        # A job left Running by a worker that died would never finish
+        .exclude(id__in=stale_jobs(ReportJob).values('id'))
+        .order_by('-created_at')
+        .first()
+    )
+    if existing is not None:
+        if existing.status != ReportJob.STATUS_DONE or report_file_exists(existing):
+            return existing
+
+    return enqueue(ReportJob(project=project, requested_by=user, fingerprint=fingerprint))
+
+
+def render_report_job(job):
+    # reportlab is only imported by the worker that renders
+    from .reports import render_project_report
+
+    project = Project.objects.select_related('supervisor').get(id=job.project_id)
+    data = project_report_snapshot(project)
+    # Record what was actually rendered; the data may have moved on since the job was queued.
+    job.fingerprint = report_fingerprint(data)
+    job.report_file.save(
+        f'project_{project.id}_{job.fingerprint[:12]}.pdf',
+        ContentFile(render_project_report(data)),
+        save=False,
+    )
@@ -0,0 +1,80 @@
+# PDF generators
+# Kept out of views.py so the reportlab platypus stack is only imported when a report is built.
+# Rendering works on the plain-data snapshot built by report_queue.project_report_data,
+# so it can run in a worker process without touching the database.
+import io
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, PageBreak, Paragraph, Spacer, Table, TableStyle
+
+
+def report_elements(data, styles):
+    elements = []
+
+    # Title
+    elements.append(Paragraph(f"Project Report: {data['project_name']}", styles['Title']))
+    # Project Details
+    project_details = f"""
+    <b>Project Name:</b> {data['project_name']}<br/>
+    <b>Project Code:</b> {data['project_code']}<br/>
+    <b>Supervisor:</b> {data['supervisor']}<br/>
+    <b>Total Cost:</b> ${data['total_cost']}<br/>
+    <b>Start Date:</b> {data['start_date']}<br/>
+    <b>End Date:</b> {data['end_date']}<br/>
+    <b>Source of Fund:</b> {data['source_of_fund']}<br/>
+    """
+    elements.append(Paragraph(project_details, styles['Normal']))
+    elements.append(Spacer(1, 12))
+
+    # Task Progress
+    task_data = [['Task Name', 'Assigned To', 'Due Date', 'Status']] + data['tasks']
+
+    table = Table(task_data, colWidths=[200, 100, 100, 100])
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 14),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ]))
+
+    elements.append(table)
+    elements.append(Spacer(1, 12))
+
+    # Progress Evaluation
+    progress_evaluation = f"""
+    <b>Progress Evaluation:</b> {data['progress_percentage']:.2f}% Complete
+    """
+    elements.append(Paragraph(progress_evaluation, styles['Normal']))
+    return elements
+
+
+def build_project_report(buffer, data):
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    doc.build(report_elements(data, getSampleStyleSheet()))
+
+
+def render_project_report(data):
+    buffer = io.BytesIO()
+    build_project_report(buffer, data)
+    return buffer.getvalue()
+
+
+def render_merged_report(data_list):
+    """One PDF with every project's report, each starting on a new page."""
+    buffer = io.BytesIO()
+    styles = getSampleStyleSheet()
+    elements = []
+    for data in data_list:
+        if elements:
+            elements.append(PageBreak())
+        elements.extend(report_elements(data, styles))
+    if not elements:
+        elements.append(Paragraph('No projects found.', styles['Normal']))
+    SimpleDocTemplate(buffer, pagesize=letter).build(elements)
+    return buffer.getvalue()
@@ -0,0 +1,123 @@
+# Spend and progress aggregates for every Village, Ward and Division.
+# One grouped query per village (projects joined to their ProjectStats row), then the
+# figures are folded up the location tree in memory, so the whole district costs one query.
+# The result is cached until a project, task or location changes (projects/cache.py).
+from decimal import Decimal
+
+from django.db.models import Count, F, Sum
+
+from .cache import LOCATIONS, cached
+from .locations import location_tree
+from .models import Project
+
+
+_SUMS = ('project_count', 'total_cost', 'allocated_budget', 'todo_tasks', 'in_progress_tasks', 'done_tasks', 'evaluation_sum')
+
+
+def _empty():
+    return {
+        'project_count': 0,
+        'total_cost': Decimal('0'),
+        'allocated_budget': Decimal('0'),
+        'todo_tasks': 0,
+        'in_progress_tasks': 0,
+        'done_tasks': 0,
+        'evaluation_sum': Decimal('0'),
+    }
+
+
+def _add(target, source):
+    for key in _SUMS:
+        target[key] += source[key]
+
+
+def _finish(node):
+    count = node['project_count']
+    return {
+        'project_count': count,
+        'total_cost': node['total_cost'],
+        'allocated_budget': node['allocated_budget'],
+        'todo_tasks': node['todo_tasks'],
+        'in_progress_tasks': node['in_progress_tasks'],
+        'done_tasks': node['done_tasks'],
+        'average_evaluation': (node['evaluation_sum'] / count).quantize(Decimal('0.01')) if count else Decimal('0'),
+    }
+
+
+class LocationRollup:
+    def __init__(self, tree, by_village):
+        self.tree = tree
+        self._villages = {village_id: _empty() for village_id in tree.village_ids}
+        self._wards = {ward_id: _empty() for ward_id in tree.ward_ids}
+        self._divisions = {division_id: _empty() for division_id in tree.division_ids}
+        self._district = _empty()
+
+        for village_id, row in by_village.items():
+            if village_id not in self._villages:
+                continue
+            ward_id = tree.village_ward_id(village_id)
+            for node in (self._villages[village_id], self._wards[ward_id], self._divisions[tree.ward_division_id(ward_id)], self._district):
+                _add(node, row)
+
+    @classmethod
+    def load(cls):
+        rows = (
+            Project.objects.filter(location__isnull=False)
+            .values('location_id')
+            .annotate(
+                project_count=Count('id'),
+                total_cost=Sum('total_cost'),
+                evaluation_sum=Sum('evaluation_percentage'),
+                allocated_budget=Sum(F('stats__todo_budget') + F('stats__in_progress_budget') + F('stats__done_budget')),
+                todo_tasks=Sum('stats__todo_count'),
+                in_progress_tasks=Sum('stats__in_progress_count'),
+                done_tasks=Sum('stats__done_count'),
+            )
+            .order_by()
+        )
+        by_village = {}
+        for row in rows:
+            by_village[row.pop('location_id')] = {key: row[key] or 0 for key in _SUMS}
+        return cls(location_tree(), by_village)
+
+    def district(self):
+        return _finish(self._district)
+
+    def division(self, division_id):
+        return _finish(self._divisions[division_id])
+
+    def ward(self, ward_id):
+        return _finish(self._wards[ward_id])
+
+    def village(self, village_id):
+        return _finish(self._villages[village_id])
+
+    def village_tree(self, village_id):
+        return {'id': village_id, 'name': self.tree.village_name(village_id), **self.village(village_id)}
+
+    def ward_tree(self, ward_id):
+        return {
+            'id': ward_id,
+            'name': self.tree.ward_name(ward_id),
+            **self.ward(ward_id),
+            'villages': [self.village_tree(village_id) for village_id in self.tree.village_ids_of(ward_id)],
+        }
+
+    def division_tree(self, division_id):
+        return {
+            'id': division_id,
+            'name': self.tree.division_name(division_id),
+            **self.division(division_id),
+            'wards': [self.ward_tree(ward_id) for ward_id in self.tree.ward_ids_of(division_id)],
+        }
+
+    def as_tree(self):
+        return {
+            **self.district(),
+            'divisions': [self.division_tree(division_id) for division_id in self.tree.division_ids],
+        }
+
+
+def location_rollup():
+    # Rebuilt only after a project, task or location changes
+    return cached('location_rollup', ('project', 'task', *LOCATIONS), LocationRollup.load)
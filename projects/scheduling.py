@@ -0,0 +1,307 @@
+# Critical path scheduling of project tasks.
+# A task runs from its start_date (or the project start) to its due_date and cannot start
+# before every task it depends_on has finished. compute_schedule() does a forward and a
+# backward pass over the dependency graph in topological order (Kahn's algorithm, O(V+E))
+# to get each task's earliest/latest start and finish, its slack and the critical path,
+# i.e. the chain of zero-slack tasks that decides when the project can end.
+# Schedules are cached per project under the chart version stamp (projects/chart_cache.py),
+# which task saves, deletes and dependency changes move on.
+import datetime
+import logging
+from collections import defaultdict, deque
+from typing import NamedTuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .chart_cache import invalidate_project_charts, project_chart_version, project_chart_versions
+from .models import Project, Task
+
+
+logger = logging.getLogger(__name__)
+
+SCHEDULE_CACHE_TIMEOUT = getattr(settings, 'SCHEDULE_CACHE_TIMEOUT', 60 * 60 * 24)
+# Projects per tasks/dependencies query when scheduling many projects at once
+SCHEDULE_CHUNK_SIZE = getattr(settings, 'SCHEDULE_CHUNK_SIZE', 500)
+
+TaskDependency = Task.depends_on.through
+
+
+class ScheduleError(ValueError):
+    def __init__(self, message, cycle=()):
+        super().__init__(message)
+        self.cycle = list(cycle)
+
+
+class TaskSchedule(NamedTuple):
+    id: int
+    name: str
+    status: str
+    due_date: datetime.date
+    duration: int  # days
+    early_start: datetime.date
+    early_finish: datetime.date
+    late_start: datetime.date
+    late_finish: datetime.date
+    slack: int  # days the task can slip without moving the project finish
+    critical: bool
+
+    @property
+    def done(self):
+        return self.status == 'Done'
+
+    @property
+    def slipped_days(self):
+        """Days the dependencies push this task past its own due date."""
+        return max((self.early_finish - self.due_date).days, 0)
+
+
+class ProjectSchedule(NamedTuple):
+    project_id: int
+    start: datetime.date
+    deadline: datetime.date
+    finish: datetime.date  # earliest date every task can be finished
+    tasks: dict  # task id -> TaskSchedule, in topological order
+    critical_path: list  # task ids, first to last
+
+    @property
+    def late_days(self):
+        return max((self.finish - self.deadline).days, 0)
+
+    def overdue_critical_tasks(self, today=None):
+        today = today or timezone.localdate()
+        return [
+            self.tasks[task_id] for task_id in self.critical_path
+            if not self.tasks[task_id].done and self.tasks[task_id].due_date < today
+        ]
+
+    def at_risk(self, today=None):
+        return self.late_days > 0 or bool(self.overdue_critical_tasks(today))
+
+
+def _as_date(value):
+    if isinstance(value, datetime.datetime):
+        return timezone.localtime(value).date() if timezone.is_aware(value) else value.date()
+    return value
+
+
+def topological_order(nodes, edges):
+    """Task ids ordered so every dependency comes before its dependents; raises ScheduleError on a cycle.
+
+    `edges` are (task id, id of the task it depends on) pairs.
+    """
+    successors = defaultdict(list)
+    indegree = dict.fromkeys(nodes, 0)
+    for task_id, dependency_id in edges:
+        successors[dependency_id].append(task_id)
+        indegree[task_id] += 1
+
+    ready = deque(node for node in nodes if indegree[node] == 0)
+    order = []
+    while ready:
+        node = ready.popleft()
+        order.append(node)
+        for successor in successors[node]:
+            indegree[successor] -= 1
+            if indegree[successor] == 0:
+                ready.append(successor)
+
+    if len(order) != len(indegree):
+        cycle = sorted(node for node, count in indegree.items() if count > 0)
+        raise ScheduleError(f'Task dependencies form a cycle between tasks {cycle}.', cycle)
+    return order
+
+
+def compute_schedule(project_id, start, deadline, tasks, edges):
+    """ProjectSchedule for one project.
+
+    `tasks` are (id, name, start_date, due_date, status) rows and `edges` (task id, dependency id)
+    pairs between them. Dates are handled as day offsets from the project start.
+    """
+    start, deadline = _as_date(start), _as_date(deadline)
+    rows = {row[0]: row for row in tasks}
+    edges = [(task_id, dependency_id) for task_id, dependency_id in edges if task_id in rows and dependency_id in rows]
+    order = topological_order(list(rows), edges)
+
+    predecessors, successors = defaultdict(list), defaultdict(list)
+    for task_id, dependency_id in edges:
+        predecessors[task_id].append(dependency_id)
+        successors[dependency_id].append(task_id)
+
+    duration, early_start, early_finish = {}, {}, {}
+    for task_id in order:
+        _, _, planned_start, due_date, _ = rows[task_id]
+        planned = (planned_start - start).days if planned_start else 0
+        # A task takes at least a day, even when it is due the day it starts
+        duration[task_id] = max((due_date - (planned_start or start)).days, 1)
+        early_start[task_id] = max([planned] + [early_finish[p] for p in predecessors[task_id]])
+        early_finish[task_id] = early_start[task_id] + duration[task_id]
+
+    finish = max(early_finish.values(), default=0)
+    late_start, late_finish = {}, {}
+    for task_id in reversed(order):
+        late_finish[task_id] = min([finish] + [late_start[s] for s in successors[task_id]])
+        late_start[task_id] = late_finish[task_id] - duration[task_id]
+
+    def day(offset):
+        return start + datetime.timedelta(days=offset)
+
+    schedules = {}
+    for task_id in order:
+        _, name, _, due_date, status = rows[task_id]
+        slack = late_start[task_id] - early_start[task_id]
+        schedules[task_id] = TaskSchedule(
+            task_id, name, status, due_date, duration[task_id],
+            day(early_start[task_id]), day(early_finish[task_id]),
+            day(late_start[task_id]), day(late_finish[task_id]),
+            slack, slack == 0,
+        )
+
+    # Walk back from the task that finishes last through predecessors that end exactly when it starts
+    path = []
+    current = max(order, key=lambda task_id: early_finish[task_id], default=None)
+    while current is not None:
+        path.append(current)
+        current = next(
+            (p for p in predecessors[current] if schedules[p].critical and early_finish[p] == early_start[current]),
+            None,
+        )
+    path.reverse()
+
+    return ProjectSchedule(project_id, start, deadline, day(finish), schedules, path)
+
+
+def _schedule_key(project_id, version):
+    return f'schedule:project:{project_id}:{version}'
+
+
+def _load_schedules(projects, every_project=False):
+    """Compute schedules for {project id: (start, end)} with one task and one dependency query per chunk.
+
+    With `every_project`, `projects` holds all projects and the tasks are read without an id filter.
+    """
+    schedules = {}
+    project_ids = list(projects)
+    chunks = [project_ids] if every_project else [
+        project_ids[offset:offset + SCHEDULE_CHUNK_SIZE] for offset in range(0, len(project_ids), SCHEDULE_CHUNK_SIZE)
+    ]
+    for chunk in chunks:
+        task_rows, edge_rows = Task.objects.all(), TaskDependency.objects.all()
+        if not every_project:
+            task_rows = task_rows.filter(project_id__in=chunk)
+            edge_rows = edge_rows.filter(from_task__project_id__in=chunk)
+        tasks, edges = defaultdict(list), defaultdict(list)
+        for project_id, *row in task_rows.values_list('project_id', 'id', 'task_name', 'start_date', 'due_date', 'status'):
+            tasks[project_id].append(row)
+        for project_id, task_id, dependency_id in edge_rows.values_list('from_task__project_id', 'from_task_id', 'to_task_id'):
+            edges[project_id].append((task_id, dependency_id))
+
+        for project_id in chunk:
+            start, end = projects[project_id]
+            try:
+                schedules[project_id] = compute_schedule(project_id, start, end, tasks[project_id], edges[project_id])
+            except ScheduleError as error:
+                schedules[project_id] = error
+    return schedules
+
+
+def project_schedule(project):
+    """Cached ProjectSchedule for `project`; raises ScheduleError when its dependencies have a cycle."""
+    key = _schedule_key(project.id, project_chart_version(project.id))
+    schedule = cache.get(key)
+    if schedule is None:
+        schedule = _load_schedules({project.id: (project.start_date, project.end_date)})[project.id]
+        if isinstance(schedule, ScheduleError):
+            raise schedule
+        cache.set(key, schedule, SCHEDULE_CACHE_TIMEOUT)
+    return schedule
+
+
+def projects_at_risk(today=None):
+    """[(project name, ProjectSchedule)] of every project at risk of missing its end date, latest first.
+
+    Cached schedules are fetched in one cache round trip; only the projects whose tasks changed
+    since are recomputed.
+    """
+    today = today or timezone.localdate()
+    projects = {
+        project_id: (name, start, end)
+        for project_id, name, start, end in Project.objects.values_list('id', 'project_name', 'start_date', 'end_date')
+    }
+    keys = {_schedule_key(project_id, version): project_id for project_id, version in project_chart_versions(list(projects)).items()}
+    schedules = {keys[key]: schedule for key, schedule in cache.get_many(list(keys)).items()}
+
+    missing = {project_id: (start, end) for project_id, (_, start, end) in projects.items() if project_id not in schedules}
+    if missing:
+        computed = _load_schedules(missing, every_project=len(missing) == len(projects))
+        for project_id, schedule in computed.items():
+            if isinstance(schedule, ScheduleError):
+                logger.warning('Cannot schedule project %s: %s', project_id, schedule)
+                continue
+            schedules[project_id] = schedule
+        cache.set_many(
+            {key: schedules[project_id] for key, project_id in keys.items() if project_id in missing and project_id in schedules},
+            SCHEDULE_CACHE_TIMEOUT,
+        )
+
+    at_risk = [(projects[project_id][0], schedule) for project_id, schedule in schedules.items() if schedule.at_risk(today)]
+    at_risk.sort(key=lambda item: (-item[1].late_days, item[1].deadline))
+    return at_risk
+
+
+# Dependency validation
+
+def dependency_errors(task_id, project_id, dependencies):
+    """Messages for dependencies of a task that are in another project or would close a cycle.
+
+    `dependencies` are Task instances; `task_id` is None for a task that is not saved yet.
+    """
+    errors = [
+        f'{dependency.task_name} belongs to another project.'
+        for dependency in dependencies if dependency.project_id != project_id
+    ]
+    if task_id is None or errors:
+        return errors
+
+    # Following depends_on from any new dependency must never lead back to the task itself
+    graph = defaultdict(list)
+    for from_id, to_id in TaskDependency.objects.filter(from_task__project_id=project_id).exclude(from_task_id=task_id).values_list('from_task_id', 'to_task_id'):
+        graph[from_id].append(to_id)
+    for dependency in dependencies:
+        if dependency.id == task_id:
+            errors.append('A task cannot depend on itself.')
+            continue
+        seen, stack = set(), [dependency.id]
+        while stack:
+            node = stack.pop()
+            if node == task_id:
+                errors.append(f'{dependency.task_name} already depends on this task.')
+                break
+            if node not in seen:
+                seen.add(node)
+                stack.extend(graph[node])
+    return errors
+
+
+@receiver(m2m_changed, sender=TaskDependency)
+def check_dependencies(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_add' and pk_set:
+        if reverse:
+            # instance gains dependents: check each of them against it
+            for task in Task.objects.filter(id__in=pk_set).only('id', 'project_id', 'task_name'):
+                errors = dependency_errors(task.id, task.project_id, [instance])
+                if errors:
+                    raise ValidationError(errors)
+        else:
+            dependencies = Task.objects.filter(id__in=pk_set).only('id', 'project_id', 'task_name')
+            errors = dependency_errors(instance.id, instance.project_id, dependencies)
+            if errors:
+                raise ValidationError(errors)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_project_charts(instance.project_id)
+        # auto_now only runs on save(); the project page's ETag has to see the new dependencies
+        Task.objects.filter(id=instance.id).update(updated_at=timezone.now())
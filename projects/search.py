@@ -0,0 +1,178 @@
+# Full-text search over projects, tasks and comments.
+# SQLite: one FTS5 table, projects_search, kept in sync by the receivers below. Its rowid
+# encodes both the kind and the object id (id * 4 + kind code), so updates are rowid lookups.
+# MySQL: FULLTEXT indexes on the model tables themselves, queried with MATCH ... AGAINST.
+# Anything else falls back to icontains.
+import re
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Comment, Project, Task
+
+
+FTS_TABLE = 'projects_search'
+
+SEARCH_RESULTS_LIMIT = getattr(settings, 'SEARCH_RESULTS_LIMIT', 1000)
+
+# kind -> (model, code used in the FTS5 rowid, MySQL FULLTEXT columns, fallback lookups)
+SEARCH_KINDS = {
+    'project': (Project, 1, ('project_name', 'description'), ('project_name', 'project_code', 'description')),
+    'task': (Task, 2, ('task_name', 'description'), ('task_name', 'description')),
+    'comment': (Comment, 3, ('content',), ('content',)),
+}
+_KIND_BY_MODEL = {model: kind for kind, (model, *_) in SEARCH_KINDS.items()}
+_KIND_BY_CODE = {code: kind for kind, (_, code, *_) in SEARCH_KINDS.items()}
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+_fts_available = None
+
+
+def search_backend():
+    global _fts_available
+    if connection.vendor == 'mysql':
+        return 'mysql'
+    if connection.vendor == 'sqlite':
+        if _fts_available is None:
+            _fts_available = FTS_TABLE in connection.introspection.table_names()
+        return 'fts5' if _fts_available else None
+    return None
+
+
+# kind -> fields read to build (title, body), and how
+_DOCUMENT_FIELDS = {
+    'project': (('project_name', 'project_code', 'description'), lambda name, code, description: (f'{name} {code}', description)),
+    'task': (('task_name', 'description'), lambda name, description: (name, description)),
+    'comment': (('content',), lambda content: ('', content)),
+}
+
+
+def document(instance):
+    """(title, body) indexed for a Project, Task or Comment."""
+    fields, build = _DOCUMENT_FIELDS[_KIND_BY_MODEL[type(instance)]]
+    return build(*(getattr(instance, field) for field in fields))
+
+
+def _rowid(kind, object_id):
+    return object_id * 4 + SEARCH_KINDS[kind][1]
+
+
+def index_document(instance):
+    if search_backend() != 'fts5':
+        return
+    title, body = document(instance)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {FTS_TABLE}(rowid, title, body) VALUES (%s, %s, %s)',
+            [_rowid(_KIND_BY_MODEL[type(instance)], instance.pk), title, body],
+        )
+
+
+def remove_document(instance):
+    if search_backend() != 'fts5':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [_rowid(_KIND_BY_MODEL[type(instance)], instance.pk)])
+
+
+def index_documents(kind, ids=None):
+    """Index many rows of one kind in a single executemany (all rows when `ids` is None)."""
+    if search_backend() != 'fts5':
+        return 0
+    model = SEARCH_KINDS[kind][0]
+    fields, build = _DOCUMENT_FIELDS[kind]
+    queryset = model.objects.all() if ids is None else model.objects.filter(id__in=ids)
+    rows = [
+        (_rowid(kind, row[0]), *build(*row[1:]))
+        for row in queryset.values_list('id', *fields).iterator(chunk_size=2000)
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT OR REPLACE INTO {FTS_TABLE}(rowid, title, body) VALUES (%s, %s, %s)', rows)
+    return len(rows)
+
+
+def rebuild_search_index():
+    if search_backend() != 'fts5':
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+    return sum(index_documents(kind) for kind in SEARCH_KINDS)
+
+
+def search(query, kinds=None, limit=50):
+    """Ranked [(kind, object_id)] matches, best first."""
+    words = _WORD.findall(query)
+    kinds = list(kinds or SEARCH_KINDS)
+    if not words:
+        return []
+
+    backend = search_backend()
+    if backend == 'fts5':
+        # Every word must match, the last one as a prefix so it works while typing
+        match = ' '.join(f'"{word}"' for word in words[:-1]) + f' "{words[-1]}"*'
+        codes = ', '.join(str(SEARCH_KINDS[kind][1]) for kind in kinds)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid %% 4 IN ({codes}) '
+                f'ORDER BY bm25({FTS_TABLE}, 10.0, 1.0) LIMIT %s',
+                [match.strip(), limit],
+            )
+            return [(_KIND_BY_CODE[rowid % 4], rowid // 4) for (rowid,) in cursor.fetchall()]
+
+    results = []
+    for kind in kinds:
+        results.extend((kind, object_id, score) for object_id, score in _search_table(kind, words, limit))
+    results.sort(key=lambda result: result[2], reverse=True)
+    return [(kind, object_id) for kind, object_id, _ in results[:limit]]
+
+
+def _search_table(kind, words, limit):
+    model, _, fulltext_columns, fallback_fields = SEARCH_KINDS[kind]
+    if search_backend() == 'mysql':
+        columns = ', '.join(fulltext_columns)
+        against = ' '.join(f'+{word}' for word in words[:-1]) + f' +{words[-1]}*'
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT id, MATCH({columns}) AGAINST (%s IN BOOLEAN MODE) AS score FROM {model._meta.db_table} '
+                f'WHERE MATCH({columns}) AGAINST (%s IN BOOLEAN MODE) ORDER BY score DESC LIMIT %s',
+                [against.strip(), against.strip(), limit],
+            )
+            return cursor.fetchall()
+
+    condition = Q()
+    for word in words:
+        condition &= Q(*(Q(**{f'{field}__icontains': word}) for field in fallback_fields), _connector=Q.OR)
+    return [(object_id, 0) for object_id in model.objects.filter(condition).values_list('id', flat=True)[:limit]]
+
+
+def search_queryset(kind, query, queryset=None, limit=SEARCH_RESULTS_LIMIT):
+    """Objects of one kind matching `query`, best match first, annotated with their `search_rank`."""
+    if queryset is None:
+        queryset = SEARCH_KINDS[kind][0].objects.all()
+    return ranked_queryset(queryset, [object_id for _, object_id in search(query, [kind], limit)])
+
+
+def ranked_queryset(queryset, ids):
+    """`queryset` narrowed to `ids`, in that order, annotated with each one's `search_rank`."""
+    if not ids:
+        return queryset.none().annotate(search_rank=Value(0, output_field=IntegerField()))
+    ranking = Case(*(When(pk=object_id, then=position) for position, object_id in enumerate(ids)), output_field=IntegerField())
+    return queryset.filter(pk__in=ids).annotate(search_rank=ranking).order_by('search_rank')
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=Comment)
+def index_on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_document(instance)
+
+
+@receiver(post_delete, sender=Project)
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=Comment)
+def remove_on_delete(sender, instance, **kwargs):
+    remove_document(instance)
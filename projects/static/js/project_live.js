@@ -0,0 +1,127 @@
+// Applies the deltas projects/realtime.py pushes for one project to the page.
+// Usage: <body ... data-live-project="{{ project.id }}"> or any element with that attribute.
+(function () {
+    "use strict";
+
+    var root = document.querySelector('[data-live-project]');
+    if (!root || !window.WebSocket) {
+        return;
+    }
+    var projectId = root.getAttribute('data-live-project');
+    var scheme = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+    var url = scheme + window.location.host + '/ws/project/' + projectId + '/';
+    var retryDelay = 1000;
+
+    function setText(element, value) {
+        if (element && value !== undefined && value !== null) {
+            element.textContent = value;
+        }
+    }
+
+    function applyStats(stats) {
+        if (!stats) {
+            return;
+        }
+        document.querySelectorAll('[data-stat]').forEach(function (element) {
+            var value = stats[element.getAttribute('data-stat')];
+            setText(element, element.getAttribute('data-stat') === 'completion' ? Number(value).toFixed(2) : value);
+        });
+        // Same slices as charts.build_project_charts: statuses with a non-zero budget
+        var pie = document.getElementById('pie-chart');
+        if (pie && window.Plotly && pie.data) {
+            var labels = [], values = [];
+            Object.keys(stats.budget_by_status).forEach(function (status) {
+                var budget = parseFloat(stats.budget_by_status[status]);
+                if (budget) {
+                    labels.push(status);
+                    values.push(budget);
+                }
+            });
+            window.Plotly.restyle(pie, {labels: [labels], values: [values]});
+        }
+    }
+
+    function taskRow(delta) {
+        var body = document.querySelector('[data-task-rows]');
+        var row = body && body.querySelector('tr[data-task-id="' + delta.id + '"]');
+        if (delta.action === 'deleted') {
+            if (row) {
+                row.remove();
+            }
+            return;
+        }
+        if (!row && body) {
+            var empty = body.querySelector('[data-empty]');
+            if (empty) {
+                empty.remove();
+            }
+            row = document.createElement('tr');
+            row.setAttribute('data-task-id', delta.id);
+            ['name', 'assigned', 'budget', 'status', 'due_date'].forEach(function (field) {
+                var cell = document.createElement('td');
+                cell.setAttribute('data-field', field);
+                row.appendChild(cell);
+            });
+            body.appendChild(row);
+        }
+        if (row) {
+            setText(row.querySelector('[data-field="name"]'), delta.name);
+            setText(row.querySelector('[data-field="assigned"]'), delta.user_full_name);
+            setText(row.querySelector('[data-field="budget"]'), delta.budget);
+            setText(row.querySelector('[data-field="status"]'), delta.status);
+            setText(row.querySelector('[data-field="due_date"]'), delta.due_date);
+        }
+    }
+
+    function comment(delta) {
+        var list = document.querySelector('[data-comment-list]');
+        var item = list && list.querySelector('[data-comment-id="' + delta.id + '"]');
+        if (delta.action === 'deleted') {
+            if (item) {
+                item.remove();
+            }
+            return;
+        }
+        if (!item && list) {
+            var empty = list.querySelector('[data-empty]');
+            if (empty) {
+                empty.remove();
+            }
+            item = document.createElement('div');
+            item.className = 'comment';
+            item.setAttribute('data-comment-id', delta.id);
+            item.innerHTML = '<p><strong data-field="user"></strong> (<span data-field="created_at"></span>)</p><p data-field="content"></p>';
+            list.insertBefore(item, list.firstChild);
+            setText(item.querySelector('[data-field="created_at"]'), new Date(delta.created_at).toLocaleString());
+        }
+        if (item) {
+            setText(item.querySelector('[data-field="user"]'), delta.user);
+            setText(item.querySelector('[data-field="content"]'), delta.content);
+        }
+    }
+
+    function connect() {
+        var socket = new WebSocket(url);
+        socket.onopen = function () {
+            retryDelay = 1000;
+        };
+        socket.onmessage = function (event) {
+            var message = JSON.parse(event.data);
+            message.deltas.forEach(function (delta) {
+                if (delta.kind === 'task') {
+                    taskRow(delta);
+                } else if (delta.kind === 'comment') {
+                    comment(delta);
+                }
+            });
+            applyStats(message.stats);
+        };
+        socket.onclose = function () {
+            // Back off up to 30s between reconnects
+            setTimeout(connect, retryDelay);
+            retryDelay = Math.min(retryDelay * 2, 30000);
+        };
+    }
+
+    connect();
+})();
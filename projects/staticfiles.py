@@ -0,0 +1,32 @@
+import importlib.util
+import os
+
+from django.contrib.staticfiles.finders import BaseFinder
+from django.core.files.storage import FileSystemStorage
+
+
+class PlotlyJSFinder(BaseFinder):
+    """Serve the plotly.js bundle shipped with the plotly package as static/plotly/plotly.min.js."""
+
+    filename = 'plotly.min.js'
+    prefix = 'plotly'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        spec = importlib.util.find_spec('plotly')
+        self.storage = None
+        if spec is not None:
+            location = os.path.join(spec.submodule_search_locations[0], 'package_data')
+            self.storage = FileSystemStorage(location=location)
+            self.storage.prefix = self.prefix
+
+    def find(self, path, find_all=False, **kwargs):
+        find_all = find_all or kwargs.get('all', False)
+        if self.storage is None or path != f'{self.prefix}/{self.filename}':
+            return []
+        match = self.storage.path(self.filename)
+        return [match] if find_all else match
+
+    def list(self, ignore_patterns):
+        if self.storage is not None:
+            yield self.filename, self.storage
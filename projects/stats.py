@@ -0,0 +1,110 @@
+# Incremental maintenance of ProjectStats.
+# On save the stored (project, status, budget) of the task is read back with the row
+# locked, its contribution subtracted and the new one added with F() updates, all inside
+# the task's own transaction, so two stale copies of a task saved in turn each diff
+# against what the other wrote. Deletes use the state the task was loaded with.
+# rebuild_project_stats() recomputes rows in bulk from the tasks table with one upsert.
+from decimal import Decimal
+
+from django.db import connections, router, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Project, ProjectStats, Task
+
+
+def _task_state(task):
+    return (task.project_id, task.status, task.budget)
+
+
+def _apply(project_id, status, budget, sign):
+    """Add (sign=1) or remove (sign=-1) one task's contribution. Returns False if there is no stats row."""
+    if status not in ProjectStats.STATUS_FIELDS:
+        return True
+    count_field, budget_field = ProjectStats.STATUS_FIELDS[status]
+    return bool(ProjectStats.objects.filter(project_id=project_id).update(**{
+        count_field: F(count_field) + sign,
+        budget_field: F(budget_field) + sign * Decimal(budget or 0),
+    }))
+
+
+_STATE_FIELDS = ('project_id', 'status', 'budget')
+
+
+@receiver(post_init, sender=Task)
+def remember_task_state(sender, instance, **kwargs):
+    # Deferred fields are left alone: reading them here would query (and recurse) per row
+    loaded = instance.pk and all(field in instance.__dict__ for field in _STATE_FIELDS)
+    instance._stats_state = _task_state(instance) if loaded else None
+
+
+@receiver(pre_save, sender=Task)
+def load_task_state(sender, instance, raw=False, using=None, **kwargs):
+    # Task.save() runs this inside its atomic block; the lock holds until the stats are updated
+    if raw or instance._state.adding:
+        return
+    stored = Task.objects.using(using).select_for_update().filter(pk=instance.pk)
+    instance._stats_state = stored.values_list(*_STATE_FIELDS).first()
+
+
+@receiver(post_save, sender=Task)
+def update_stats_on_task_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    old = None if created else instance._stats_state
+    new = _task_state(instance)
+    instance._stats_state = new
+    if old == new:
+        return
+
+    if old is not None:
+        _apply(*old, sign=-1)
+    if not _apply(*new, sign=1):
+        # No stats row yet for this project: compute it from scratch (this task included)
+        rebuild_project_stats([new[0]])
+
+
+@receiver(post_delete, sender=Task)
+def update_stats_on_task_delete(sender, instance, **kwargs):
+    # A missing row is left alone: the project itself may be going away in this same delete.
+    _apply(*(instance._stats_state or _task_state(instance)), sign=-1)
+
+
+@receiver(post_save, sender=Project)
+def create_stats_for_project(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ProjectStats.objects.get_or_create(project=instance)
+
+
+def rebuild_project_stats(project_ids=None, batch_size=1000):
+    """Recompute stats rows for the given projects (all projects when None). Returns the row count."""
+    projects = Project.objects.all()
+    tasks = Task.objects.all()
+    if project_ids is not None:
+        projects = projects.filter(id__in=project_ids)
+        tasks = tasks.filter(project_id__in=project_ids)
+
+    rows = {project_id: ProjectStats(project_id=project_id) for project_id in projects.values_list('id', flat=True)}
+    grouped = tasks.values('project_id', 'status').annotate(count=Count('id'), budget=Sum('budget')).order_by()
+    for group in grouped:
+        stats = rows.get(group['project_id'])
+        if stats is None or group['status'] not in ProjectStats.STATUS_FIELDS:
+            continue
+        count_field, budget_field = ProjectStats.STATUS_FIELDS[group['status']]
+        setattr(stats, count_field, group['count'])
+        setattr(stats, budget_field, group['budget'] or 0)
+
+    update_fields = [field for pair in ProjectStats.STATUS_FIELDS.values() for field in pair]
+    using = router.db_for_write(ProjectStats)
+    # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target, and Django refuses one there
+    unique_fields = ['project'] if connections[using].features.supports_update_conflicts_with_target else None
+    with transaction.atomic(using=using):
+        ProjectStats.objects.using(using).bulk_create(
+            rows.values(),
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=update_fields,
+        )
+    return len(rows)
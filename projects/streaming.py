@@ -0,0 +1,51 @@
+# Helpers for streaming large responses without holding them in memory.
+import zipfile
+
+
+class _ChunkBuffer:
+    """Write-only file object that hands back what was written since the last pop()."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def stream_zip(named_files):
+    """Yield a ZIP archive chunk by chunk.
+
+    `named_files` yields (name, content) pairs, where content is bytes or an iterable of
+    bytes chunks; the latter is compressed and passed on as it is produced.
+    """
+    buffer = _ChunkBuffer()
+    # The buffer cannot seek, so zipfile writes data descriptors and never rewinds.
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in named_files:
+            if isinstance(content, bytes):
+                archive.writestr(name, content)
+            else:
+                with archive.open(name, 'w', force_zip64=True) as member:
+                    for chunk in content:
+                        member.write(chunk)
+                        data = buffer.pop()
+                        if data:
+                            yield data
+            yield buffer.pop()
+    yield buffer.pop()
+
+
+class Echo:
+    """File-like object for csv.writer that returns each row instead of storing it."""
+
+    def write(self, value):
+        return value
@@ -0,0 +1,34 @@
+from django import template
+
+from ..cache import cached
+
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, name, depends_on, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.depends_on = depends_on
+        self.vary_on = vary_on
+
+    def render(self, context):
+        depends_on = self.depends_on.resolve(context).split()
+        vary_on = [value.resolve(context) for value in self.vary_on]
+        return cached(self.name.resolve(context), depends_on, lambda: self.nodelist.render(context), *vary_on)
+
+
+@register.tag
+def cachedfragment(parser, token):
+    """{% cachedfragment "name" "project task" key1 key2 %}...{% endcachedfragment %}
+
+    Caches the rendered block until a save or delete moves on one of the listed generations
+    (see projects/cache.py). Anything the block renders differently for must be a key.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' takes a name, the generations it depends on and optional keys.")
+    nodelist = parser.parse(('endcachedfragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(nodelist, parser.compile_filter(bits[1]), parser.compile_filter(bits[2]), [parser.compile_filter(bit) for bit in bits[3:]])
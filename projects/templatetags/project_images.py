@@ -0,0 +1,22 @@
+from django import template
+
+from ..images import variant_urls
+
+
+register = template.Library()
+
+
+@register.inclusion_tag('project_picture.html')
+def project_picture(project, sizes='100vw', css_class='', alt=''):
+    """<picture> with WebP and JPEG srcsets when variants exist, the original upload otherwise."""
+    webp, jpeg = variant_urls(project, 'webp'), variant_urls(project, 'jpg')
+    return {
+        'project': project,
+        'webp_srcset': ', '.join(f'{url} {width}w' for url, width in webp),
+        'jpeg_srcset': ', '.join(f'{url} {width}w' for url, width in jpeg),
+        # Browsers without srcset support get the middle size rather than the original
+        'src': jpeg[len(jpeg) // 2][0] if jpeg else None,
+        'sizes': sizes,
+        'css_class': css_class,
+        'alt': alt or project.project_name,
+    }
@@ -1,3 +1,1020 @@
-from django.test import TestCase
+import datetime
+import gc
+import hashlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import zipfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connection, transaction
+from django.db.models import QuerySet
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .activity_archive import activity_history, archive_activity_logs, archive_path
+from .cache import cache_stats, cached, reset_cache_stats
+from .chart_cache import get_project_charts
+from .db_pool import ConnectionPool, PoolTimeout
+from .demo_data import clear_demo_data, generate_demo_data
+from .exports import task_rows
+from .fanout import run_concurrently
+from .images import variant_urls
+from .imports import _after_import, import_file
+from .instrumentation import BudgetExceeded, enforce_budgets
+from .jobs import JOB_STALE_AFTER, claim_next_job, run_pending_jobs
+from . import realtime, uploads, views  # views also connects the activity log receivers
+from . import search as search_module
+from .models import ActivityLog, Division, Project, ProjectStats, ReportJob, Task, TaskPlan, Village, Ward
+from .pagination import decode_cursor, keyset_page
+from .query_plans import HOT_QUERIES, explain_hot_queries, mysql_full_scans, sqlite_full_scans
+from .report_queue import request_project_report
+from .scheduling import ScheduleError, compute_schedule, dependency_errors, topological_order
+from .search import search
+from .stats import rebuild_project_stats
+from .urls import VIEW_BUDGETS
+from .workload import compute_workload, get_workload
+
+
+class ProjectFixtureMixin:
+    """A superuser, one Division/Ward/Village and a project in it, for tests to build on."""
+
+    @classmethod
+    def setUpTestData(cls):
+        # Run the on_commit work (cache generations, activity log) as if the fixture had been committed
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'pw', first_name='Ada', last_name='Admin')
+            cls.division = Division.objects.create(division_name='Division 1')
+            cls.ward = Ward.objects.create(division=cls.division, ward_name='Ward 1')
+            cls.village = Village.objects.create(ward=cls.ward, village_name='Village 1')
+            cls.plan = TaskPlan.objects.create(task_state='Plan')
+            cls.start = timezone.now().replace(microsecond=0)
+            cls.project = cls.make_project('P1')
+
+    @classmethod
+    def make_project(cls, code, **fields):
+        values = {
+            'supervisor': cls.user, 'project_name': f'Project {code}', 'project_code': code,
+            'total_cost': Decimal('100000'), 'start_date': cls.start,
+            'end_date': cls.start + datetime.timedelta(days=60), 'source_of_fund': 'Government',
+            'description': 'A project.', 'location': cls.village,
+        }
+        values.update(fields)
+        return Project.objects.create(**values)
+
+    def make_task(self, name='Task', project=None, status='To Do', budget=10, days=10, due_date=None, **fields):
+        return Task.objects.create(
+            project=project or self.project, task_name=name, description='A task.', task_state=self.plan,
+            assigned_to=self.user, due_date=due_date or (self.start + datetime.timedelta(days=days)).date(),
+            status=status, budget=Decimal(budget), **fields,
+        )
+
+
+class TempMediaMixin:
+    """MEDIA_ROOT in a temporary directory for the test class, so rendered files never land in the tree."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+
+class LazyImportTests(TestCase):
+    def test_views_do_not_import_charting_or_pdf_stack(self):
+        probe = (
+            'import os, sys; sys.path.insert(0, %r); '
+            "os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ProjectManagement.settings'); "
+            'import django; django.setup(); import projects.views, projects.urls; '
+            "print(' '.join(name for name in ('plotly', 'pandas', 'reportlab') if name in sys.modules))"
+        ) % str(settings.BASE_DIR)
+        output = subprocess.run([sys.executable, '-c', probe], check=True, capture_output=True, text=True).stdout
+        self.assertEqual(output.strip(), '')
+
+
+class ChartCacheTests(ProjectFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_charts_are_built_once_until_a_task_changes(self):
+        from . import charts
+
+        self.make_task('Survey', days=5)
+        with mock.patch.object(charts, 'build_project_charts', wraps=charts.build_project_charts) as build:
+            first = get_project_charts(self.project)
+            self.assertEqual(get_project_charts(self.project), first)
+            self.assertEqual(build.call_count, 1)
+
+            self.make_task('Build', days=20)
+            get_project_charts(self.project)
+            self.assertEqual(build.call_count, 2)
+        self.assertEqual(set(first), {'gantt', 'pie'})
+
+
+class ReportQueueTests(TempMediaMixin, ProjectFixtureMixin, TestCase):
+    def test_report_is_rendered_by_the_worker_and_reused_while_unchanged(self):
+        self.make_task('Survey')
+        job = request_project_report(self.project, self.user)
+        self.assertEqual(job.status, ReportJob.STATUS_PENDING)
+        self.assertEqual(run_pending_jobs(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.STATUS_DONE, job.error)
+        self.assertTrue(job.report_file.read().startswith(b'%PDF'))
+        self.assertEqual(request_project_report(self.project, self.user), job)
+
+        self.make_task('Build')
+        self.assertNotEqual(request_project_report(self.project, self.user), job)
+
+    def test_job_left_running_by_a_dead_worker_is_failed_and_replaced(self):
+        job = request_project_report(self.project, self.user)
+        started = timezone.now() - datetime.timedelta(seconds=JOB_STALE_AFTER + 60)
+        ReportJob.objects.filter(id=job.id).update(status=ReportJob.STATUS_RUNNING, started_at=started)
+
+        replacement = request_project_report(self.project, self.user)
+        self.assertNotEqual(replacement, job)
+        self.assertEqual(run_pending_jobs(), 1)
+        job.refresh_from_db()
+        replacement.refresh_from_db()
+        self.assertEqual(job.status, ReportJob.STATUS_FAILED)
+        self.assertEqual(replacement.status, ReportJob.STATUS_DONE)
+
+    def test_recently_claimed_job_is_reused(self):
+        job = request_project_report(self.project, self.user)
+        ReportJob.objects.filter(id=job.id).update(status=ReportJob.STATUS_RUNNING, started_at=timezone.now())
+        self.assertEqual(request_project_report(self.project, self.user), job)
+        self.assertIsNone(claim_next_job(ReportJob))
+
+
+class BulkReportTests(ProjectFixtureMixin, TestCase):
+    def test_village_download_zips_one_pdf_per_project_in_the_shared_pool(self):
+        from . import bulk_reports
+
+        self.make_project('P2')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('village_reports', args=[self.village.id]))
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(sorted(archive.namelist()), ['P1_project-p1.pdf', 'P2_project-p2.pdf'])
+        self.assertTrue(archive.read('P1_project-p1.pdf').startswith(b'%PDF'))
+
+        executor = bulk_reports.web_report_executor()
+        self.assertIs(bulk_reports.web_report_executor(), executor)
+        self.assertEqual(executor._max_workers, bulk_reports.WEB_REPORT_WORKERS)
+
+
+class ActivityLogTests(ProjectFixtureMixin, TestCase):
+    def task_entries(self):
+        return ActivityLog.objects.filter(content_type=ContentType.objects.get_for_model(Task))
+
+    def test_entries_logged_in_a_transaction_are_written_together_on_commit(self):
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    for number in range(3):
+                        self.make_task(f'Task {number}')
+                self.assertFalse(self.task_entries().exists())
+        inserts = [query for query in queries if query['sql'].startswith('INSERT INTO "projects_activitylog"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            sorted(self.task_entries().values_list('description', flat=True)),
+            ['Created task: Task 0', 'Created task: Task 1', 'Created task: Task 2'],
+        )
+
+    def test_entries_of_a_rolled_back_transaction_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.make_task('Never saved')
+                raise RuntimeError
+        self.assertFalse(self.task_entries().exists())
+
+    def test_entries_of_a_rolled_back_savepoint_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.make_task('Kept')
+                with self.assertRaises(RuntimeError), transaction.atomic():
+                    self.make_task('Rolled back')
+                    raise RuntimeError
+        self.assertEqual(list(self.task_entries().values_list('description', flat=True)), ['Created task: Kept'])
+
+    def test_a_transaction_registers_one_hook_and_writes_full_batches_early(self):
+        from . import activity
+
+        with mock.patch.object(activity, 'ACTIVITY_LOG_FLUSH_THRESHOLD', 2):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                with transaction.atomic():
+                    for number in range(3):
+                        self.make_task(f'Task {number}')
+                    self.assertEqual(self.task_entries().count(), 2)
+        hooks = [callback for callback in callbacks if getattr(callback, '__func__', None) is activity.SavepointActivityLogBatch.commit]
+        self.assertEqual(len(hooks), 1)
+        self.assertEqual(self.task_entries().count(), 3)
+
+
+class ActivityArchiveTests(TempMediaMixin, ProjectFixtureMixin, TestCase):
+    def test_old_entries_move_to_the_archive_and_history_reads_both(self):
+        task_type = ContentType.objects.get_for_model(Task)
+        old = ActivityLog.objects.create(action='Created', description='old', content_type=task_type, object_id=7)
+        ActivityLog.objects.filter(id=old.id).update(timestamp=timezone.now() - datetime.timedelta(days=200))
+        ActivityLog.objects.create(action='Updated', description='new', content_type=task_type, object_id=7)
+
+        self.assertEqual(archive_activity_logs(days=90), 1)
+        self.assertFalse(ActivityLog.objects.filter(id=old.id).exists())
+        history = activity_history(content_type='projects.task', object_id=7)
+        self.assertEqual([record['description'] for record in history], ['new', 'old'])
+        self.assertEqual(archive_activity_logs(days=90), 0)
+
+    @override_settings(TIME_ZONE='Asia/Kathmandu')
+    def test_archive_days_follow_the_current_time_zone(self):
+        task_type = ContentType.objects.get_for_model(Task)
+        late = ActivityLog.objects.create(action='Created', description='late', content_type=task_type, object_id=8)
+        # 01:45 on the 11th in Kathmandu
+        ActivityLog.objects.filter(id=late.id).update(timestamp=datetime.datetime(2025, 3, 10, 20, 0, tzinfo=datetime.timezone.utc))
+
+        self.assertEqual(archive_activity_logs(days=90), 1)
+        self.assertTrue(os.path.exists(archive_path(datetime.date(2025, 3, 11))))
+        since = timezone.make_aware(datetime.datetime(2025, 3, 11))
+        history = activity_history(since=since, until=since + datetime.timedelta(days=1))
+        self.assertEqual([record['description'] for record in history], ['late'])
+
+
+class IndexViewTests(TestCase):
+    def test_index_renders_without_queries(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('divisions', response.context)
+
+
+class ProjectStatsTests(ProjectFixtureMixin, TestCase):
+    def stats(self):
+        return ProjectStats.objects.values(
+            'todo_count', 'in_progress_count', 'done_count', 'todo_budget', 'in_progress_budget', 'done_budget',
+        ).get(project=self.project)
+
+    def assertStatsRebuilt(self):
+        counted = self.stats()
+        rebuild_project_stats([self.project.id])
+        self.assertEqual(counted, self.stats())
+
+    def test_saves_and_deletes_move_counts_and_budgets(self):
+        survey = self.make_task('Survey', budget=10)
+        build = self.make_task('Build', budget=25)
+        survey.status = 'Done'
+        survey.save()
+        build.delete()
+        self.assertEqual(self.stats(), {
+            'todo_count': 0, 'in_progress_count': 0, 'done_count': 1,
+            'todo_budget': Decimal('0'), 'in_progress_budget': Decimal('0'), 'done_budget': Decimal('10'),
+        })
+        self.assertStatsRebuilt()
+
+    def test_two_stale_copies_of_a_task_saved_in_turn(self):
+        task = self.make_task('Survey', budget=10)
+        first, second = Task.objects.get(pk=task.pk), Task.objects.get(pk=task.pk)
+        first.status = 'Done'
+        first.save()
+        second.status = 'In Progress'
+        second.budget = Decimal('40')
+        second.save()
+        stats = self.stats()
+        self.assertEqual((stats['todo_count'], stats['in_progress_count'], stats['done_count']), (0, 1, 0))
+        self.assertEqual(stats['in_progress_budget'], Decimal('40'))
+        self.assertStatsRebuilt()
+
+    def test_rebuild_upserts_without_a_conflict_target_where_the_backend_takes_none(self):
+        # MySQL: ON DUPLICATE KEY UPDATE, for which Django refuses unique_fields
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False), \
+                mock.patch.object(QuerySet, 'bulk_create', autospec=True) as bulk_create:
+            rebuild_project_stats([self.project.id])
+        options = bulk_create.call_args.kwargs
+        self.assertTrue(options['update_conflicts'])
+        self.assertIsNone(options['unique_fields'])
+        self.assertEqual([stats.project_id for stats in bulk_create.call_args.args[1]], [self.project.id])
+
+
+class LocationRollupTests(ProjectFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_rollup_folds_villages_up_to_the_district(self):
+        other = Village.objects.create(ward=self.ward, village_name='Village 2')
+        self.make_project('P2', location=other, total_cost=Decimal('50000'), evaluation_percentage=Decimal('40'))
+        self.make_task('Survey', budget=30)
+        self.make_task('Build', status='Done', budget=70)
+
+        response = self.client.get(reverse('location_rollup'), {'ward': self.ward.id})
+        ward = response.json()
+        self.assertEqual(ward['project_count'], 2)
+        self.assertEqual(Decimal(ward['total_cost']), Decimal('150000'))
+        self.assertEqual(Decimal(ward['allocated_budget']), Decimal('100'))
+        self.assertEqual((ward['todo_tasks'], ward['done_tasks']), (1, 1))
+        self.assertEqual(Decimal(ward['average_evaluation']), Decimal('20'))
+        self.assertEqual([village['project_count'] for village in ward['villages']], [1, 1])
+
+        district = self.client.get(reverse('location_rollup')).json()
+        self.assertEqual(district['project_count'], 2)
+        self.assertEqual(self.client.get(reverse('location_rollup'), {'ward': 0}).status_code, 404)
+
+    def test_rollup_is_served_from_the_cache(self):
+        self.client.get(reverse('location_rollup'))
+        with self.assertNumQueries(2):  # session and user only
+            self.client.get(reverse('location_rollup'))
+
+
+class KeysetPaginationTests(ProjectFixtureMixin, TestCase):
+    def test_pages_cover_every_project_once_across_equal_start_dates(self):
+        for number in range(2, 8):
+            self.make_project(f'P{number}', start_date=self.start + datetime.timedelta(days=number // 3))
+        seen, cursor = [], None
+        while True:
+            page = keyset_page(Project.objects.all(), cursor, page_size=3)
+            seen.extend(project.id for project in page)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        expected = list(Project.objects.order_by('start_date', 'id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(expected), 7)
+
+    def test_malformed_cursor_is_rejected(self):
+        with self.assertRaises(ValueError):
+            decode_cursor('not a cursor')
+        cache.clear()
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('project'), {'cursor': 'bogus'}).status_code, 400)
+
+    def test_listing_links_to_the_next_page(self):
+        cache.clear()
+        for number in range(2, views.PROJECTS_PER_PAGE + 2):
+            self.make_project(f'P{number}')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('project'), {'village': self.village.id})
+        self.assertEqual(len(response.context['projects']), views.PROJECTS_PER_PAGE)
+        second = self.client.get(reverse('project') + response.context['next_url'])
+        self.assertEqual(len(second.context['projects']), 1)
+        self.assertIsNone(second.context['next_url'])
+
+
+class SearchTests(ProjectFixtureMixin, TestCase):
+    def test_ranked_matches_follow_saves_and_deletes(self):
+        borehole = self.make_project('P2', project_name='Borehole drilling', description='Water for the clinic.')
+        task = self.make_task('Drill the borehole', project=borehole)
+        self.assertEqual(set(search('borehole')), {('project', borehole.id), ('task', task.id)})
+        self.assertEqual(search('boreh', kinds=['task']), [('task', task.id)])  # last word matches as a prefix
+        self.assertEqual(search('borehole clinic'), [('project', borehole.id)])
+
+        task.delete()
+        self.assertEqual(search('borehole'), [('project', borehole.id)])
+        self.assertEqual(search('  '), [])
+
+    def test_search_page_lists_each_kind(self):
+        self.make_task('Fence the school')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('search'), {'q': 'fence'})
+        self.assertEqual([task.task_name for task in response.context['tasks']], ['Fence the school'])
+        self.assertEqual(response.context['projects'], [])
+
+    def test_admin_search_keeps_rank_order_and_says_when_it_is_capped(self):
+        from . import admin as project_admin
+
+        named = self.make_project('P2', project_name='Borehole drilling')
+        mentioned = self.make_project('P3', project_name='School fence', description='Near the old borehole.')
+        self.client.force_login(self.user)
+        path = reverse('admin:projects_project_changelist')
+        response = self.client.get(path, {'q': 'borehole'})
+        self.assertEqual(list(response.context['cl'].result_list), [named, mentioned])
+        self.assertEqual(list(response.context['messages']), [])
+
+        response = self.client.get(path, {'q': 'borehole', 'o': '1'})  # sorted by project name instead
+        self.assertEqual(list(response.context['cl'].result_list), [named, mentioned])
+        response = self.client.get(path, {'q': 'borehole', 'o': '-1'})
+        self.assertEqual(list(response.context['cl'].result_list), [mentioned, named])
+
+        with mock.patch.object(project_admin, 'SEARCH_RESULTS_LIMIT', 1):
+            response = self.client.get(path, {'q': 'borehole'})
+        self.assertEqual(list(response.context['cl'].result_list), [named])
+        self.assertIn('best 1 matches', str(list(response.context['messages'])[0]))
+
+
+class ExportTests(ProjectFixtureMixin, TestCase):
+    def test_task_rows_are_read_in_chunks_with_names_resolved(self):
+        for number in range(3):
+            self.make_task(f'Task {number}', budget=number)
+        with self.assertNumQueries(1 + 3 * 3 + 1):  # task states, then tasks, users and projects per chunk, then the empty read
+            rows = list(task_rows(chunk_size=1))
+        self.assertEqual([row[3] for row in rows], ['Task 0', 'Task 1', 'Task 2'])
+        self.assertEqual(rows[0][1:3], ['P1', 'Project P1'])
+        self.assertEqual(rows[0][4:6], ['Plan', 'Ada Admin'])
+
+    def test_project_export_downloads_as_csv_and_xlsx(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('export_data', args=['projects']))
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['ID', 'Project Code', 'Project Name'])
+        self.assertIn('Division 1,Ward 1,Village 1,100000.00', lines[1])
+
+        response = self.client.get(reverse('export_data', args=['projects']), {'format': 'xlsx'})
+        workbook = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertIn(b'Project P1', workbook.read('xl/worksheets/sheet1.xml'))
+        self.assertEqual(self.client.get(reverse('export_data', args=['reports'])).status_code, 404)
+
+
+class ImportTests(ProjectFixtureMixin, TestCase):
+    HEADER = 'project_code,project_name,supervisor,division,ward,village,total_cost,start_date,end_date,source_of_fund\n'
+
+    def import_projects(self, *rows):
+        lines = [f'{code},Imported {code},admin,Division 1,Ward 1,Village 1,{cost},2026-01-01,2026-06-01,{fund}\n'
+                 for code, cost, fund in rows]
+        return import_file('projects', io.BytesIO((self.HEADER + ''.join(lines)).encode()))
+
+    def test_invalid_rows_are_reported_and_the_rest_imported(self):
+        result = self.import_projects(
+            ('N1', '5000', 'Government'),
+            ('N2', 'NaN', 'Government'),
+            ('N3', 'Infinity', 'Government'),
+            ('N4', '12345678901234567', 'Government'),
+            ('N5', '10.125', 'Government'),
+            ('N6', '5000', 'x' * 300),
+            ('P1', '5000', 'Government'),
+        )
+        self.assertEqual(result.created, 1)
+        self.assertEqual([row_number for row_number, _ in result.errors], [3, 4, 5, 6, 7, 8])
+        self.assertIn('total_cost is not a number', result.errors[0][1])
+        self.assertIn('total_cost:', result.errors[2][1])
+        self.assertIn('source_of_fund:', result.errors[4][1])
+        self.assertIn('already exists', result.errors[5][1])
+        self.assertEqual(list(Project.objects.filter(project_code__startswith='N').values_list('project_code', flat=True)), ['N1'])
+
+    def test_admin_upload_reports_row_errors(self):
+        self.client.force_login(self.user)
+        upload = io.BytesIO((self.HEADER + 'N1,Imported,admin,Division 1,Ward 1,Village 1,NaN,2026-01-01,2026-06-01,Gov\n').encode())
+        upload.name = 'projects.csv'
+        response = self.client.post(reverse('admin:projects_project_import'), {'kind': 'projects', 'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result'].errors, [(2, "total_cost is not a number: 'NaN'.")])
+
+    def test_unreadable_files_are_reported_not_raised(self):
+        # Each passes the upload type check, which only sniffs the leading bytes
+        no_sheet = io.BytesIO()
+        with zipfile.ZipFile(no_sheet, 'w') as archive:
+            archive.writestr('readme.txt', 'Not a workbook.')
+        valid_row = 'N1,Imported,admin,Division 1,Ward 1,Village 1,5000,2026-01-01,2026-06-01,Gov\n'
+        self.client.force_login(self.user)
+        for name, content, message in (
+            ('projects.xlsx', b'PK\x03\x04' + b'\x00' * 100, 'not a readable XLSX workbook'),
+            ('projects.xlsx', no_sheet.getvalue(), 'not a readable XLSX workbook'),
+            ('projects.csv', (self.HEADER + valid_row * 10).encode() + b'N2,Caf\xe9,admin\n', 'not UTF-8 encoded'),
+        ):
+            with self.subTest(file=name):
+                upload = SimpleUploadedFile(name, content)
+                response = self.client.post(reverse('admin:projects_project_import'), {'kind': 'projects', 'file': upload})
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(message, response.context['result'].file_error)
+                self.assertContains(response, message)
+
+    def test_derived_data_is_updated_chunk_by_chunk(self):
+        lines = ''.join(f'N{n},Imported,admin,Division 1,Ward 1,Village 1,5000,2026-01-01,2026-06-01,Gov\n' for n in range(5))
+        with mock.patch('projects.imports._after_import', wraps=_after_import) as after_import:
+            result = import_file('projects', io.BytesIO((self.HEADER + lines).encode()), chunk_size=2)
+        self.assertEqual(result.created, 5)
+        # Each call gets only the objects of its own chunk
+        self.assertEqual([len(call.args[1]) for call in after_import.call_args_list], [2, 2, 1])
+        self.assertEqual(ProjectStats.objects.filter(project__project_code__startswith='N').count(), 5)
+
+
+class ViewBudgetTests(TempMediaMixin, ProjectFixtureMixin, TestCase):
+    def budget_requests(self):
+        """URL name -> [(method, path, data)] covering every VIEW_BUDGETS entry."""
+        project = self.project
+        task = self.make_task('Survey')
+        report = request_project_report(project, self.user)
+        run_pending_jobs()
+        due_date = (timezone.localdate() + datetime.timedelta(days=5)).isoformat()
+        return {
+            'index': [('get', reverse('index'), None)],
+            'project': [('get', reverse('project'), None)],
+            'projects_at_risk': [('get', reverse('projects_at_risk'), None)],
+            'workload': [('get', reverse('workload'), None)],
+            'workload_json': [('get', reverse('workload_json'), None)],
+            'cache_stats': [('get', reverse('cache_stats'), None)],
+            'db_pool_stats': [('get', reverse('db_pool_stats'), None)],
+            'division_detail': [('get', reverse('division_detail', args=[self.division.id]), None)],
+            'ward_detail': [('get', reverse('ward_detail', args=[self.ward.id]), None)],
+            'village_detail': [('get', reverse('village_detail', args=[self.village.id]), None)],
+            'location_rollup': [('get', reverse('location_rollup'), None)],
+            'project_detail': [('get', reverse('project_detail', args=[project.id]), None)],
+            'project_comment': [
+                ('get', reverse('project_comment', args=[project.id]), None),
+                ('post', reverse('project_comment', args=[project.id]), {'content': 'Looks good.'}),
+            ],
+            'search': [('get', reverse('search'), {'q': 'survey'})],
+            'image_variant': [('get', reverse('image_variant', args=['missing.webp']), None)],
+            'export_data': [('get', reverse('export_data', args=['tasks']), None)],
+            'create_project': [
+                ('get', reverse('create_project'), None),
+                ('post', reverse('create_project'), {
+                    'project_name': 'Clinic', 'project_code': 'P9', 'total_cost': '5000',
+                    'start_date': '2026-01-01T08:00', 'end_date': '2026-06-01T08:00', 'source_of_fund': 'Government',
+                    'description': 'A clinic.', 'evaluation_percentage': '0', 'location': self.village.id,
+                }),
+            ],
+            'create_task': [
+                ('get', reverse('create_task', args=[project.id]), None),
+                ('post', reverse('create_task', args=[project.id]), {
+                    'task_name': 'Build', 'description': 'Walls.', 'task_state': self.plan.id,
+                    'assigned_to': self.user.id, 'budget': '20', 'due_date': due_date, 'status': 'To Do',
+                    'depends_on': [task.id],
+                }),
+            ],
+            'project_report': [('get', reverse('project_report', args=[project.id]), None)],
+            'report_status': [('get', reverse('report_status', args=[report.id]), None)],
+            'report_download': [('get', reverse('report_download', args=[report.id]), None)],
+            **{
+                f'admin:projects_{kind}_changelist': [
+                    ('get', reverse(f'admin:projects_{kind}_changelist'), None),
+                    ('get', reverse(f'admin:projects_{kind}_changelist'), {'q': term}),
+                ]
+                # The comment is the one posted to project_comment above
+                for kind, term in (('project', 'project'), ('task', 'survey'), ('comment', 'good'))
+            },
+        }
+
+    def test_every_budgeted_view_stays_within_budget_from_a_cold_cache(self):
+        self.client.force_login(self.user)
+        requests = self.budget_requests()
+        self.assertEqual(set(requests), set(VIEW_BUDGETS))
+        for name, calls in requests.items():
+            for method, path, data in calls:
+                with self.subTest(view=name, method=method):
+                    cache.clear()
+                    with enforce_budgets(latency=False):
+                        response = getattr(self.client, method)(path, data)
+                    self.assertEqual(response.wsgi_request.metrics.view_name, name)
+
+    def test_tests_enforce_query_counts_but_only_log_latency(self):
+        slow = {'index': VIEW_BUDGETS['index']._replace(total_ms=0)}
+        with mock.patch.dict(VIEW_BUDGETS, slow), self.assertLogs('projects.performance', 'WARNING') as logs:
+            with enforce_budgets(latency=False):
+                self.client.get(reverse('index'))
+            with self.assertRaises(BudgetExceeded), enforce_budgets():
+                self.client.get(reverse('index'))
+        self.assertIn("View 'index' over budget", logs.output[0])
+
+
+class ColdWriteBudgetTests(TransactionTestCase):
+    """Write budgets measured with the on_commit work running inside the request, as in production."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        village = Village.objects.create(
+            ward=Ward.objects.create(division=Division.objects.create(division_name='Division 1'), ward_name='Ward 1'),
+            village_name='Village 1',
+        )
+        start = timezone.now()
+        self.project = Project.objects.create(
+            supervisor=self.user, project_name='Project P1', project_code='P1', total_cost=Decimal('100000'),
+            start_date=start, end_date=start + datetime.timedelta(days=60), source_of_fund='Government',
+            description='A project.', location=village,
+        )
+
+    def test_comment_post_in_a_cold_process_with_live_updates_stays_within_budget(self):
+        self.client.force_login(self.user)
+        ContentType.objects.clear_cache()
+        path = reverse('project_comment', args=[self.project.id])
+        with mock.patch.object(realtime, 'REALTIME_UPDATES', True), \
+                mock.patch.object(search_module, '_fts_available', None), enforce_budgets(latency=False):
+            response = self.client.post(path, {'content': 'Looks good.'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.wsgi_request.metrics.view_name, 'project_comment')
+
+
+class DemoDataTests(TestCase):
+    def test_small_district_is_generated_with_derived_data_and_cleared(self):
+        counts = generate_demo_data(divisions=1, wards=2, villages=2, projects=4, tasks=3, comments=1, activity=10, users=3, days=5)
+        self.assertEqual(
+            {name: counts[name] for name in ('divisions', 'wards', 'villages', 'projects', 'tasks', 'comments')},
+            {'divisions': 1, 'wards': 2, 'villages': 4, 'projects': 4, 'tasks': 12, 'comments': 4},
+        )
+        self.assertEqual(ActivityLog.objects.count(), 10)
+        task_count = sum(
+            stats.todo_count + stats.in_progress_count + stats.done_count for stats in ProjectStats.objects.all()
+        )
+        self.assertEqual(task_count, 12)
+
+        ActivityLog.objects.create(action='Created', description='not demo', content_type=ContentType.objects.get_for_model(User), object_id=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            clear_demo_data()
+        self.assertFalse(Project.objects.exists())
+        self.assertFalse(Division.objects.exists())
+        self.assertFalse(User.objects.exists())
+        self.assertEqual(list(ActivityLog.objects.values_list('description', flat=True)), ['not demo'])
+
+
+def png_bytes(width=800, height=400):
+    from PIL import Image
+
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), (30, 120, 200)).save(output, 'PNG')
+    return output.getvalue()
+
+
+class ImageVariantTests(TempMediaMixin, ProjectFixtureMixin, TestCase):
+    def test_worker_writes_variants_served_with_an_immutable_header(self):
+        self.project.project_pictures.save('site.png', ContentFile(png_bytes()))
+        self.assertEqual(run_pending_jobs(), 1)
+
+        self.project.refresh_from_db()
+        self.assertEqual(self.project.picture_variants['widths'], [320, 640, 800])
+        urls = variant_urls(self.project, 'webp')
+        self.assertEqual([width for _, width in urls], [320, 640, 800])
+        with self.assertNumQueries(0):
+            response = self.client.get(urls[0][0])
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'RIFF'))
+
+    def test_paths_outside_the_variant_root_are_not_served(self):
+        for path in ['../../db.sqlite3', '1/missing-320.webp', '1/notes.txt']:
+            self.assertEqual(self.client.get(reverse('image_variant', args=[path])).status_code, 404)
+
+
+class UploadTests(TempMediaMixin, ProjectFixtureMixin, TestCase):
+    def post_project(self, code, picture):
+        self.client.force_login(self.user)
+        return self.client.post(reverse('create_project'), {
+            'project_name': 'Clinic', 'project_code': code, 'total_cost': '5000',
+            'start_date': '2026-01-01T08:00', 'end_date': '2026-06-01T08:00', 'source_of_fund': 'Government',
+            'description': 'A clinic.', 'evaluation_percentage': '0', 'location': self.village.id,
+            'project_pictures': picture,
+        })
+
+    def test_file_that_is_not_an_image_is_rejected(self):
+        picture = SimpleUploadedFile('site.png', b'#!/bin/sh\necho not a picture\n', content_type='image/png')
+        response = self.post_project('P9', picture)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('site.png is not an allowed file type.', response.context['form'].errors['project_pictures'])
+        self.assertFalse(Project.objects.filter(project_code='P9').exists())
+
+    def test_oversized_image_is_rejected(self):
+        limits = {'project_pictures': (1024, uploads.IMAGE_TYPES)}
+        with mock.patch.dict(uploads.UPLOAD_LIMITS, limits):
+            response = self.post_project('P9', SimpleUploadedFile('site.png', png_bytes(), content_type='image/png'))
+        self.assertIn('site.png is larger than 0 MB.', response.context['form'].errors['project_pictures'])
+        self.assertFalse(Project.objects.filter(project_code='P9').exists())
+
+    def test_identical_pictures_are_stored_once(self):
+        content = png_bytes()
+        self.post_project('P8', SimpleUploadedFile('a.png', content, content_type='image/png'))
+        self.post_project('P9', SimpleUploadedFile('b.png', content, content_type='image/png'))
+        first, second = (Project.objects.get(project_code=code).project_pictures.name for code in ('P8', 'P9'))
+        self.assertEqual(first, second)
+        self.assertTrue(first.endswith(f'{hashlib.sha256(content).hexdigest()}.png'))
+
+
+class RealtimeTests(ProjectFixtureMixin, TestCase):
+    def save_two_tasks(self, live):
+        layer = mock.Mock(group_send=mock.AsyncMock())
+        with mock.patch.object(realtime, 'REALTIME_UPDATES', live), mock.patch.object(realtime, 'get_channel_layer', return_value=layer):
+            with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    self.make_task('Survey', budget=10)
+                    self.make_task('Build', budget=20)
+        return layer.group_send, len(queries)
+
+    def test_one_message_per_project_and_transaction(self):
+        group_send, _ = self.save_two_tasks(live=True)
+        group_send.assert_called_once()
+        group, message = group_send.call_args.args
+        self.assertEqual(group, realtime.project_group(self.project.id))
+        self.assertEqual([delta['name'] for delta in message['data']['deltas']], ['Survey', 'Build'])
+        self.assertEqual(message['data']['deltas'][0]['user_full_name'], 'Ada Admin')
+        self.assertEqual(message['data']['stats']['todo'], 2)
+
+    def test_nothing_is_queried_or_sent_without_live_updates(self):
+        self.save_two_tasks(live=False)  # warms the per-process caches
+        group_send, queries = self.save_two_tasks(live=False)
+        group_send.assert_not_called()
+        _, live_queries = self.save_two_tasks(live=True)
+        self.assertEqual(queries, live_queries - 2)  # no user or stats lookup for the message
+
+
+class ProjectDetailTests(ProjectFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_page_renders_the_project_tasks_and_charts(self):
+        self.make_task('Survey')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('project_detail', args=[self.project.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['project'], self.project)
+        self.assertEqual([task.task_name for task in response.context['tasks']], ['Survey'])
+        self.assertTrue(response.context['gantt_chart'])
+        self.assertEqual(self.client.get(reverse('project_detail', args=[0])).status_code, 404)
+
+    def test_anonymous_visitors_are_sent_to_the_login_page(self):
+        response = self.client.get(reverse('project_detail', args=[self.project.id]))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith(reverse('login')))
+
+    def test_fan_out_inside_a_transaction_runs_in_order_on_the_callers_connection(self):
+        def connection_id():
+            return id(connection.connection)
+
+        results = async_to_sync(run_concurrently)(connection_id, lambda: Project.objects.count(), connection_id)
+        self.assertEqual(results, [id(connection.connection), 1, id(connection.connection)])
+
+
+class ConditionalGetTests(ProjectFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def revalidate(self, name):
+        path = reverse(name, args=[self.project.id])
+        etag = self.client.get(path)['ETag']
+        return etag, self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+
+    def rename_supervisor(self):
+        supervisor = User.objects.get(pk=self.project.supervisor_id)
+        supervisor.first_name = 'Grace'
+        supervisor.save()
+
+    def test_unchanged_pages_answer_not_modified(self):
+        for name in ('project_detail', 'project_comment'):
+            with self.subTest(view=name):
+                etag, response = self.revalidate(name)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+    def test_changes_to_what_the_pages_show_change_the_etag(self):
+        changes = {
+            'task': lambda: self.make_task('Survey'),
+            'comment': lambda: self.project.projects_comments.create(user=self.user, content='Looks good.'),
+            'supervisor': self.rename_supervisor,
+        }
+        for name in ('project_detail', 'project_comment'):
+            for change, apply in changes.items():
+                with self.subTest(view=name, change=change):
+                    etag, _ = self.revalidate(name)
+                    with self.captureOnCommitCallbacks(execute=True):
+                        apply()
+                    response = self.client.get(reverse(name, args=[self.project.id]), HTTP_IF_NONE_MATCH=etag)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertNotEqual(response['ETag'], etag)
+
+    def test_logging_in_keeps_the_etag(self):
+        etag, _ = self.revalidate('project_detail')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.force_login(self.user)
+        response = self.client.get(reverse('project_detail', args=[self.project.id]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class SchedulingTests(ProjectFixtureMixin, TestCase):
+    def test_critical_path_follows_the_longest_dependency_chain(self):
+        start = datetime.date(2026, 1, 1)
+        tasks = [
+            (1, 'Survey', None, datetime.date(2026, 1, 5), 'Done'),
+            (2, 'Foundation', datetime.date(2026, 1, 5), datetime.date(2026, 1, 15), 'To Do'),
+            (3, 'Fence', None, datetime.date(2026, 1, 3), 'To Do'),
+            (4, 'Walls', datetime.date(2026, 1, 15), datetime.date(2026, 1, 25), 'To Do'),
+        ]
+        schedule = compute_schedule(7, start, datetime.date(2026, 1, 20), tasks, [(2, 1), (4, 2), (4, 3)])
+        self.assertEqual(schedule.critical_path, [1, 2, 4])
+        self.assertEqual(schedule.finish, datetime.date(2026, 1, 25))
+        self.assertEqual(schedule.late_days, 5)
+        self.assertEqual(schedule.tasks[3].slack, 12)
+        self.assertFalse(schedule.tasks[3].critical)
+        self.assertEqual([task.id for task in schedule.overdue_critical_tasks(datetime.date(2026, 1, 16))], [2])
+
+    def test_cycles_are_rejected(self):
+        with self.assertRaises(ScheduleError) as raised:
+            topological_order([1, 2, 3], [(2, 1), (3, 2), (2, 3)])
+        self.assertEqual(raised.exception.cycle, [2, 3])
+
+        survey, build = self.make_task('Survey'), self.make_task('Build')
+        build.depends_on.add(survey)
+        with self.assertRaises(ValidationError), transaction.atomic():
+            survey.depends_on.add(build)
+        with self.assertRaises(ValidationError), transaction.atomic():
+            survey.depends_on.add(survey)
+        self.assertFalse(survey.depends_on.exists())
+        other = self.make_task('Elsewhere', project=self.make_project('P2'))
+        self.assertEqual(dependency_errors(build.id, self.project.id, [other]), ['Elsewhere belongs to another project.'])
+
+    def test_late_project_is_listed_at_risk(self):
+        cache.clear()
+        self.make_task('Survey', days=90)  # due after the project's 60 day end date
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('projects_at_risk'))
+        self.assertEqual([entry['name'] for entry in response.context['projects']], ['Project P1'])
+        self.assertEqual(response.context['projects'][0]['schedule'].late_days, 30)
+
+
+class WorkloadTests(ProjectFixtureMixin, TestCase):
+    def test_open_budget_and_overdue_load_per_week(self):
+        monday = datetime.date(2026, 3, 2)
+        self.make_task('Survey', budget=10, start_date=monday, due_date=datetime.date(2026, 3, 15))
+        self.make_task('Fence', budget=5, due_date=datetime.date(2026, 3, 10))
+        self.make_task('Late', budget=1, due_date=datetime.date(2026, 2, 20))
+        self.make_task('Finished', status='Done', due_date=datetime.date(2026, 3, 3))
+
+        data = compute_workload(monday, 4, today=monday)
+        self.assertEqual(data['weeks'], ['2026-03-02', '2026-03-09', '2026-03-16', '2026-03-23'])
+        self.assertEqual(data['users'], [{'id': self.user.id, 'username': 'admin', 'name': 'Ada Admin'}])
+        self.assertEqual(data['open'], [[1, 2, 0, 0]])
+        self.assertEqual(data['budget'], [[10.0, 15.0, 0.0, 0.0]])
+        self.assertEqual(data['overdue'], [[1, 0, 0, 0]])
+        self.assertEqual(data['totals'], [{'open': 3, 'overdue': 1, 'budget': 16.0}])
+
+    def test_workload_is_cached_until_a_task_changes(self):
+        cache.clear()
+        self.make_task('Survey')
+        first = get_workload(weeks=4)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_workload(weeks=4), first)
+        self.make_task('Build')
+        self.assertEqual(get_workload(weeks=4)['totals'][0]['open'], 2)
+
+
+class GenerationCacheTests(ProjectFixtureMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+        self.computed = 0
+
+    def cached_value(self):
+        def compute():
+            self.computed += 1
+            return self.computed
+        return cached('test_entry', ('task',), compute)
+
+    def test_entry_is_recomputed_once_a_task_write_commits(self):
+        self.assertEqual((self.cached_value(), self.cached_value()), (1, 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.make_task('Survey')
+                self.make_task('Build')
+                self.assertEqual(self.cached_value(), 1)  # not before the commit
+        self.assertEqual(self.cached_value(), 2)
+        self.assertEqual(cache_stats()['entries']['test_entry']['misses'], 2)
+
+    def test_rolled_back_write_keeps_the_entry(self):
+        self.cached_value()
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self.make_task('Survey')
+                raise RuntimeError
+        self.assertEqual(self.cached_value(), 1)
+
+    def test_location_rollup_follows_task_changes(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('location_rollup'))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_task('Survey', budget=30)
+        district = self.client.get(reverse('location_rollup')).json()
+        self.assertEqual(Decimal(district['allocated_budget']), Decimal('30'))
+
+
+class QueryPlanTests(ProjectFixtureMixin, TestCase):
+    def test_hot_queries_use_an_index_unless_a_scan_is_expected(self):
+        self.make_task('Survey')
+        plans = explain_hot_queries()
+        self.assertEqual([plan.name for plan in plans], [query.name for query in HOT_QUERIES])
+        for plan in plans:
+            with self.subTest(query=plan.name):
+                self.assertFalse(plan.flagged, plan.plan)
+                self.assertEqual(bool(plan.full_scans), plan.expect_scan, plan.plan)
+
+    def test_command_fails_only_on_flagged_scans(self):
+        out = io.StringIO()
+        call_command('explain_hot_queries', '--fail-on-scan', stdout=out)
+        self.assertIn(f'{len(HOT_QUERIES)} queries explained, 0 flagged.', out.getvalue())
+
+        with mock.patch('projects.query_plans.HOT_QUERIES', [query._replace(expect_scan=False) for query in HOT_QUERIES]):
+            with self.assertRaisesMessage(CommandError, 'Full table scans in: workload_tasks'):
+                call_command('explain_hot_queries', '--fail-on-scan', '--only', 'workload_tasks', stdout=io.StringIO())
+
+    def test_full_scans_are_read_from_sqlite_and_mysql_plans(self):
+        plan = (
+            '2 0 0 SCAN projects_task\n'
+            '5 0 0 SCAN projects_project USING INDEX projects_pr_start_d_b128aa_idx\n'
+            '9 0 0 SEARCH projects_comment USING INDEX projects_co_project_9e5987_idx (project_id=?)\n'
+            '12 0 0 SCAN TABLE projects_village\n'
+            '14 0 0 SCAN CONSTANT ROW'
+        )
+        self.assertEqual(sqlite_full_scans(plan), ['projects_task', 'projects_village'])
+        mysql_plan = json.dumps({'query_block': {'nested_loop': [
+            {'table': {'table_name': 'projects_task', 'access_type': 'ALL'}},
+            {'table': {'table_name': 'projects_project', 'access_type': 'eq_ref'}},
+        ]}})
+        self.assertEqual(mysql_full_scans(mysql_plan), ['projects_task'])
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def make_pool(self, **options):
+        return ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False), name='test', **options)
+
+    def assertClosed(self, conn):
+        with self.assertRaises(sqlite3.ProgrammingError):
+            conn.execute('SELECT 1')
+
+    def test_returned_connections_are_reused(self):
+        pool = self.make_pool(max_size=2)
+        conn, reused = pool.checkout()
+        self.assertFalse(reused)
+        pool.putconn(conn)
+        self.assertEqual(pool.checkout(), (conn, True))
+        stats = pool.stats()
+        self.assertEqual((stats['size'], stats['idle'], stats['in_use']), (1, 0, 1))
+        self.assertEqual((stats['checkouts'], stats['connects']), (2, 1))
+
+    def test_checkout_times_out_when_every_connection_is_in_use(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        pool.getconn()
+        with self.assertRaises(PoolTimeout):
+            pool.getconn()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+
+    def test_waiting_checkout_gets_the_connection_given_back(self):
+        pool = self.make_pool(max_size=1, timeout=5)
+        conn = pool.getconn()
+        timer = threading.Timer(0.05, pool.putconn, [conn])
+        timer.start()
+        self.assertEqual(pool.checkout(), (conn, True))
+        timer.join()
+        self.assertEqual(pool.stats()['waits'], 1)
+
+    def test_discarded_expired_and_broken_connections_are_closed_and_replaced(self):
+        pool = self.make_pool(max_size=1)
+        conn = pool.getconn()
+        pool.putconn(conn, discard=True)
+        self.assertClosed(conn)
+
+        pool.max_lifetime = 0
+        conn = pool.getconn()
+        pool.putconn(conn)
+        self.assertClosed(conn)
+
+        pool.max_lifetime = None
+        pool.check = lambda conn: conn.execute('SELECT missing')
+        conn = pool.getconn(check=False)
+        pool.putconn(conn)
+        self.assertIsNot(pool.getconn(), conn)
+        self.assertClosed(conn)
+        stats = pool.stats()
+        self.assertEqual((stats['discarded'], stats['expired'], stats['reconnects'], stats['size']), (1, 1, 1, 1))
+
+    def test_connection_of_a_lost_owner_is_closed_and_its_slot_freed(self):
+        class Owner:
+            pass
+
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        owner = Owner()
+        conn = pool.getconn(owner)
+        del owner
+        gc.collect()
+        self.assertClosed(conn)
+        self.assertEqual(pool.checkout(), (mock.ANY, False))
+        self.assertEqual(pool.stats()['lost'], 1)
+
+    def test_closed_pool_closes_idle_connections_and_refuses_checkouts(self):
+        pool = self.make_pool()
+        idle, in_use = pool.getconn(), pool.getconn()
+        pool.putconn(idle)
+        pool.close()
+        self.assertClosed(idle)
+        pool.putconn(in_use)
+        self.assertClosed(in_use)
+        with self.assertRaises(OperationalError):
+            pool.getconn()
+        self.assertEqual(pool.stats()['size'], 0)
@@ -0,0 +1,175 @@
+# Upload handling that rejects bad files while they stream in.
+# LimitedUploadHandler replaces Django's default handlers. It checks each file against the
+# size and type limits for its form field as the chunks arrive: a declared or running size
+# over the limit, or leading bytes that do not match an allowed type, skips the rest of the
+# file without buffering it and records a message in request.upload_errors. Requests whose
+# Content-Length is over UPLOAD_MAX_REQUEST_SIZE are refused before anything is read.
+# Accepted files carry a `sha256` attribute that ContentAddressedStorage uses as their name,
+# so identical uploads are stored once.
+import hashlib
+import io
+import os
+import posixpath
+import uuid
+
+from django.conf import settings
+from django.core.exceptions import RequestDataTooBig
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import InMemoryUploadedFile, TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.utils.deconstruct import deconstructible
+
+
+MB = 1024 * 1024
+
+IMAGE_TYPES = ('image/jpeg', 'image/png', 'image/gif', 'image/webp')
+
+# form field name -> (max bytes, allowed detected types or None for any)
+UPLOAD_LIMITS = getattr(settings, 'UPLOAD_LIMITS', {
+    'project_pictures': (10 * MB, IMAGE_TYPES),
+    'file': (50 * MB, ('text/plain', 'application/zip')),  # admin data import: CSV or XLSX
+})
+UPLOAD_DEFAULT_LIMIT = getattr(settings, 'UPLOAD_DEFAULT_LIMIT', (10 * MB, None))
+UPLOAD_MAX_REQUEST_SIZE = getattr(settings, 'UPLOAD_MAX_REQUEST_SIZE', 60 * MB)
+
+_SNIFF_BYTES = 512
+
+
+def sniff_type(head):
+    """Content type from the leading bytes of a file, or None when unrecognised."""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'image/jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head.startswith(b'%PDF-'):
+        return 'application/pdf'
+    if head.startswith(b'PK\x03\x04'):
+        return 'application/zip'
+    if b'\x00' not in head:
+        try:
+            # The sniffed window may end inside a multi-byte character
+            head.decode('utf-8-sig') if len(head) < _SNIFF_BYTES else head[:-3].decode('utf-8-sig')
+        except UnicodeDecodeError:
+            return None
+        return 'text/plain'
+    return None
+
+
+def upload_limits(field_name):
+    return UPLOAD_LIMITS.get(field_name, UPLOAD_DEFAULT_LIMIT)
+
+
+def upload_errors(request):
+    return getattr(request, 'upload_errors', {})
+
+
+class LimitedUploadHandler(FileUploadHandler):
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.request.upload_errors = {}
+        if content_length > UPLOAD_MAX_REQUEST_SIZE:
+            raise RequestDataTooBig(f'Upload of {content_length} bytes exceeds UPLOAD_MAX_REQUEST_SIZE.')
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.max_size, self.allowed_types = upload_limits(field_name)
+        self.hash = hashlib.sha256()
+        self.head = b''
+        self.detected_type = None
+        self.file = io.BytesIO()
+        if content_length is not None and content_length > self.max_size:
+            self.reject(f'{file_name} is larger than {self.max_size // MB} MB.')
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > self.max_size:
+            self.reject(f'{self.file_name} is larger than {self.max_size // MB} MB.')
+
+        if len(self.head) < _SNIFF_BYTES:
+            self.head += raw_data[:_SNIFF_BYTES - len(self.head)]
+            if len(self.head) >= _SNIFF_BYTES or len(raw_data) < self.chunk_size:
+                self.check_type()
+
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+        # Same memory/disk split as Django's default handlers
+        if isinstance(self.file, io.BytesIO) and self.file.tell() > settings.FILE_UPLOAD_MAX_MEMORY_SIZE:
+            spooled = TemporaryUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+            spooled.write(self.file.getvalue())
+            self.file = spooled
+        return None
+
+    def check_type(self):
+        self.detected_type = sniff_type(self.head)
+        if self.allowed_types is not None and self.detected_type not in self.allowed_types:
+            self.reject(f'{self.file_name} is not an allowed file type.')
+
+    def file_complete(self, file_size):
+        if self.detected_type is None:
+            self.check_type()
+        content_type = self.detected_type or self.content_type
+        if isinstance(self.file, io.BytesIO):
+            uploaded = InMemoryUploadedFile(
+                self.file, self.field_name, self.file_name, content_type, file_size, self.charset, self.content_type_extra,
+            )
+        else:
+            uploaded = self.file
+            uploaded.content_type = content_type
+            uploaded.size = file_size
+        uploaded.seek(0)
+        uploaded.sha256 = self.hash.hexdigest()
+        return uploaded
+
+    def reject(self, message):
+        self.request.upload_errors[self.field_name] = message
+        if not isinstance(self.file, io.BytesIO):
+            self.file.close()
+        self.file = io.BytesIO()
+        raise SkipFile(message)
+
+
+def with_upload_errors(form_class, request):
+    """Subclass of `form_class` that reports files LimitedUploadHandler rejected for this request."""
+    class UploadCheckedForm(form_class):
+        def clean(self):
+            cleaned_data = super().clean()
+            # Read at clean time: the body may not have been parsed when the class was made
+            for field, message in upload_errors(request).items():
+                self.add_error(field if field in self.fields else None, message)
+            return cleaned_data
+
+    UploadCheckedForm.__name__ = form_class.__name__
+    return UploadCheckedForm
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores each file as <upload_to>/<aa>/<bb>/<sha256><ext>; saving identical content again reuses the file."""
+
+    def get_available_name(self, name, max_length=None):
+        return name  # names are content hashes, a clash means the same content
+
+    def _save(self, name, content):
+        digest = getattr(content, 'sha256', None)
+        if digest is None:
+            hasher = hashlib.sha256()
+            for chunk in content.chunks():
+                hasher.update(chunk)
+            digest = hasher.hexdigest()
+            content.seek(0)
+        directory, filename = posixpath.split(name)
+        ext = os.path.splitext(filename)[1].lower()
+        name = posixpath.join(directory, digest[:2], digest[2:4], digest + ext)
+        if self.exists(name):
+            return name
+        # Write under a unique name and rename into place, so two concurrent uploads of the
+        # same content cannot collide (the rename just replaces identical bytes)
+        partial = super()._save(f'{name}.{uuid.uuid4().hex}.part', content)
+        os.replace(self.path(partial), self.path(name))
+        return name
+
+
+def picture_storage():
+    return ContentAddressedStorage()
@@ -2,6 +2,7 @@ from django.contrib.auth import views as auth_views
 from django.contrib.auth.views import LogoutView #, PasswordResetView, PasswordChangeView, PasswordResetDoneView, PasswordResetConfirmView, PasswordResetCompleteView
 from django.urls import path, include
 from . import views 
+from .instrumentation import Budget
 
 
 urlpatterns = [
@@ -9,17 +10,31 @@ urlpatterns = [
     path('accounts/register/', views.u_register, name='register'),
     # path('dashboard/', views.project_dashboard, name='project_dashboard'),
     path('accounts/logout/', auth_views.LogoutView.as_view(), name='logout'),
+    path('project/new/', views.create_project, name='create_project'),
     path('project/<int:project_id>/', views.project_detail, name='project_detail'),
-    path('report/<int:report_id>/', views.project_report, name='project_report'),
+    path('report/<int:project_id>/', views.project_report, name='project_report'),
+    path('report/job/<int:job_id>/', views.report_status, name='report_status'),
+    path('report/job/<int:job_id>/download/', views.report_download, name='report_download'),
     path('division/<int:division_id>/', views.division_detail, name='division_detail'),
     path('ward/<int:ward_id>/', views.ward_detail, name='ward_detail'),
     path('village/<int:village_id>/', views.village_detail, name='village_detail'),
+    path('locations/rollup/', views.location_rollup_json, name='location_rollup'),
+    path('division/<int:division_id>/reports/', views.location_reports, name='division_reports'),
+    path('ward/<int:ward_id>/reports/', views.location_reports, name='ward_reports'),
+    path('village/<int:village_id>/reports/', views.location_reports, name='village_reports'),
     path('task/<int:project_id>/', views.create_task, name='create_task'),
-    path('project_report', views.project_report, name='project_report'),
     path('login/', views.u_login, name='login'),
     path('about/', views.about, name='about'),
-    path('comment/', views.project_comment, name='project_comment'),
+    path('comment/<int:project_id>/', views.project_comment, name='project_comment'),
     path('project/', views.project, name='project'),
+    path('project/at-risk/', views.projects_at_risk, name='projects_at_risk'),
+    path('workload/', views.workload, name='workload'),
+    path('workload/json/', views.workload_json, name='workload_json'),
+    path('cache/stats/', views.cache_stats_json, name='cache_stats'),
+    path('db/pool/', views.db_pool_stats_json, name='db_pool_stats'),
+    path('search/', views.search, name='search'),
+    path('media/variants/projects/<path:path>', views.image_variant, name='image_variant'),
+    path('export/<str:kind>/', views.export_data, name='export_data'),
     path('service/', views.service, name='service'),
     path('contact/', views.contact, name='contact'),
     path('logout/', views.logout, name='logout'),
@@ -28,4 +43,35 @@ urlpatterns = [
     # path('password-reset/done/', views.PasswordResetDoneView.as_view(), name='password_reset_done'),
     # path('reset/<uidb64>/<token>/', views.PasswordResetConfirmView.as_view(), name='password_reset_confirm'),
     # path('reset/done/', views.PasswordResetCompleteView.as_view(), name='password_reset_complete'),
-]
\ No newline at end of file
+]
+# Query and latency budgets per URL name, checked by projects.instrumentation.RequestMetricsMiddleware.
+# Counts include the session and user lookups. Streaming responses (export_data) are only
+# measured up to the point the response is returned.
+VIEW_BUDGETS = {
+    'index': Budget(queries=3),
+    'project': Budget(queries=5, total_ms=500),
+    'project_detail': Budget(queries=8, total_ms=500),  # incl. the ETag query and a chart cache rebuild
+    'projects_at_risk': Budget(queries=5),
+    'workload': Budget(queries=4, total_ms=500),
+    'workload_json': Budget(queries=4, total_ms=500),
+    'cache_stats': Budget(queries=2),
+    'db_pool_stats': Budget(queries=2),
+    'division_detail': Budget(queries=7),  # incl. a location tree reload and the rollup query
+    'ward_detail': Budget(queries=7),
+    'village_detail': Budget(queries=8),
+    'location_rollup': Budget(queries=6),  # incl. a location tree reload and the rollup query
+    # POST on a cold process: ETag query, insert, stats/search/activity writes, the search table probe,
+    # the content type lookup, and the user and stats reads of the live update
+    'project_comment': Budget(queries=12),
+    'search': Budget(queries=6, total_ms=500),
+    'image_variant': Budget(queries=0),
+    'export_data': Budget(queries=3),
+    'create_project': Budget(queries=20),
+    'create_task': Budget(queries=26),  # POST: form checks, the insert, stats/search/activity writes, dependencies
+    'project_report': Budget(queries=8),
+    'report_status': Budget(queries=4),
+    'report_download': Budget(queries=4),
+    'admin:projects_project_changelist': Budget(queries=9),  # searching: the full-text query and a location tree reload
+    'admin:projects_task_changelist': Budget(queries=8),
+    'admin:projects_comment_changelist': Budget(queries=8),
+}
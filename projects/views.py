@@ -1,36 +1,44 @@
+import datetime
+
+from asgiref.sync import sync_to_async
+
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models.signals import post_save, pre_delete
-from django.contrib.contenttypes.models import ContentType
+from django.db.models.signals import post_save, post_delete
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponseRedirect
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.http import condition
+from django.contrib.auth.views import redirect_to_login
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.contrib.auth import logout
 from django.dispatch import receiver
 from django.contrib import messages
+from django.urls import reverse
 from django.utils import timezone
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib import colors
-import plotly.graph_objects as go
-from django.db.models import Sum, Count
-from plotly.offline import plot
-import plotly.express as px
-import pandas as pd
-from .models import Project, Task, Division, Ward, Village, ActivityLog, Comment
+from django.utils.text import slugify
+from django.db.models.functions import Substr
+from .models import Project, Task, Division, Ward, Village, Comment, ReportJob
 from .forms import UserRegistrationForm, ProjectForm, TaskForm, CommentForm
+from .chart_cache import get_project_charts
+from .report_queue import request_project_report, report_file_exists
+from .activity import track_activity
+from .locations import location_tree, invalidate_location_tree
+from .rollups import location_rollup
+from .pagination import keyset_page
+from .search import search as search_documents
+from .uploads import with_upload_errors
+from .fanout import run_concurrently
+from . import scheduling
+from .workload import WORKLOAD_WEEKS, get_workload, heatmap_spec
+from .cache import cache_stats, cached
+from .db_pool import pool_stats
+from .conditional import (
+    add_validators, make_validators, not_modified, project_etag, project_last_modified, project_state,
+    report_etag, report_last_modified,
+)
 
 
 def index(request):
-    divisions = Division.objects.prefetch_related('wards__villages').all()
-    projects = Project.objects.select_related('supervisor', 'location__ward__division').all()
-    tasks = Task.objects.select_related('project__location__ward__division', 'assigned_to').all()
-    
-    return render(request, 'index.html', {
-        'divisions': divisions,
-        'projects': projects,
-        'tasks': tasks
-    })
+    return render(request, 'index.html')
 
 def u_register(request):
     if request.method == 'POST':
@@ -57,12 +65,60 @@ def contact(request):
     return render(request, 'contact.html')
 
 
-# Modify it later to call upon projects and Tasks
+# Project listing, paginated by (start_date, id) cursor.
+# Filters: ?division=, ?ward=, ?village= (location subtree), ?supervisor=,
+# ?start_after= and ?start_before= (YYYY-MM-DD).
+PROJECTS_PER_PAGE = 20
+
+
+def _start_of_day(value, days=0):
+    day = datetime.date.fromisoformat(value) + datetime.timedelta(days=days)
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+
+
 @login_required(login_url='login')
 def project(request):
-    projects = Project.objects.select_related('supervisor', 'location').all()
+    # Only the columns project.html shows; the description is cut down in the database
+    projects = (
+        Project.objects.select_related('stats')
+        .only('id', 'project_name', 'project_code', 'project_pictures', 'picture_variants', 'start_date',
+              'stats__todo_count', 'stats__in_progress_count', 'stats__done_count')
+        .annotate(summary=Substr('description', 1, 300))
+    )
+
+    params = request.GET
+    try:
+        if params.get('village'):
+            projects = projects.filter(location_id=int(params['village']))
+        elif params.get('ward'):
+            projects = projects.filter(location_id__in=location_tree().village_ids_under(ward_id=int(params['ward'])))
+        elif params.get('division'):
+            projects = projects.filter(location_id__in=location_tree().village_ids_under(division_id=int(params['division'])))
+        if params.get('supervisor'):
+            projects = projects.filter(supervisor_id=int(params['supervisor']))
+        # Compared as datetimes (not start_date__date) so the start_date indexes stay usable
+        if params.get('start_after'):
+            projects = projects.filter(start_date__gte=_start_of_day(params['start_after']))
+        if params.get('start_before'):
+            projects = projects.filter(start_date__lt=_start_of_day(params['start_before'], days=1))
+        # The same filters and cursor give the same page until a project or task changes
+        page = cached(
+            'project_page', ('project', 'task'),
+            lambda: keyset_page(projects, params.get('cursor'), PROJECTS_PER_PAGE),
+            sorted(params.lists()),
+        )
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest('Invalid filter or cursor.')
+
+    next_url = None
+    if page.has_next:
+        query = params.copy()
+        query['cursor'] = page.next_cursor
+        next_url = f'?{query.urlencode()}'
+
     return render(request, 'project.html',{
-        'projects': projects,
+        'projects': page,
+        'next_url': next_url,
     })
 
 
@@ -85,39 +141,62 @@ def logout_view(request):
 @login_required(login_url='login')
 def division_detail(request, division_id):
     division = get_object_or_404(Division, id=division_id)
-    wards = division.wards.all()
+    rollup = location_rollup()
 
     return render(request, 'division_detail.html', {
         'division': division,
-        'wards': wards
+        'rollup': rollup.division(division.id),
+        'ward_rollups': [rollup.ward_tree(ward_id) for ward_id in rollup.tree.ward_ids_of(division.id)],
     })
 
 @login_required(login_url='login')
 def ward_detail(request, ward_id):
-    ward = get_object_or_404(Ward, id=ward_id)
-    villages = ward.villages.all()
+    ward = get_object_or_404(Ward.objects.select_related('division'), id=ward_id)
+    rollup = location_rollup()
 
     return render(request, 'ward_detail.html', {
         'ward': ward,
-        'villages': villages
+        'rollup': rollup.ward(ward.id),
+        'village_rollups': [rollup.village_tree(village_id) for village_id in rollup.tree.village_ids_of(ward.id)],
     })
 
 @login_required(login_url='login')
 def village_detail(request, village_id):
-    village = get_object_or_404(Village, id=village_id)
-    projects = village.projects.all()
+    village = get_object_or_404(Village.objects.select_related('ward'), id=village_id)
+    projects = village.projects.select_related('stats').order_by('project_name')
 
     return render(request, 'village_detail.html', {
         'village': village,
-        'projects': projects
+        'projects': projects,
+        'rollup': location_rollup().village(village.id),
     })
 
 
+# Spend and progress per location as JSON: the whole district, or one
+# subtree with ?division=<id>, ?ward=<id> or ?village=<id>
+@login_required(login_url='login')
+def location_rollup_json(request):
+    rollup = location_rollup()
+    try:
+        if 'division' in request.GET:
+            data = rollup.division_tree(int(request.GET['division']))
+        elif 'ward' in request.GET:
+            data = rollup.ward_tree(int(request.GET['ward']))
+        elif 'village' in request.GET:
+            data = rollup.village_tree(int(request.GET['village']))
+        else:
+            data = rollup.as_tree()
+    except (KeyError, ValueError):
+        raise Http404('No such location.')
+    return JsonResponse(data)
+
+
 
 @login_required(login_url='login')
+@condition(etag_func=project_etag, last_modified_func=project_last_modified)
 def project_comment(request, project_id):
     project = get_object_or_404(Project, id=project_id)
-    comments = project.comments.select_related('user').order_by('-created_at')
+    comments = project.projects_comments.select_related('user').order_by('-created_at')
     comment_form = CommentForm()
 
     if request.method == 'POST':
@@ -128,7 +207,7 @@ def project_comment(request, project_id):
             comment.user = request.user
             comment.save()
             messages.success(request, 'Comment added successfully.')
-            return redirect('comment', project_id=project.id)
+            return redirect('project_comment', project_id=project.id)
 
     return render(request, 'comment.html', {
         'project': project,
@@ -137,11 +216,58 @@ def project_comment(request, project_id):
     })
 
 
+# Full-text search over projects, tasks and comments, best matches first
+@login_required(login_url='login')
+def search(request):
+    query = request.GET.get('q', '').strip()
+    results = {'project': [], 'task': [], 'comment': []}
+
+    if query:
+        matches = search_documents(query, limit=60)
+        ids = {kind: [object_id for match_kind, object_id in matches if match_kind == kind] for kind in results}
+        objects = {
+            'project': Project.objects.in_bulk(ids['project']),
+            'task': Task.objects.select_related('project').in_bulk(ids['task']),
+            'comment': Comment.objects.select_related('project', 'user').in_bulk(ids['comment']),
+        }
+        for kind, object_id in matches:
+            if object_id in objects[kind]:
+                results[kind].append(objects[kind][object_id])
+
+    return render(request, 'search.html', {
+        'query': query,
+        'projects': results['project'],
+        'tasks': results['task'],
+        'comments': results['comment'],
+    })
+
+
+# Streaming exports: /export/projects/ and /export/tasks/, ?format=csv (default) or ?format=xlsx.
+# Tasks can be limited to one project with ?project=<id>.
+@login_required(login_url='login')
+def export_data(request, kind):
+    from .exports import EXPORTS, export_stream
+
+    if kind not in EXPORTS:
+        raise Http404('Unknown export.')
+    queryset = None
+    if kind == 'tasks' and request.GET.get('project'):
+        try:
+            queryset = Task.objects.filter(project_id=int(request.GET['project']))
+        except ValueError:
+            return HttpResponseBadRequest('Invalid project.')
+
+    content_type, filename, stream = export_stream(kind, request.GET.get('format', 'csv'), queryset)
+    response = StreamingHttpResponse(stream, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
 # Project and Task creation views
 @login_required(login_url='login')
 def create_project(request):
     if request.method == 'POST':
-        form = ProjectForm(request.POST, request.FILES)
+        form = with_upload_errors(ProjectForm, request)(request.POST, request.FILES)
         if form.is_valid():
             project = form.save(commit=False)
             project.supervisor = request.user  # Assuming the current user is the supervisor
@@ -158,191 +284,225 @@ def create_project(request):
 def create_task(request, project_id):
     project = get_object_or_404(Project, id=project_id)
     if request.method == 'POST':
-        form = TaskForm(request.POST)
+        form = TaskForm(request.POST, project=project)
         if form.is_valid():
             task = form.save(commit=False)
             task.project = project
             task.save()
+            form.save_m2m()
             messages.success(request, 'Task added successfully.')
             return redirect('project_detail', project_id=project.id)
     else:
-        form = TaskForm()
+        form = TaskForm(project=project)
 
     return render(request, 'create_task.html', {'form': form, 'project': project})
 
 
 # Gant and Pie Charts
-@login_required(login_url='login')
-def project_detail(request, project_id):
-    # Get the specific project
-    project = get_object_or_404(Project, id=project_id)
-    
-    # Get tasks related to the specific project
-    tasks = Task.objects.select_related('assigned_to').filter(project_id=project_id)
-    
-    # Prepare Gantt chart data
-    gantt_data = []
-    for task in tasks:
-        if task.project and task.assigned_to:
-            gantt_data.append({
-                'Task': task.task_name,
-                'Start': task.project.start_date,
-                'Finish': task.due_date,
-                'Resource': task.project.project_name,
-                'Assigned To': task.assigned_to.username
-            })
-    
-    # Create Gantt chart
-    gantt_chart = None
-    if gantt_data:
-        gantt_chart = create_gantt_chart(gantt_data)
-
-    # Prepare data for Tasks Status Distribution (Pie chart)
-    status_data = tasks.values('status').annotate(count=Count('id'))
-
-    status_data = tasks.values('status').annotate(count=Sum('budget'))
-
-    labels = [status['status'] for status in status_data]
-    values = [status['count'] for status in status_data]
-
-    pie_chart = go.Figure(data=[go.Pie(labels=labels, values=values, hole=.3)])
-    pie_chart.update_layout(title_text='Tasks Budget Distribution')
-    pie_chart_div = plot(pie_chart, output_type='div')
-
-    return render(request, 'project_detail.html', {
-        'gantt_chart': gantt_chart,
-        'pie_chart_div': pie_chart_div,
+async def project_detail(request, project_id):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return redirect_to_login(request.get_full_path(), 'login')
+
+    # Unchanged project, tasks and comments: answer 304 before anything is fetched or rendered
+    state = await sync_to_async(project_state)(project_id)
+    if state is None:
+        raise Http404('No Project matches the given query.')
+    validators = make_validators(state, user.pk)
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
+
+    # The project (with its task rollups) and its task list are independent, so fetch them at the same time
+    project, tasks = await run_concurrently(
+        lambda: Project.objects.select_related('supervisor', 'stats').filter(id=project_id).first(),
+        lambda: list(Task.objects.select_related('assigned_to').filter(project_id=project_id)),
+    )
+    if project is None:
+        raise Http404('No Project matches the given query.')
+
+    # Chart specs are cached per project and rebuilt only after its tasks change
+    charts = await sync_to_async(get_project_charts)(project)
+
+    return add_validators(render(request, 'project_detail.html', {
+        'gantt_chart': charts['gantt'],
+        'pie_chart': charts['pie'],
         'project': project,
         'tasks': tasks
+    }), validators)
+
+
+@login_required(login_url='login')
+def projects_at_risk(request):
+    # Schedules come from the per-project cache; only projects changed since are recomputed
+    today = timezone.localdate()
+    at_risk = [
+        {
+            'name': name,
+            'schedule': schedule,
+            'overdue': schedule.overdue_critical_tasks(today),
+            'critical_tasks': [schedule.tasks[task_id] for task_id in schedule.critical_path],
+        }
+        for name, schedule in scheduling.projects_at_risk(today)
+    ]
+    return render(request, 'projects_at_risk.html', {'projects': at_risk, 'today': today})
+
+
+def _workload_params(request):
+    start = request.GET.get('start')
+    start = datetime.date.fromisoformat(start) if start else None
+    return start, int(request.GET.get('weeks', WORKLOAD_WEEKS))
+
+
+@login_required(login_url='login')
+def workload(request):
+    metric = request.GET.get('metric', 'open')
+    try:
+        start, weeks = _workload_params(request)
+    except ValueError:
+        return HttpResponseBadRequest('start must be YYYY-MM-DD and weeks a number.')
+    if metric not in ('open', 'overdue', 'budget'):
+        return HttpResponseBadRequest('metric must be open, overdue or budget.')
+
+    # Computed with NumPy on a cache miss and cached until a task changes
+    data = get_workload(start, weeks)
+    rows = sorted(zip(data['users'], data['totals']), key=lambda row: (-row[1]['overdue'], -row[1]['open']))
+    return render(request, 'workload.html', {
+        'heatmap': heatmap_spec(data, metric) if data['users'] else None,
+        'rows': rows,
+        'metric': metric,
+        'weeks': len(data['weeks']),
+        'start': data['weeks'][0],
     })
 
-def create_gantt_chart(gantt_data):
-    fig = go.Figure()
-
-    for row in gantt_data:
-        fig.add_trace(go.Scatter(
-            x=[row['Start'], row['Finish']],
-            y=[row['Task'], row['Task']],
-            mode='lines',
-            line=dict(width=20),
-            name=row['Resource']
-        ))
-
-    fig.update_layout(
-        title='Project Timeline',
-        xaxis_title='Date',
-        yaxis_title='Task',
-        showlegend=True,
-        hovermode='x unified',
-        margin=dict(l=20, r=20, t=40, b=20),
-    )
 
-    return plot(fig, output_type='div')
+@login_required(login_url='login')
+def workload_json(request):
+    try:
+        start, weeks = _workload_params(request)
+    except ValueError:
+        return HttpResponseBadRequest('start must be YYYY-MM-DD and weeks a number.')
+    return JsonResponse(get_workload(start, weeks))
+
+
+@staff_member_required
+def cache_stats_json(request):
+    return JsonResponse(cache_stats())
 
 
+@staff_member_required
+def db_pool_stats_json(request):
+    return JsonResponse(pool_stats())
+
 
 # PDF generators
+# Reports are rendered in the background by the run_worker command; these views only
+# queue a job, report on it and hand out the finished file.
 @login_required(login_url='login')
 def project_report(request, project_id):
-    project = get_object_or_404(Project, id=project_id)
-    tasks = Task.objects.filter(project=project)
-    response = HttpResponse(content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="{project.project_name}_report.pdf"'
-
-    # Create a PDF document
-    buffer = response
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-
-    # Container for the PDF elements
-    elements = []
-
-    # Styles
-    styles = getSampleStyleSheet()
-    # Title
-    elements.append(Paragraph(f"Project Report: {project.project_name}", styles['Title']))
-    # Project Details
-    project_details = f"""
-    <b>Project Name:</b> {project.project_name}<br/>
-    <b>Project Code:</b> {project.id}<br/>
-    <b>Supervisor:</b> {project.supervisor.get_full_name()}<br/>
-    <b>Total Cost:</b> ${project.budget}<br/>
-    <b>Start Date:</b> {project.start_date.strftime('%Y-%m-%d')}<br/>
-    <b>End Date:</b> {project.end_date.strftime('%Y-%m-%d')}<br/>
-    <b>Source of Fund:</b> {project.source_of_fund}<br/>
-    """
-    elements.append(Paragraph(project_details, styles['Normal']))
-    elements.append(Spacer(1, 12))
-
-    # Task Progress
-    task_data = []
-    task_data.append(['Task Name', 'Assigned To', 'Due Date', 'Status'])
-
-    for task in tasks:
-        task_data.append([
-            task.task_name,
-            task.assigned_to.get_full_name(),
-            task.due_date.strftime('%Y-%m-%d'),
-            task.get_status_display()
-        ])
-
-    table = Table(task_data, colWidths=[200, 100, 100, 100])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 14),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-
-    elements.append(table)
-    elements.append(Spacer(1, 12))
-
-    # Progress Evaluation
-    completed_tasks = tasks.filter(status=Task.STATUS_DONE).count()
-    total_tasks = tasks.count()
-    progress_percentage = (completed_tasks / total_tasks) * 100 if total_tasks > 0 else 0
-
-    progress_evaluation = f"""
-    <b>Progress Evaluation:</b> {progress_percentage:.2f}% Complete
-    """
-    elements.append(Paragraph(progress_evaluation, styles['Normal']))
-
-    # Build the PDF
-    doc.build(elements)
+    project = get_object_or_404(Project.objects.select_related('supervisor'), id=project_id)
+    job = request_project_report(project, request.user)
+
+    if job.status == ReportJob.STATUS_DONE:
+        return redirect('report_download', job_id=job.id)
+    return redirect('report_status', job_id=job.id)
+
+
+@login_required(login_url='login')
+def report_status(request, job_id):
+    job = get_object_or_404(ReportJob.objects.select_related('project'), id=job_id)
+    download_url = reverse('report_download', args=[job.id]) if job.status == ReportJob.STATUS_DONE else None
+
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'id': job.id,
+            'project': job.project_id,
+            'status': job.status,
+            'download_url': download_url,
+        })
+
+    return render(request, 'report_status.html', {
+        'job': job,
+        'download_url': download_url,
+    })
+
 
+@login_required(login_url='login')
+@condition(etag_func=report_etag, last_modified_func=report_last_modified)
+def report_download(request, job_id):
+    job = get_object_or_404(ReportJob.objects.select_related('project'), id=job_id, status=ReportJob.STATUS_DONE)
+    if not report_file_exists(job):
+        raise Http404('The report file is no longer available.')
+
+    return FileResponse(
+        job.report_file.open('rb'),
+        as_attachment=True,
+        filename=f'{job.project.project_name}_report.pdf',
+        content_type='application/pdf',
+    )
+
+
+
+# Resized/WebP project pictures. Variant names change with the picture, so they can be cached forever.
+def image_variant(request, path):
+    from .images import open_variant
+    try:
+        fileobj, content_type = open_variant(path)
+    except FileNotFoundError:
+        raise Http404('No such image.')
+    response = FileResponse(fileobj, content_type=content_type)
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
     return response
 
 
+# Reports for every project in a Division, Ward or Village: ?format=zip (default) or ?format=pdf
+@login_required(login_url='login')
+def location_reports(request, division_id=None, ward_id=None, village_id=None):
+    from .bulk_reports import WEB_REPORT_WORKERS, merged_reports_pdf, stream_reports_zip, subtree_projects, web_report_executor
+
+    if division_id is not None:
+        location = get_object_or_404(Division, id=division_id)
+    elif ward_id is not None:
+        location = get_object_or_404(Ward, id=ward_id)
+    else:
+        location = get_object_or_404(Village, id=village_id)
+    projects = subtree_projects(division_id, ward_id, village_id)
+    filename = slugify(str(location)) or 'projects'
+
+    if request.GET.get('format') == 'pdf':
+        response = HttpResponse(merged_reports_pdf(projects), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{filename}_reports.pdf"'
+        return response
+
+    # The web process's shared small pool, not one per download
+    rendered = stream_reports_zip(projects, WEB_REPORT_WORKERS, executor=web_report_executor())
+    response = StreamingHttpResponse(rendered, content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="{filename}_reports.zip"'
+    return response
+
 
 
 # Signals
+@receiver(post_save, sender=Division)
+@receiver(post_delete, sender=Division)
+@receiver(post_save, sender=Ward)
+@receiver(post_delete, sender=Ward)
+@receiver(post_save, sender=Village)
+@receiver(post_delete, sender=Village)
+def invalidate_locations(sender, **kwargs):
+    invalidate_location_tree()
+
+
 @receiver(post_save, sender=Task)
 def send_task_notification(sender, instance, created, **kwargs):
     if created:
-        subject = f"New Task Assigned: {instance.name}"
-        message = f"A new task has been assigned to you: {instance.name}\nDescription: {instance.description}\nDue Date: {instance.due_date}"
+        subject = f"New Task Assigned: {instance.task_name}"
+        message = f"A new task has been assigned to you: {instance.task_name}\nDescription: {instance.description}\nDue Date: {instance.due_date}"
         # recipient_list = [instance.assigned_to.email]
         # send_mail(subject, message, 'admin@yourdomain.com', recipient_list)
 
 
-@receiver(post_save, sender=Task)
-def log_task_activity(sender, instance, created, **kwargs):
-    action = 'Created' if created else 'Updated'
-    ActivityLog.objects.create(
-        action=action,
-        content_type=ContentType.objects.get_for_model(instance),
-        object_id=instance.id,
-        description=f'{action} task: {instance.name}'
-    )
-
-@receiver(pre_delete, sender=Task)
-def log_task_deletion(sender, instance, **kwargs):
-    ActivityLog.objects.create(
-        action='Deleted',
-        content_type=ContentType.objects.get_for_model(instance),
-        object_id=instance.id,
-        description=f'Deleted task: {instance.name}'
-    )
+# Activity log entries are buffered and written in bulk, see projects/activity.py
+track_activity(Task, 'task_name')
+track_activity(Project, 'project_name')
+track_activity(Comment)
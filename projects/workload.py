@@ -0,0 +1,163 @@
+# Per-user workload over a window of weeks.
+# The open (not Done) tasks touching the window are read with one values_list query and
+# folded into user x week matrices with NumPy: every task adds +1 (or its budget) to a
+# difference array at its first week and -1 after its last, and a cumulative sum along the
+# week axis turns that into the open task count and budget load of each week. Overdue
+# tasks are counted from the week after their due date up to the current week.
+# A task runs from its start_date (its due date when it has none) to its due_date.
+# Results are cached under a version stamp that any Task save or delete moves on.
+# NumPy is only imported when a workload has to be computed.
+import datetime
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import FloatField, Q
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Task
+
+
+WORKLOAD_WEEKS = getattr(settings, 'WORKLOAD_WEEKS', 12)
+WORKLOAD_MAX_WEEKS = getattr(settings, 'WORKLOAD_MAX_WEEKS', 52)
+WORKLOAD_CACHE_TIMEOUT = getattr(settings, 'WORKLOAD_CACHE_TIMEOUT', 60 * 60)
+
+_VERSION_KEY = 'workload:version'
+
+
+def workload_version():
+    version = cache.get(_VERSION_KEY)
+    if version is None:
+        cache.add(_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(_VERSION_KEY)
+    return version
+
+
+def invalidate_workload():
+    try:
+        cache.incr(_VERSION_KEY)
+    except ValueError:
+        cache.set(_VERSION_KEY, time.time_ns(), None)
+
+
+def week_start(day):
+    return day - datetime.timedelta(days=day.weekday())
+
+
+def open_task_rows(start, end, today):
+    """(user id, first day, due date, budget) of the open tasks running between `start` and `end` or overdue at `today`."""
+    return (
+        Task.objects.exclude(status='Done')
+        .filter(Q(start_date__lte=end) | Q(start_date__isnull=True, due_date__lte=end))
+        .filter(Q(due_date__gte=start) | Q(due_date__lt=today))
+        # Budget as a float so rows skip the Decimal conversion
+        .values_list('assigned_to_id', Coalesce('start_date', 'due_date'), 'due_date', Cast('budget', FloatField()))
+    )
+
+
+def compute_workload(start, weeks, today):
+    """Workload dict for `weeks` weeks from the Monday of `start`, as of `today`.
+
+    Keys: weeks (ISO dates of each Monday), users ([{id, username, name}]), and per-user
+    rows of open, overdue and budget (one value per week), plus the users' current totals.
+    """
+    import numpy as np
+
+    start = week_start(start)
+    end = start + datetime.timedelta(weeks=weeks) - datetime.timedelta(days=1)
+    rows = list(open_task_rows(start, end, today))
+    week_dates = [(start + datetime.timedelta(weeks=week)).isoformat() for week in range(weeks)]
+    if not rows:
+        return {'weeks': week_dates, 'today': today.isoformat(), 'users': [], 'open': [], 'overdue': [], 'budget': [], 'totals': []}
+
+    user_ids, starts, dues, budgets = zip(*rows)
+    users, user_index = np.unique(np.array(user_ids, dtype=np.int64), return_inverse=True)
+    # Dates as day numbers from the window start; toordinal() is far cheaper than datetime64 parsing of date objects
+    origin = start.toordinal()
+    first_week = (np.fromiter(map(datetime.date.toordinal, starts), np.int64, len(rows)) - origin) // 7
+    due_days = np.fromiter(map(datetime.date.toordinal, dues), np.int64, len(rows)) - origin
+    last_week = due_days // 7
+    budgets = np.array(budgets, dtype=np.float64)
+
+    def spans(first, last, weights=None):
+        # Difference array with a spare column for spans that run past the window
+        first, last = np.clip(first, 0, weeks), np.clip(last, -1, weeks - 1)
+        inside = first <= last
+        diff = np.zeros((len(users), weeks + 1))
+        values = np.ones(inside.sum()) if weights is None else weights[inside]
+        np.add.at(diff, (user_index[inside], first[inside]), values)
+        np.add.at(diff, (user_index[inside], last[inside] + 1), -values)
+        return np.cumsum(diff[:, :weeks], axis=1)
+
+    open_tasks = spans(first_week, last_week)
+    budget = spans(first_week, last_week, budgets)
+    today_day = today.toordinal() - origin
+    overdue_rows = due_days < today_day
+    overdue = spans(
+        np.where(overdue_rows, (due_days + 1) // 7, weeks),
+        np.where(overdue_rows, today_day // 7, -1),
+    )
+
+    names = {
+        pk: {'id': pk, 'username': username, 'name': f'{first} {last}'.strip() or username}
+        for pk, username, first, last in User.objects.filter(id__in=users.tolist()).values_list('id', 'username', 'first_name', 'last_name')
+    }
+    open_now = np.bincount(user_index, minlength=len(users))
+    overdue_now = np.bincount(user_index, weights=overdue_rows, minlength=len(users))
+    budget_now = np.bincount(user_index, weights=budgets, minlength=len(users))
+    return {
+        'weeks': week_dates,
+        'today': today.isoformat(),
+        'users': [names.get(pk, {'id': pk, 'username': '', 'name': f'User {pk}'}) for pk in users.tolist()],
+        'open': open_tasks.astype(np.int64).tolist(),
+        'overdue': overdue.astype(np.int64).tolist(),
+        'budget': np.round(budget, 2).tolist(),
+        'totals': [
+            {'open': int(o), 'overdue': int(d), 'budget': round(float(b), 2)}
+            for o, d, b in zip(open_now, overdue_now, budget_now)
+        ],
+    }
+
+
+def get_workload(start=None, weeks=WORKLOAD_WEEKS, today=None):
+    today = today or timezone.localdate()
+    start = week_start(start or today)
+    weeks = max(1, min(int(weeks), WORKLOAD_MAX_WEEKS))
+    key = f'workload:{start.isoformat()}:{weeks}:{today.isoformat()}:{workload_version()}'
+    data = cache.get(key)
+    if data is None:
+        data = compute_workload(start, weeks, today)
+        cache.set(key, data, WORKLOAD_CACHE_TIMEOUT)
+    return data
+
+
+def heatmap_spec(data, metric='open'):
+    """Plotly heatmap figure (plain JSON, no plotly import) of one workload metric."""
+    titles = {'open': 'Open tasks', 'overdue': 'Overdue tasks', 'budget': 'Budget load'}
+    return {
+        'data': [{
+            'type': 'heatmap',
+            'x': data['weeks'],
+            'y': [user['name'] for user in data['users']],
+            'z': data[metric],
+            'colorscale': 'YlOrRd',
+            'hovertemplate': '%{y}<br>Week of %{x}<br>%{z}<extra></extra>',
+        }],
+        'layout': {
+            'title': {'text': f'{titles[metric]} per officer and week'},
+            'xaxis': {'title': {'text': 'Week'}, 'type': 'category'},
+            'yaxis': {'automargin': True, 'autorange': 'reversed'},
+            'height': max(300, 24 * len(data['users']) + 120),
+            'margin': {'l': 20, 'r': 20, 't': 40, 'b': 40},
+        },
+    }
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_workload_for_task(sender, **kwargs):
+    invalidate_workload()